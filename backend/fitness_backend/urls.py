@@ -4,12 +4,15 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
 
+from ml_models.views import prometheus_metrics
+
 def home(request):
     return JsonResponse({"message": "Fitness App API is running!"})
 
 urlpatterns = [
     path('', home),
     path('admin/', admin.site.urls),
+    path('metrics', prometheus_metrics),
     path('api/ml/', include('ml_models.urls')),
     path('api/auth/', include('accounts.urls')),
     path('api/health/', include('health_data.urls')),
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_data', '0005_add_workout_feedback_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marathon',
+            name='completed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='marathon',
+            name='completion_bits',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AddField(
+            model_name='marathon',
+            name='completion_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='completed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='completion_bits',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='completion_total',
+            field=models.IntegerField(default=0),
+        ),
+    ]
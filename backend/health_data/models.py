@@ -44,6 +44,10 @@ class Workout(models.Model):
     plan_day_number = models.IntegerField(null=True, blank=True)  # Which day in progression
     user_feedback = models.CharField(max_length=20, choices=FEEDBACK_CHOICES, null=True, blank=True)
     feedback_notes = models.TextField(blank=True)
+    # Completed exercises as a bitset, bit i = exercise_index i (see ml_models/completion.py)
+    completion_bits = models.BinaryField(default=bytes, editable=False)
+    completion_total = models.IntegerField(default=0)  # Exercises the bitset covers
+    completed_count = models.IntegerField(default=0)  # Set bits, updated with every toggle
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -73,6 +77,10 @@ class Marathon(models.Model):
     actual_time = models.TimeField(null=True, blank=True)
     completed_date = models.DateField(null=True, blank=True)
     notes = models.TextField(blank=True)
+    # Completed schedule days as a bitset, bit i = day_index i (see ml_models/completion.py)
+    completion_bits = models.BinaryField(default=bytes, editable=False)
+    completion_total = models.IntegerField(default=0)  # Schedule days the bitset covers
+    completed_count = models.IntegerField(default=0)  # Set bits, updated with every toggle
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -50,6 +50,15 @@ class MarathonDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         return Marathon.objects.filter(user=self.request.user)
 
+    def perform_update(self, serializer):
+        from ml_models import completion
+
+        previous_notes = serializer.instance.notes
+        marathon = serializer.save()
+        # Keep the completion bitset sized to the edited schedule
+        if marathon.notes != previous_notes:
+            completion.resize(marathon, completion.schedule_length(marathon))
+
 class WorkoutListCreateView(generics.ListCreateAPIView):
     serializer_class = WorkoutSerializer
     permission_classes = [IsAuthenticated]
@@ -67,6 +76,15 @@ class WorkoutDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         return Workout.objects.filter(user=self.request.user)
 
+    def perform_update(self, serializer):
+        from ml_models.workout_storage import index_workout
+
+        previous_description = serializer.instance.description
+        workout = serializer.save()
+        # Keep the plan day/exercise rows in step with the edited JSON
+        if workout.description != previous_description:
+            index_workout(workout)
+
 class HealthDataListCreateView(generics.ListCreateAPIView):
     serializer_class = HealthDataSerializer
     permission_classes = [IsAuthenticated]
@@ -1,9 +1,14 @@
-import os
-import json
-from google import genai
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import logging
 
-# Initialize Gemini API
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+from . import generation_cache, llm_gateway, llm_metrics, response_parser
+from .meal_optimizer import optimize_meal_plan
+from .portion_scaling import scale_plan_portions
+
+
+logger = logging.getLogger(__name__)
 
 
 def generate_meal_image_prompt(meal_name, meal_type):
@@ -31,20 +36,12 @@ The image should match a soft pastel glassmorphism AI assistant interface with:
 Make the food look fresh, healthy, and appealing."""
 
 
-def generate_meal_plan(calories, diet_type, allergies, goal, days, feedback=None):
+def build_meal_plan_prompt(calories, diet_type, allergies, goal, days, feedback=None, avoid_dishes=None):
     """
-    Generate a personalized meal plan using Google Gemini AI
+    Build the Gemini prompt for a meal plan of `days` days (numbered from 1)
     
     Args:
-        calories (int): Daily calorie target
-        diet_type (str): Dietary preference (vegetarian, vegan, keto, etc.)
-        allergies (str): Comma-separated list of allergies
-        goal (str): Fitness goal (lose weight, gain muscle, maintain, etc.)
-        days (int): Number of days to generate (7, 30, 90, 180, 365)
-        feedback (dict): User's recent eating patterns for smart recommendations
-    
-    Returns:
-        dict: Meal plan structured by day with breakfast, lunch, dinner
+        avoid_dishes (list): Dish names already used in other parts of the plan
     """
     feedback_text = ""
 
@@ -59,6 +56,14 @@ def generate_meal_plan(calories, diet_type, allergies, goal, days, feedback=None
         Adjust the new meal plan to correct imbalances and match user preferences.
         """
 
+    avoid_text = ""
+
+    if avoid_dishes:
+        avoid_text = f"""
+        Dishes already used in earlier days of this plan (DO NOT repeat them):
+        {", ".join(avoid_dishes)}
+        """
+
     prompt = f"""
     Create a {days}-day healthy meal plan with VARIETY - each day should have DIFFERENT meals.
 
@@ -68,6 +73,7 @@ def generate_meal_plan(calories, diet_type, allergies, goal, days, feedback=None
     Goal: {goal}
 
     {feedback_text}
+    {avoid_text}
 
     CRITICAL REQUIREMENTS:
     1. Each day MUST have DIFFERENT breakfast, lunch, and dinner
@@ -134,30 +140,201 @@ def generate_meal_plan(calories, diet_type, allergies, goal, days, feedback=None
     - Each meal should have 3-5 items to comfortably reach the calorie target
     """
 
-    try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=prompt
+    return prompt
+
+
+def request_meal_plan(prompt, days, hedge_after=None):
+    """
+    Send a meal plan prompt to Gemini and parse the day-keyed JSON response
+
+    Returns:
+        ParsedResponse: Valid days 1..days of the response and the day numbers that are missing
+    """
+    parser = partial(response_parser.parse_plan, schema=response_parser.MEAL_PLAN, expected=range(1, days + 1))
+    return llm_gateway.generate_json(prompt, hedge_after=hedge_after, parser=parser)
+
+
+def generate_meal_plan(calories, diet_type, allergies, goal, days, feedback=None, use_cache=True):
+    """
+    Generate a personalized meal plan using Google Gemini AI
+    
+    Plans longer than CHUNK_DAYS are generated in chunks (see
+    generate_meal_plan_chunked); the result has the same format either way.
+    Each chunk is looked up in the generation cache first, keyed on the
+    normalized parameters including the bucketed feedback.
+    
+    Args:
+        calories (int): Daily calorie target
+        diet_type (str): Dietary preference (vegetarian, vegan, keto, etc.)
+        allergies (str): Comma-separated list of allergies
+        goal (str): Fitness goal (lose weight, gain muscle, maintain, etc.)
+        days (int): Number of days to generate (7, 30, 90, 180, 365)
+        feedback (dict): User's recent eating patterns for smart recommendations
+        use_cache (bool): False to skip cached plans (fresh variety); new plans are still cached
+    
+    Returns:
+        dict: Meal plan structured by day with breakfast, lunch, dinner
+    """
+    if days > CHUNK_DAYS:
+        return generate_meal_plan_chunked(calories, diet_type, allergies, goal, days, feedback=feedback, use_cache=use_cache)
+
+    cache_params = generation_cache.meal_chunk_params(calories, diet_type, allergies, goal, days, slot=0, feedback=feedback)
+    if use_cache:
+        cached = generation_cache.get('meal_chunk', cache_params)
+        if cached is not None:
+            # Cached plans may come from a neighbouring calorie bucket
+            return scale_plan_portions(cached, calories, label=f"cached {days}-day plan")
+
+    # Short plans are requested while the user waits, so they are hedged
+    plan, from_model = _generate_chunk(
+        calories, diet_type, allergies, goal, days, feedback, None, 1, hedge_after=llm_gateway.HEDGE_AFTER
+    )
+    if from_model:
+        generation_cache.put('meal_chunk', cache_params, plan)
+        # The model is asked for the 30/35/35 split but rarely delivers it
+        return scale_plan_portions(plan, calories, label=f"{days}-day plan")
+    return plan
+
+
+# ---------------- CHUNKED GENERATION FOR LONG PLANS ---------------- #
+CHUNK_DAYS = 7          # Days per Gemini request
+CHUNK_WORKERS = 4       # Chunks generated concurrently
+CHUNK_RETRIES = 2       # Extra attempts for a chunk before using the fallback for its days
+MAX_AVOID_DISHES = 60   # Most recent dish names passed on to later chunks
+
+
+def _with_missing_days(parsed, extra):
+    """Merge a response for len(parsed.missing) days into the missing days of a partial chunk"""
+    renumbered = response_parser.ParsedResponse(
+        value={str(parsed.missing[int(key) - 1]): day for key, day in extra.value.items()},
+        missing=[parsed.missing[key - 1] for key in extra.missing],
+        dropped=extra.dropped,
+        repaired=extra.repaired
+    )
+    return response_parser.merge_plan(response_parser.MEAL_PLAN, parsed, renumbered)
+
+
+def _generate_chunk(calories, diet_type, allergies, goal, days, feedback, avoid_dishes, first_day, hedge_after=None):
+    """
+    Generate one chunk, re-requesting only the days that were missing or broken
+
+    Every complete day of a response is kept (see response_parser); a retry
+    asks for just the missing days. Days still missing after CHUNK_RETRIES
+    come from the local optimizer.
+
+    Returns:
+        tuple: (chunk, from_model) - from_model is False if any day came from the optimizer
+    """
+    parsed = None
+    for attempt in range(1 + CHUNK_RETRIES):
+        request_days = parsed.missing if parsed else list(range(1, days + 1))
+        prompt = build_meal_plan_prompt(
+            calories, diet_type, allergies, goal, len(request_days),
+            feedback=feedback, avoid_dishes=avoid_dishes
         )
-        
-        # Extract JSON from response
-        response_text = response.text.strip()
-        
-        # Remove markdown code blocks if present
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        if response_text.startswith('```'):
-            response_text = response_text[3:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-        
-        response_text = response_text.strip()
-        
-        return json.loads(response_text)
-    except Exception as e:
-        print(f"Error generating meal plan with Gemini: {e}")
-        # Fallback to simple plan if API fails
-        return generate_fallback_plan(calories, diet_type, days)
+        try:
+            response = request_meal_plan(prompt, len(request_days), hedge_after=hedge_after)
+            parsed = _with_missing_days(parsed, response) if parsed else response
+            if not parsed.missing:
+                return parsed.value, True
+            logger.warning("Meal plan chunk from Gemini is missing days %s (attempt %s)", parsed.missing, attempt + 1)
+        except llm_gateway.CircuitOpenError as e:
+            logger.warning("Skipping Gemini for meal plan chunk: %s", e)
+            break
+        except Exception as e:
+            logger.warning("Error generating meal plan chunk with Gemini (attempt %s): %s", attempt + 1, e)
+
+    llm_metrics.record_fallback('meal_optimizer')
+    if not parsed or not parsed.value:
+        return optimize_meal_plan(
+            calories, diet_type, allergies, days,
+            goal=goal, avoid_dishes=avoid_dishes, first_day=first_day
+        ), False
+
+    # Keep the model's days (scaled here, since the caller only scales full model chunks)
+    chunk = scale_plan_portions(parsed.value, calories, label=f"partial chunk from day {first_day}")
+    filler = optimize_meal_plan(
+        calories, diet_type, allergies, len(parsed.missing),
+        goal=goal, avoid_dishes=avoid_dishes, first_day=first_day + parsed.missing[0] - 1
+    )
+    for index, day in enumerate(parsed.missing, start=1):
+        chunk[str(day)] = filler[str(index)]
+    return {str(day): chunk[str(day)] for day in range(1, days + 1)}, False
+
+
+def generate_meal_plan_chunked(calories, diet_type, allergies, goal, days, feedback=None, use_cache=True):
+    """
+    Generate a long meal plan as CHUNK_DAYS-day chunks on a bounded thread pool
+    
+    Chunks run in waves of CHUNK_WORKERS. Each wave is told which dishes the
+    earlier waves already used, so variety is kept across the whole plan.
+    A chunk that fails is retried on its own and, as a last resort, only its
+    days fall back to the local optimizer (meal_optimizer.py).
+    
+    Returns:
+        dict: Meal plan keyed by day number ("1".."days"), as generate_meal_plan
+    """
+    return {
+        str(day_number): day
+        for day_number, day in _iter_chunked_days(calories, diet_type, allergies, goal, days, feedback, use_cache)
+    }
+
+
+def iter_meal_plan_days(calories, diet_type, allergies, goal, days, feedback=None, use_cache=True):
+    """
+    Yield (day_number, day) pairs of a new meal plan in day order
+    
+    Long plans yield each chunk's days as soon as that chunk is generated,
+    so callers can deliver the first days before the rest of the plan exists.
+    """
+    if days <= CHUNK_DAYS:
+        plan = generate_meal_plan(calories, diet_type, allergies, goal, days, feedback=feedback, use_cache=use_cache)
+        for day_number in range(1, days + 1):
+            yield day_number, plan[str(day_number)]
+        return
+
+    yield from _iter_chunked_days(calories, diet_type, allergies, goal, days, feedback, use_cache)
+
+
+def _iter_chunked_days(calories, diet_type, allergies, goal, days, feedback, use_cache):
+    # (first plan day, number of days) for every chunk
+    chunks = [(start, min(CHUNK_DAYS, days - start + 1)) for start in range(1, days + 1, CHUNK_DAYS)]
+    used_dishes = []
+
+    # Cache reads and writes stay on this thread; pool threads only call the model
+    with ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as executor:
+        for wave_start in range(0, len(chunks), CHUNK_WORKERS):
+            wave = chunks[wave_start:wave_start + CHUNK_WORKERS]
+            avoid_dishes = used_dishes[-MAX_AVOID_DISHES:]
+            pending = []
+            for slot, (start, length) in enumerate(wave, start=wave_start):
+                cache_params = generation_cache.meal_chunk_params(
+                    calories, diet_type, allergies, goal, length, slot, feedback=feedback
+                )
+                cached = generation_cache.get('meal_chunk', cache_params) if use_cache else None
+                if cached is not None:
+                    pending.append((start, length, cache_params, cached))
+                else:
+                    # Run in a copy of this context so the calls keep their llm_metrics attribution
+                    future = executor.submit(
+                        contextvars.copy_context().run, _generate_chunk,
+                        calories, diet_type, allergies, goal, length, feedback, avoid_dishes, start
+                    )
+                    pending.append((start, length, cache_params, future))
+
+            for start, length, cache_params, result in pending:
+                if isinstance(result, dict):
+                    chunk = scale_plan_portions(result, calories, label=f"cached chunk of days {start}-{start + length - 1}")
+                else:
+                    chunk, from_model = result.result()
+                    if from_model:
+                        generation_cache.put('meal_chunk', cache_params, chunk)
+                        chunk = scale_plan_portions(chunk, calories, label=f"chunk of days {start}-{start + length - 1}")
+                for d in range(1, length + 1):
+                    day = chunk[str(d)]
+                    for items in day.values():
+                        used_dishes.extend(food["name"] for food in items if "name" in food)
+                    yield start + d - 1, day
 
 
 def generate_meal_image(meal_name, meal_type):
@@ -169,74 +346,20 @@ def generate_meal_image(meal_name, meal_type):
         meal_type (str): Type of meal (breakfast, lunch, dinner)
     
     Returns:
-        str: Base64 encoded image or None if generation fails
+        bytes: Image bytes or None if generation fails
     """
     try:
         prompt = generate_meal_image_prompt(meal_name, meal_type)
-        
-        response = client.models.generate_images(
-            model='imagen-3.0-generate-001',
-            prompt=prompt,
-            number_of_images=1,
-            aspect_ratio='1:1',
-            safety_filter_level='block_some',
-            person_generation='allow_adult'
-        )
-        
-        if response and response.generated_images:
-            # Return the first generated image as base64
-            return response.generated_images[0].image.data
-        
-        return None
+        return llm_gateway.generate_image(prompt)
     except Exception as e:
-        print(f"Error generating meal image with Gemini: {e}")
+        logger.warning("Error generating meal image with Gemini: %s", e)
         return None
 
 
-def generate_fallback_plan(calories, diet_type, days):
-    """Simple fallback meal plan if API fails"""
-    if diet_type in ['vegetarian', 'vegan']:
-        breakfast = [
-            {"name": "Oatmeal with Berries", "calories": 250, "protein": 8, "carbs": 45, "fat": 5},
-            {"name": "Banana", "calories": 105, "protein": 1, "carbs": 27, "fat": 0}
-        ]
-        lunch = [
-            {"name": "Quinoa Salad", "calories": 350, "protein": 12, "carbs": 55, "fat": 10},
-            {"name": "Mixed Vegetables", "calories": 80, "protein": 3, "carbs": 15, "fat": 1}
-        ]
-        dinner = [
-            {"name": "Tofu Stir Fry", "calories": 300, "protein": 18, "carbs": 25, "fat": 15},
-            {"name": "Brown Rice", "calories": 215, "protein": 5, "carbs": 45, "fat": 2}
-        ]
-    else:
-        breakfast = [
-            {"name": "Scrambled Eggs", "calories": 200, "protein": 14, "carbs": 2, "fat": 15},
-            {"name": "Whole Wheat Toast", "calories": 140, "protein": 6, "carbs": 26, "fat": 2}
-        ]
-        lunch = [
-            {"name": "Grilled Chicken Breast", "calories": 280, "protein": 53, "carbs": 0, "fat": 6},
-            {"name": "Sweet Potato", "calories": 180, "protein": 4, "carbs": 41, "fat": 0}
-        ]
-        dinner = [
-            {"name": "Baked Salmon", "calories": 350, "protein": 39, "carbs": 0, "fat": 20},
-            {"name": "Quinoa", "calories": 220, "protein": 8, "carbs": 39, "fat": 4}
-        ]
-    
-    plan = {}
-    for day in range(1, days + 1):
-        plan[str(day)] = {
-            "breakfast": breakfast,
-            "lunch": lunch,
-            "dinner": dinner
-        }
-    
-    return plan
-
-
-def recalculate_meal_plan(user_intake_data, target_calories, diet_type, allergies, goal, remaining_days):
+def recalculation_adjustment(user_intake_data, target_calories):
     """
-    Recalculate meal plan based on what user actually ate
-    
+    Calorie level and prompt feedback for a recalculation, from what the user actually ate
+
     Args:
         user_intake_data (dict): What user ate/skipped in recent days
             Example: {
@@ -248,13 +371,9 @@ def recalculate_meal_plan(user_intake_data, target_calories, diet_type, allergie
                 'deficit_or_surplus': -600  # negative = deficit, positive = surplus
             }
         target_calories (int): Daily calorie target
-        diet_type (str): Dietary preference
-        allergies (str): Allergies
-        goal (str): Fitness goal
-        remaining_days (int): Days left in the plan
-    
+
     Returns:
-        dict: Adjusted meal plan for remaining days
+        dict: adjustment_note, adjusted_calories and the feedback for build_meal_plan_prompt
     """
     
     # Calculate adjustments needed
@@ -288,19 +407,43 @@ def recalculate_meal_plan(user_intake_data, target_calories, diet_type, allergie
         'fat_ratio': fat_ratio
     }
     
+    return {
+        'adjustment_note': adjustment_note,
+        'adjusted_calories': adjusted_calories,
+        'feedback': feedback
+    }
+
+
+def recalculate_meal_plan(user_intake_data, target_calories, diet_type, allergies, goal, remaining_days):
+    """
+    Recalculate meal plan based on what user actually ate
+    
+    Args:
+        user_intake_data (dict): What user ate/skipped in recent days (see recalculation_adjustment)
+        target_calories (int): Daily calorie target
+        diet_type (str): Dietary preference
+        allergies (str): Allergies
+        goal (str): Fitness goal
+        remaining_days (int): Days left in the plan
+    
+    Returns:
+        dict: Adjusted meal plan for remaining days
+    """
+    adjustment = recalculation_adjustment(user_intake_data, target_calories)
+    
     # Generate new plan with adjustments
     new_plan = generate_meal_plan(
-        calories=adjusted_calories,
+        calories=adjustment['adjusted_calories'],
         diet_type=diet_type,
         allergies=allergies,
         goal=goal,
         days=remaining_days,
-        feedback=feedback
+        feedback=adjustment['feedback']
     )
     
     return {
         'meal_plan': new_plan,
-        'adjustment_note': adjustment_note,
-        'adjusted_calories': adjusted_calories,
+        'adjustment_note': adjustment['adjustment_note'],
+        'adjusted_calories': adjustment['adjusted_calories'],
         'original_target': target_calories
     }
@@ -0,0 +1,156 @@
+import json
+
+from django.db import transaction
+
+
+# Completion of a workout plan's exercises and a marathon schedule's days is
+# a bitset on the plan row: completion_bits (bit i = index i, counted from
+# the least significant bit of the first byte, as PostgreSQL's get_bit /
+# set_bit number them), its size completion_total and a cached popcount
+# completed_count. A toggle locks the plan row and writes the flipped bit
+# and adjusted count back, so progress and all_completed come with the plan
+# row.
+# WorkoutExerciseTracking / MarathonDayTracking rows only hold per-index
+# difficulty and notes, and only exist when there is something to keep.
+
+
+def bitmap_size(total):
+    """Bytes needed for a bitset of `total` indices"""
+    return (total + 7) // 8
+
+
+def as_int(bits):
+    """A stored bitset as an int: bit i of the result is index i"""
+    return int.from_bytes(bytes(bits or b''), 'little')
+
+
+def is_set(value, index):
+    return bool(value >> index & 1)
+
+
+def indices(bits):
+    """Set indices of a stored bitset, ascending"""
+    value = as_int(bits)
+    return [index for index in range(value.bit_length()) if value >> index & 1]
+
+
+def to_bits(value, total):
+    """An int bitset as stored for `total` indices (bits past the end are dropped)"""
+    return (value & ((1 << total) - 1)).to_bytes(bitmap_size(total), 'little')
+
+
+def from_indices(completed, total):
+    """Bitset of `total` indices with the given ones set (out-of-range indices are dropped)"""
+    value = 0
+    for index in completed:
+        if 0 <= index < total:
+            value |= 1 << index
+    return to_bits(value, total)
+
+
+def resized(bits, total):
+    """A stored bitset cut or zero-padded to `total` indices"""
+    return to_bits(as_int(bits), total)
+
+
+def schedule_length(marathon):
+    """Days in a marathon's weekly schedule (stored as JSON in Marathon.notes)"""
+    try:
+        schedule = json.loads(marathon.notes) if marathon.notes else []
+    except ValueError:
+        return 0
+    return len(schedule) if isinstance(schedule, list) else 0
+
+
+def resize(plan, total):
+    """
+    Fit a plan's bitset to `total` indices and refresh the cached count
+
+    Called when the plan's exercises or schedule change; completed indices
+    past the new end are dropped.
+
+    Args:
+        plan: health_data Workout or Marathon
+        total (int): Number of exercises / schedule days
+    """
+    model = type(plan)
+    with transaction.atomic():
+        bits = model.objects.select_for_update().filter(pk=plan.pk).values_list('completion_bits', flat=True).first()
+        if bits is None:
+            return
+        bits = resized(bits, total)
+        count = as_int(bits).bit_count()
+        model.objects.filter(pk=plan.pk).update(completion_bits=bits, completion_total=total, completed_count=count)
+    plan.completion_bits, plan.completion_total, plan.completed_count = bits, total, count
+
+
+TRUE_VALUES = {'true', '1', 'yes', 'on'}
+FALSE_VALUES = {'false', '0', 'no', 'off'}
+
+
+def parse_bool(value, field, default):
+    """
+    A boolean request field (`default` if missing)
+
+    JSON booleans, 0 / 1 and the strings form data sends ("true", "false",
+    "1", "0", ...) are accepted; anything else raises ValueError, so a form
+    value of "false" is not read as a non-empty, truthy string.
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+    raise ValueError(f"{field} must be true or false")
+
+
+def parse_completed(value):
+    """The "completed" field of a tracking request as a bool (missing means True)"""
+    return parse_bool(value, "completed", True)
+
+
+def set_completed(model, plan_id, user, index, completed):
+    """
+    Set or clear one index of a plan's bitset
+
+    The plan row is locked, the bit flipped in Python and the row written
+    back with the adjusted count only if the bit actually changed, so
+    `changed` tells the caller whether this request made the transition
+    (e.g. to log an exercise's calories once). Concurrent toggles of the
+    same plan serialize on the row lock, so only one of two simultaneous
+    completions sees changed=True.
+
+    Args:
+        model: health_data Workout or Marathon
+        plan_id (int): Plan to update; must belong to `user`
+        index (int): Exercise / schedule day index, >= 0
+        completed (bool): New state of the index
+
+    Returns:
+        tuple: (completed_count, completion_total, changed) after the update,
+        or None if no plan matched (unknown plan, or an index the bitset
+        doesn't cover)
+    """
+    with transaction.atomic():
+        row = model.objects.select_for_update().filter(
+            id=plan_id, user=user, completion_total__gt=index
+        ).values_list('completion_bits', 'completion_total', 'completed_count').first()
+        if row is None:
+            return None
+        bits, total, count = row
+
+        value = as_int(bits)
+        if is_set(value, index) == completed:
+            return count, total, False
+
+        value ^= 1 << index
+        count += 1 if completed else -1
+        model.objects.filter(id=plan_id).update(completion_bits=to_bits(value, total), completed_count=count)
+    return count, total, True
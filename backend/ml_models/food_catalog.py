@@ -0,0 +1,96 @@
+import hashlib
+import re
+
+from django.db import transaction
+
+from .models import FoodCatalog
+
+MACROS = ("protein", "carbs", "fat")  # Nutrients of a macro profile (per 100 kcal)
+
+
+def normalize_food_name(name):
+    """Case, punctuation and spacing-insensitive form of a dish name used for de-duplication"""
+    name = re.sub(r"[^\w\s]", " ", str(name).lower())
+    return " ".join(name.split())
+
+
+def food_name_hash(name):
+    return hashlib.sha256(normalize_food_name(name).encode("utf-8")).hexdigest()
+
+
+def macro_profile(food):
+    """
+    Protein, carbs and fat per 100 kcal, rounded to 0.1 g
+
+    Scaling a portion keeps the profile, so one catalog row serves every
+    portion of a dish; a different recipe under the same name gets its own.
+    Foods without calories are profiled by their raw macros.
+    """
+    calories = float(food.get("calories") or 0)
+    if calories <= 0:
+        return ("0 kcal",) + tuple(round(float(food.get(n) or 0), 1) for n in MACROS)
+    return tuple(round(float(food.get(n) or 0) * 100 / calories, 1) for n in MACROS)
+
+
+def food_hash(food):
+    """Catalog key of a generated food: its normalized name and macro profile"""
+    key = "|".join([normalize_food_name(food["name"])] + [str(value) for value in macro_profile(food)])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_or_create_foods(foods):
+    """
+    Catalog rows for a batch of generated foods, creating missing dishes in bulk
+
+    Foods sharing a name and macro profile share a row; the first of them
+    defines the catalog portion, and portion_for scales it to each food.
+
+    Args:
+        foods (iterable): Dicts with name, calories, protein, carbs and fat
+
+    Returns:
+        dict: food_hash -> FoodCatalog
+    """
+    new_foods = {}
+    for food in foods:
+        new_foods.setdefault(food_hash(food), food)
+
+    catalog = {entry.food_hash: entry for entry in FoodCatalog.objects.filter(food_hash__in=new_foods)}
+    missing = [
+        FoodCatalog(
+            food_hash=key,
+            name_hash=food_name_hash(food["name"]),
+            name=food["name"][:255],
+            calories=food["calories"],
+            protein=food["protein"],
+            carbs=food["carbs"],
+            fat=food["fat"]
+        )
+        for key, food in new_foods.items()
+        if key not in catalog
+    ]
+
+    if missing:
+        # A new profile of a known dish starts with the dish's image
+        images = dict(
+            FoodCatalog.objects.filter(name_hash__in={entry.name_hash for entry in missing}, image_url__isnull=False)
+            .values_list('name_hash', 'image_url')
+        )
+        for entry in missing:
+            entry.image_url = images.get(entry.name_hash)
+        with transaction.atomic():
+            # Concurrent plans may insert the same dish; keep whichever row won
+            FoodCatalog.objects.bulk_create(missing, batch_size=500, ignore_conflicts=True)
+        catalog.update(
+            (entry.food_hash, entry)
+            for entry in FoodCatalog.objects.filter(food_hash__in=[food.food_hash for food in missing])
+        )
+
+    return catalog
+
+
+def portion_for(entry, food):
+    """Portion multiplier that makes a catalog entry match a generated food's calories"""
+    if not entry.calories or not food.get("calories"):
+        return 1.0
+    return round(float(food["calories"]) / entry.calories, 4)
@@ -0,0 +1,620 @@
+import json
+import logging
+from datetime import date, timedelta
+from functools import partial
+
+from health_data.models import Workout, Marathon
+from . import completion, generation_cache, llm_gateway, llm_metrics, response_parser
+from .ai_meal_planner import generate_meal_plan
+from .image_warmer import schedule_image_warming
+from .nutrition import get_feedback
+from .plan_cycles import generated_days, save_plan
+from .workout_builder import build_daily_workout
+from .workout_storage import index_workout
+
+
+# Every generator is split in two phases so the job runner can make saving
+# idempotent: generate_* calls the model and must not write to the database,
+# save_* persists the generated payload and returns the API response body.
+
+logger = logging.getLogger(__name__)
+
+
+def _generate_json(prompt, hedge_after=None):
+    """Call Gemini through the gateway and parse the JSON object in its response"""
+    return llm_gateway.generate_json(prompt, hedge_after=hedge_after)
+
+
+# Follow-up requests for days that were missing or broken in a plan response
+MISSING_DAY_RETRIES = 2
+
+
+def _generate_plan_json(prompt, schema, expected, hedge_after=None):
+    """
+    Call Gemini for a multi-day plan and re-request only the days it got wrong
+
+    The response is parsed with response_parser.parse_plan, which keeps every
+    complete, valid day (also from a truncated response). Missing days are
+    asked for again with the same prompt plus an instruction to return just
+    those days, and merged in.
+
+    Days still missing after MISSING_DAY_RETRIES follow-ups are left out
+    of the plan rather than failing it.
+
+    Raises:
+        ValueError: The response has none of the expected days
+    """
+    expected = list(expected)
+
+    def request(request_prompt, request_days):
+        parser = partial(response_parser.parse_plan, schema=schema, expected=request_days)
+        return llm_gateway.generate_json(request_prompt, hedge_after=hedge_after, parser=parser)
+
+    parsed = request(prompt, expected)
+    for attempt in range(MISSING_DAY_RETRIES):
+        if not parsed.missing:
+            break
+        logger.warning("Plan response is missing days %s; re-requesting them (attempt %s)", parsed.missing, attempt + 1)
+        missing_list = ", ".join(str(day) for day in parsed.missing)
+        follow_up = (
+            f"{prompt}\n\nIMPORTANT: Return ONLY these days of the plan: {missing_list}. "
+            "Keep their day numbers / names and the exact same JSON format; the other days already exist."
+        )
+        parsed = response_parser.merge_plan(schema, parsed, request(follow_up, parsed.missing))
+
+    if len(parsed.missing) == len(expected):
+        raise ValueError("Model response has none of the plan days")
+    if parsed.missing:
+        logger.warning("Plan saved without days %s", parsed.missing)
+    return parsed.value
+
+
+def _generate_json_cached(kind, cache_params, prompt, params, hedge_after=None, schema=None, expected=None):
+    """
+    _generate_json behind the generation cache; params['fresh'] skips cached responses
+
+    With a schema, the response is parsed day by day and only missing days
+    are re-requested (see _generate_plan_json).
+    """
+    if not params.get('fresh'):
+        cached = generation_cache.get(kind, cache_params)
+        if cached is not None:
+            return cached
+
+    if schema is not None:
+        result = _generate_plan_json(prompt, schema, expected, hedge_after=hedge_after)
+    else:
+        result = _generate_json(prompt, hedge_after=hedge_after)
+    generation_cache.put(kind, cache_params, result)
+    return result
+
+
+def _profile_cache_params(age, gender, bmi, params):
+    """Normalized user profile and health inputs shared by the workout cache keys"""
+    return {
+        "age": generation_cache.bucket(age, generation_cache.AGE_BUCKET),
+        "gender": generation_cache.normalize_text(gender),
+        "bmi": generation_cache.bucket(bmi, 1),
+        "avg_steps": generation_cache.bucket(params.get('avg_steps'), generation_cache.STEPS_BUCKET),
+        "sleep_hours": generation_cache.bucket(params.get('sleep_hours'), 1),
+        "spo2": generation_cache.bucket(params.get('spo2'), 1)
+    }
+
+
+def _bmi(weight, height):
+    height_m = height / 100
+    return weight / (height_m * height_m)
+
+
+# ---------------- MEAL PLAN ---------------- #
+def generate_meal_plan_payload(user, params):
+    # Long plans only need their base cycle (see plan_cycles.py)
+    return generate_meal_plan(
+        params['calories'],
+        params['diet_type'],
+        params['allergies'],
+        params['goal'],
+        generated_days(params['days']),
+        feedback=get_feedback(user),
+        use_cache=not params.get('fresh')
+    )
+
+
+def save_meal_plan_payload(user, params, plan):
+    start_date = date.fromisoformat(params['start_date'])
+    days = params['days']
+
+    # Save meal plan starting from the request date, replacing any future meals (force_new)
+    save_plan(user, plan, start_date, days, replace_from=start_date)
+    schedule_image_warming(user, start_date)
+
+    return {
+        "success": True,
+        "message": "Meal plan generated successfully",
+        "days": days,
+        "start_date": str(start_date),
+        "end_date": str(start_date + timedelta(days=days-1))
+    }
+
+
+# ---------------- AI WORKOUT PLANNER ---------------- #
+def generate_workout_plan_payload(user, params):
+    age = params['age']
+    weight = params['weight']
+    height = params['height']
+    bmi = _bmi(weight, height)
+    fitness_level = params['fitness_level']
+    goal = params['goal']
+    num_days = params['num_days']
+    avg_steps = params['avg_steps']
+    sleep_hours = params['sleep_hours']
+    spo2 = params['spo2']
+
+    # Create enhanced prompt with health data
+    prompt = f"""Generate a {num_days}-day personalized workout plan in JSON format for:
+    
+User Profile:
+- Age: {age}
+- Gender: {user.gender}
+- Weight: {weight} kg
+- Height: {height} cm
+- BMI: {bmi:.1f}
+- Fitness Level: {fitness_level}
+- Goal: {goal}
+
+Health Data:
+- Average Daily Steps: {avg_steps}
+- Average Sleep: {sleep_hours} hours
+- SpO2 Level: {spo2}%
+
+Requirements:
+1. Create a {num_days}-day workout program with variety
+2. Each day should have 6-8 exercises with specific workout types
+3. Include workout type for each exercise (cardio, strength, flexibility, hiit, yoga, core)
+4. Consider their activity level (steps) when designing intensity
+5. Include rest days appropriately (1-2 per week)
+6. Mix different workout types throughout the week
+7. Provide specific reps/duration for each exercise
+8. Calculate total workout duration and estimated calories burned for each day
+9. Progress difficulty gradually over the {num_days} days
+
+Return ONLY valid JSON in this exact format (NO markdown, NO backticks):
+{{
+    "plan_title": "Personalized {num_days}-Day Workout Plan",
+    "total_days": {num_days},
+    "days": [
+        {{
+            "day_number": 1,
+            "day_name": "Day 1 - Full Body",
+            "is_rest_day": false,
+            "total_duration_minutes": 45,
+            "total_calories": 350,
+            "exercises": [
+                {{
+                    "name": "Exercise name",
+                    "workout_type": "cardio",
+                    "reps_or_duration": "3 sets of 12 reps" or "5 minutes",
+                    "calories": 50
+                }}
+            ]
+        }}
+    ]
+}}"""
+
+    cache_params = {
+        **_profile_cache_params(age, user.gender, bmi, params),
+        "fitness_level": generation_cache.normalize_text(fitness_level),
+        "goal": generation_cache.normalize_text(goal),
+        "num_days": num_days
+    }
+    return _generate_json_cached(
+        'workout_plan', cache_params, prompt, params,
+        schema=response_parser.WORKOUT_PLAN, expected=range(1, num_days + 1)
+    )
+
+
+def save_workout_plan_payload(user, params, workout_plan):
+    num_days = params['num_days']
+
+    # Store in database - store the entire multi-day plan
+    workout = Workout.objects.create(
+        user=user,
+        workout_name=workout_plan.get('plan_title', f'{num_days}-Day Workout Plan'),
+        workout_type='AI Generated',
+        duration=num_days,  # Store number of days
+        calories_burned=sum([day.get('total_calories', 0) for day in workout_plan.get('days', [])]),
+        intensity='moderate',
+        date=date.fromisoformat(params['start_date']),
+        description=json.dumps(workout_plan.get('days', []))  # Store all days
+    )
+    index_workout(workout, workout_plan.get('days', []))
+
+    return {
+        "success": True,
+        "workout_plan": workout_plan,
+        "workout_id": workout.id
+    }
+
+
+# ---------------- AI MARATHON TRAINING PLANNER ---------------- #
+def generate_marathon_plan_payload(user, params):
+    age = params['age']
+    bmi = _bmi(user.weight, user.height)
+    experience_level = params['experience_level']
+    target_distance = params['target_distance']
+    avg_steps = params['avg_steps']
+    spo2 = params['spo2']
+    resting_heart_rate = params['resting_heart_rate']
+    sleep_hours = params['sleep_hours']
+    goal_time_hours = params['goal_time_hours']
+    target_date = date.fromisoformat(params['target_date'])
+    weeks_until_marathon = max(1, (target_date - date.fromisoformat(params['start_date'])).days // 7)
+
+    # Create enhanced prompt with health data
+    prompt = f"""Generate a personalized weekly marathon training plan in JSON format for:
+    
+User Profile:
+- Age: {age}
+- Gender: {user.gender}
+- Weight: {user.weight} kg
+- Height: {user.height} cm
+- BMI: {bmi:.1f}
+- Experience Level: {experience_level}
+- Target: {target_distance}
+
+Health Data:
+- Average Daily Steps: {avg_steps}
+- SpO2 Level: {spo2}%
+- Resting Heart Rate: {resting_heart_rate} BPM
+- Average Sleep: {sleep_hours} hours
+
+Training Goals:
+- Goal Time: {goal_time_hours} hours
+- Marathon Date: {target_date}
+- Weeks Until Marathon: {weeks_until_marathon}
+
+Requirements:
+1. Create a 7-day weekly training schedule appropriate for Week 1
+2. Consider their current fitness level (steps, heart rate) when designing intensity
+3. Include different run types (easy run, tempo run, long run, rest day, cross-training)
+4. Provide specific distances for each run based on their experience level
+5. Calculate weekly mileage and estimated calories burned
+6. Balance training with recovery considering their sleep patterns
+7. Design the plan to help them achieve their goal time
+
+Return ONLY valid JSON in this exact format (NO markdown, NO backticks):
+{{
+    "plan_title": "Marathon Training Plan - Week 1",
+    "weekly_mileage_km": 35,
+    "workouts_per_week": 5,
+    "estimated_weekly_calories": 2500,
+    "weekly_schedule": [
+        {{
+            "day": "Monday",
+            "run_type": "Easy Run",
+            "distance_km": 5,
+            "notes": "Comfortable pace"
+        }},
+        {{
+            "day": "Tuesday",
+            "run_type": "Rest Day",
+            "distance_km": 0,
+            "notes": "Recovery and stretching"
+        }}
+    ]
+}}"""
+
+    cache_params = {
+        **_profile_cache_params(age, user.gender, bmi, params),
+        "experience_level": generation_cache.normalize_text(experience_level),
+        "target_distance": generation_cache.normalize_text(target_distance),
+        "resting_heart_rate": generation_cache.bucket(resting_heart_rate, 5),
+        "goal_time_hours": goal_time_hours,
+        "weeks_until_marathon": weeks_until_marathon
+    }
+    return _generate_json_cached(
+        'marathon_plan', cache_params, prompt, params,
+        schema=response_parser.MARATHON_WEEK, expected=response_parser.WEEKDAYS
+    )
+
+
+def save_marathon_plan_payload(user, params, marathon_plan):
+    # Store in database, with an empty completion bitset covering the schedule
+    schedule = marathon_plan.get('weekly_schedule', [])
+    marathon = Marathon.objects.create(
+        user=user,
+        marathon_name=marathon_plan.get('plan_title', 'AI Marathon Plan'),
+        distance=marathon_plan.get('weekly_mileage_km', 0),
+        target_date=date.fromisoformat(params['target_date']),
+        status='training',
+        notes=json.dumps(schedule),
+        completion_bits=completion.from_indices((), len(schedule)),
+        completion_total=len(schedule)
+    )
+
+    return {
+        "success": True,
+        "marathon_plan": marathon_plan,
+        "marathon_id": marathon.id
+    }
+
+
+# ---------------- REGENERATE WORKOUT PLAN BASED ON USER BEHAVIOR ---------------- #
+def _workout_history_stats(user, today):
+    last_30_days = today - timedelta(days=30)
+
+    # Get user's workout history from Workout table (completed AI workouts)
+    completed_workouts = Workout.objects.filter(
+        user=user,
+        workout_type='AI Generated',
+        date__gte=last_30_days
+    )
+
+    # Analyze user behavior from completed workouts
+    total_workouts = completed_workouts.count()
+    total_calories = sum([w.calories_burned for w in completed_workouts])
+    avg_duration = sum([w.duration for w in completed_workouts]) / total_workouts if total_workouts > 0 else 0
+
+    return total_workouts, total_calories, avg_duration
+
+
+def generate_adaptive_workout_payload(user, params):
+    today = date.fromisoformat(params['start_date'])
+    total_workouts, total_calories, avg_duration = _workout_history_stats(user, today)
+
+    # Calculate age and BMI
+    age = today.year - user.date_of_birth.year
+    bmi = _bmi(user.weight, user.height)
+
+    # Create adaptive prompt
+    prompt = f"""Generate an ADAPTIVE workout plan based on user's actual behavior:
+
+User Profile:
+- Age: {age}, Gender: {user.gender}
+- Weight: {user.weight} kg, Height: {user.height} cm, BMI: {bmi:.1f}
+- Goal: {user.fitness_goal or 'general_fitness'}
+
+User's Last 30 Days Activity:
+- Total Workouts Completed: {total_workouts}
+- Total Calories Burned: {total_calories}
+- Average Workout Duration: {avg_duration:.0f} minutes
+
+ADAPT the plan to:
+1. Match their actual workout frequency
+2. Progress gradually from their current level
+3. Challenge them appropriately based on their consistency
+
+Return ONLY valid JSON (NO markdown):
+{{
+    "plan_title": "Adaptive Workout Plan",
+    "total_duration_minutes": 45,
+    "total_calories": 350,
+    "exercise_count": 8,
+    "adaptation_note": "Brief note on how this plan adapts to their behavior",
+    "exercises": [
+        {{"name": "Exercise", "workout_type": "cardio", "reps_or_duration": "3x12", "calories": 50}}
+    ]
+}}"""
+
+    return {
+        "workout_plan": _generate_json(prompt),
+        "total_workouts": total_workouts,
+        "avg_duration": avg_duration
+    }
+
+
+def save_adaptive_workout_payload(user, params, payload):
+    workout_plan = payload['workout_plan']
+
+    # Store in database
+    workout = Workout.objects.create(
+        user=user,
+        workout_name=workout_plan.get('plan_title', 'Adaptive Workout Plan'),
+        workout_type='AI Adaptive',
+        duration=workout_plan.get('total_duration_minutes', 0),
+        calories_burned=workout_plan.get('total_calories', 0),
+        intensity='moderate',
+        date=date.fromisoformat(params['start_date']),
+        description=json.dumps(workout_plan.get('exercises', []))
+    )
+    index_workout(workout, workout_plan.get('exercises', []))
+
+    return {
+        "success": True,
+        "workout_plan": workout_plan,
+        "workout_id": workout.id,
+        "user_stats": {
+            "total_workouts_last_30_days": payload['total_workouts'],
+            "avg_duration": round(payload['avg_duration'], 1)
+        }
+    }
+
+
+# ---------------- GENERATE DAILY WORKOUT (NEW SYSTEM) ---------------- #
+def _previous_daily_workout(user, today):
+    """Yesterday's daily workout, its feedback and today's day number in the progression"""
+    yesterday = today - timedelta(days=1)
+    prev_workout = Workout.objects.filter(
+        user=user,
+        is_daily_plan=True,
+        date=yesterday
+    ).order_by('-created_at').first()
+
+    prev_feedback = prev_workout.user_feedback if prev_workout else None
+    prev_day_number = prev_workout.plan_day_number if prev_workout else 0
+
+    return prev_workout, prev_feedback, prev_day_number + 1
+
+
+def _build_daily_workout_locally(params, bmi, current_day_number, prev_workout, prev_feedback):
+    """The daily workout from workout_builder, with yesterday's exercises kept out"""
+    avoid_exercises = []
+    if prev_workout and prev_workout.description:
+        try:
+            avoid_exercises = [exercise.get('name') for exercise in json.loads(prev_workout.description)]
+        except (ValueError, AttributeError):
+            avoid_exercises = []
+    return build_daily_workout(
+        params['fitness_level'], params['goal'], bmi, params['weight'],
+        day_number=current_day_number,
+        previous_feedback=prev_feedback,
+        previous_calories=prev_workout.calories_burned if prev_workout else None,
+        avoid_exercises=avoid_exercises
+    )
+
+
+def generate_daily_workout_payload(user, params):
+    """
+    Today's workout from Gemini, or from the local builder with params['engine'] == 'local'
+
+    The local builder (workout_builder.py) is also used when the model call
+    fails, so a daily workout request doesn't fail with the model.
+    """
+    today = date.fromisoformat(params['start_date'])
+    age = params['age']
+    weight = params['weight']
+    height = params['height']
+    bmi = _bmi(weight, height)
+    fitness_level = params['fitness_level']
+    goal = params['goal']
+    avg_steps = params['avg_steps']
+    sleep_hours = params['sleep_hours']
+    spo2 = params['spo2']
+
+    # Get yesterday's workout and feedback for progression
+    prev_workout, prev_feedback, current_day_number = _previous_daily_workout(user, today)
+    prev_day_number = current_day_number - 1
+
+    if params.get('engine') == 'local':
+        return {
+            "workout_data": _build_daily_workout_locally(params, bmi, current_day_number, prev_workout, prev_feedback),
+            "day_number": current_day_number,
+            "previous_feedback": prev_feedback
+        }
+
+    # Determine difficulty adjustment based on feedback
+    difficulty_adjustment = ""
+    if prev_feedback == 'easy':
+        difficulty_adjustment = "INCREASE difficulty by 15%. Add more reps, sets, or weight. User found previous workout too easy."
+    elif prev_feedback == 'difficult':
+        difficulty_adjustment = "DECREASE difficulty by 15%. Reduce reps, sets, or weight. User found previous workout too hard."
+    elif prev_feedback == 'just_right':
+        difficulty_adjustment = "MAINTAIN similar difficulty level. User found previous workout perfect."
+    else:
+        difficulty_adjustment = "This is the first workout. Start with moderate difficulty appropriate for their fitness level."
+
+    # Get previous workout details for context
+    prev_workout_summary = ""
+    if prev_workout:
+        try:
+            prev_exercises = json.loads(prev_workout.description) if prev_workout.description else []
+            prev_workout_summary = f"\nPrevious Workout (Day {prev_day_number}):\n"
+            prev_workout_summary += f"- Total Duration: {prev_workout.duration} minutes\n"
+            prev_workout_summary += f"- Total Calories: {prev_workout.calories_burned}\n"
+            prev_workout_summary += f"- Exercises: {len(prev_exercises)}\n"
+            prev_workout_summary += f"- User Feedback: {prev_feedback or 'No feedback'}\n"
+        except:
+            prev_workout_summary = ""
+
+    # Create prompt for daily workout
+    prompt = f"""Generate a personalized workout for TODAY ONLY (Day {current_day_number}) in JSON format:
+
+User Profile:
+- Age: {age}
+- Gender: {user.gender}
+- Weight: {weight} kg
+- Height: {height} cm
+- BMI: {bmi:.1f}
+- Fitness Level: {fitness_level}
+- Goal: {goal}
+
+Health Data:
+- Average Daily Steps: {avg_steps}
+- Average Sleep: {sleep_hours} hours
+- SpO2 Level: {spo2}%
+
+{prev_workout_summary}
+
+DIFFICULTY ADJUSTMENT:
+{difficulty_adjustment}
+
+Requirements:
+1. Generate 6-8 exercises for TODAY only
+2. Include specific workout types (cardio, strength, flexibility, hiit, yoga, core)
+3. Provide specific reps/duration for each exercise
+4. Calculate estimated calories for each exercise
+5. Total workout should be 30-60 minutes
+6. {difficulty_adjustment}
+7. Ensure variety - don't repeat same exercises as yesterday
+
+Return ONLY valid JSON (NO markdown, NO backticks):
+{{
+    "workout_name": "Day {current_day_number} - [Focus Area]",
+    "total_duration_minutes": 45,
+    "total_calories": 350,
+    "exercises": [
+        {{
+            "name": "Exercise name",
+            "workout_type": "cardio",
+            "reps_or_duration": "3 sets of 12 reps",
+            "calories": 50
+        }}
+    ]
+}}"""
+
+    cache_params = {
+        **_profile_cache_params(age, user.gender, bmi, params),
+        "fitness_level": generation_cache.normalize_text(fitness_level),
+        "goal": generation_cache.normalize_text(goal),
+        "day_number": current_day_number,
+        "previous_feedback": prev_feedback
+    }
+
+    try:
+        # Today's workout is what the user is waiting on, so it is hedged
+        workout_data = _generate_json_cached(
+            'daily_workout', cache_params, prompt, params, hedge_after=llm_gateway.HEDGE_AFTER
+        )
+    except Exception as e:
+        logger.warning("Error generating daily workout with Gemini, using the local builder: %s", e)
+        llm_metrics.record_fallback('workout_builder')
+        workout_data = _build_daily_workout_locally(params, bmi, current_day_number, prev_workout, prev_feedback)
+
+    return {
+        "workout_data": workout_data,
+        "day_number": current_day_number,
+        "previous_feedback": prev_feedback
+    }
+
+
+def save_daily_workout_payload(user, params, payload):
+    workout_data = payload['workout_data']
+    current_day_number = payload['day_number']
+
+    # Store in database as daily plan
+    workout = Workout.objects.create(
+        user=user,
+        workout_name=workout_data.get('workout_name', f'Day {current_day_number} Workout'),
+        workout_type='Daily Progressive',
+        duration=workout_data.get('total_duration_minutes', 0),
+        calories_burned=workout_data.get('total_calories', 0),
+        intensity='moderate',
+        date=date.fromisoformat(params['start_date']),
+        description=json.dumps(workout_data.get('exercises', [])),
+        is_daily_plan=True,
+        plan_day_number=current_day_number
+    )
+    index_workout(workout, workout_data.get('exercises', []))
+
+    return {
+        "success": True,
+        "workout": {
+            "id": workout.id,
+            "workout_name": workout.workout_name,
+            "day_number": current_day_number,
+            "total_duration": workout.duration,
+            "total_calories": workout.calories_burned,
+            "exercises": workout_data.get('exercises', []),
+            "previous_feedback": payload['previous_feedback']
+        }
+    }
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import threading
+from datetime import timedelta
+
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import GenerationCacheEntry
+
+
+CACHE_TTL = timedelta(days=7)
+CACHE_MAX_ENTRIES = 5000   # Least recently used entries beyond this are evicted
+
+CALORIE_BUCKET = 50        # kcal
+MACRO_BUCKET = 10          # g, for intake feedback
+AGE_BUCKET = 5             # years
+STEPS_BUCKET = 1000
+
+_counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name, amount=1):
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def bucket(value, size):
+    """Round a numeric input to the nearest multiple of size so near-identical requests share an entry"""
+    try:
+        return int(round(float(value) / size) * size)
+    except (TypeError, ValueError):
+        return value
+
+
+def normalize_text(value):
+    return str(value or "").strip().lower()
+
+
+def normalize_list(value):
+    """Comma-separated string or list -> sorted, de-duplicated, lower-case list"""
+    if isinstance(value, str):
+        value = value.split(",")
+    return sorted({normalize_text(v) for v in value or [] if normalize_text(v)})
+
+
+def feedback_params(feedback):
+    """Bucketed intake feedback as it reaches the meal plan prompt; None when there is none"""
+    if not feedback:
+        return None
+    return {
+        "calories": bucket(feedback.get("calories"), CALORIE_BUCKET),
+        "protein": bucket(feedback.get("protein"), MACRO_BUCKET),
+        "carbs": bucket(feedback.get("carbs"), MACRO_BUCKET),
+        "fat": bucket(feedback.get("fat"), MACRO_BUCKET)
+    }
+
+
+def meal_chunk_params(calories, diet_type, allergies, goal, days, slot, feedback=None):
+    """Cache parameters of one meal plan chunk (slot = chunk position in the plan)"""
+    return {
+        "calories": bucket(calories, CALORIE_BUCKET),
+        "diet_type": normalize_text(diet_type),
+        "allergies": normalize_list(allergies),
+        "goal": normalize_text(goal),
+        "days": days,
+        "slot": slot,
+        "feedback": feedback_params(feedback)
+    }
+
+
+def cache_key(kind, params):
+    raw = json.dumps({"kind": kind, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get(kind, params):
+    """Cached payload for normalized params, or None on a miss or expired entry"""
+    key = cache_key(kind, params)
+    entry = GenerationCacheEntry.objects.filter(key=key).only("id", "payload", "expires_at").first()
+
+    if entry is None or entry.expires_at <= timezone.now():
+        if entry is not None:
+            entry.delete()
+        _count("misses")
+        return None
+
+    GenerationCacheEntry.objects.filter(id=entry.id).update(hits=F("hits") + 1, last_used_at=timezone.now())
+    _count("hits")
+    return entry.payload
+
+
+def put(kind, params, payload):
+    """Store a parsed model response and evict least recently used entries over the limit"""
+    current_time = timezone.now()
+    GenerationCacheEntry.objects.update_or_create(
+        key=cache_key(kind, params),
+        defaults={
+            "kind": kind,
+            "params": params,
+            "payload": payload,
+            "last_used_at": current_time,
+            "expires_at": current_time + CACHE_TTL
+        }
+    )
+    _count("stores")
+
+    excess = GenerationCacheEntry.objects.count() - CACHE_MAX_ENTRIES
+    if excess > 0:
+        stale_ids = list(
+            GenerationCacheEntry.objects.order_by("last_used_at").values_list("id", flat=True)[:excess]
+        )
+        GenerationCacheEntry.objects.filter(id__in=stale_ids).delete()
+        _count("evictions", len(stale_ids))
+
+
+def stats():
+    """Hit/miss counters of this process plus totals stored in the database"""
+    with _counters_lock:
+        counters = dict(_counters)
+
+    lookups = counters["hits"] + counters["misses"]
+    by_kind = {
+        row["kind"]: {"entries": row["entries"], "hits": row["total_hits"] or 0}
+        for row in GenerationCacheEntry.objects.values("kind").annotate(
+            entries=Count("id"), total_hits=Sum("hits")
+        )
+    }
+
+    return {
+        "process": {
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 3) if lookups else None
+        },
+        "stored": by_kind
+    }
+
@@ -0,0 +1,78 @@
+import base64
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.urls import reverse
+
+
+# Generated meal images live under MEDIA_ROOT, one file per distinct content
+IMAGE_STORE_DIR = os.path.join(settings.MEDIA_ROOT, "meal_images")
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+}
+
+DATA_URL_RE = re.compile(r"^data:image/(?P<subtype>[\w.+-]+);base64,", re.IGNORECASE)
+
+
+def image_extension(data):
+    """File extension for image bytes, sniffed from the magic number (PNG when unknown)"""
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpg"
+    return "png"
+
+
+def image_path(digest, ext):
+    # Two levels of fan-out keep directories small once there are many dishes
+    return os.path.join(IMAGE_STORE_DIR, digest[:2], digest[2:4], f"{digest}.{ext}")
+
+
+def image_url(digest, ext):
+    return reverse("meal_image", kwargs={"digest": digest, "ext": ext})
+
+
+def store_image(data):
+    """
+    Write image bytes to the content-addressed store
+
+    The file name is the sha256 of the bytes, so storing the same image
+    twice is a no-op. Files are written to a temporary name and renamed into
+    place so readers never see a partial image.
+
+    Args:
+        data (bytes): Raw image bytes
+
+    Returns:
+        str: Short URL the image is served from
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    ext = image_extension(data)
+    path = image_path(digest, ext)
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    return image_url(digest, ext)
+
+
+def decode_data_url(value):
+    """Image bytes of a base64 data URL, or None if the value is not one"""
+    if not value or not DATA_URL_RE.match(value):
+        return None
+    try:
+        return base64.b64decode(value.split(",", 1)[1], validate=True)
+    except (ValueError, TypeError):
+        return None
@@ -0,0 +1,195 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .ai_meal_planner import generate_meal_image
+from .image_store import store_image
+from .models import FoodCatalog, GenerationJob, MealItem
+
+
+logger = logging.getLogger(__name__)
+
+
+# Plan days (from the plan start) whose dishes get images ahead of time
+WARM_DAYS = 3
+
+# Threads per warming job
+WARM_WORKERS = 4
+
+# Budget shared by every warming job in this worker process
+MAX_CONCURRENT_IMAGES = 4
+IMAGES_PER_MINUTE = 30
+
+# Warming jobs included in stats()
+STATS_WINDOW = timedelta(hours=24)
+
+
+class RateLimiter:
+    """Spaces calls evenly so no more than `per_minute` start in any minute"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            current = time.monotonic()
+            start_at = max(current, self.next_at)
+            self.next_at = start_at + self.interval
+        time.sleep(max(0.0, start_at - current))
+
+
+_image_slots = threading.BoundedSemaphore(MAX_CONCURRENT_IMAGES)
+_image_rate = RateLimiter(IMAGES_PER_MINUTE)
+
+
+def schedule_image_warming(user, start_date, days=WARM_DAYS):
+    """Queue a warm_images job for the first `days` days of a freshly saved plan"""
+    # Imported here because jobs imports this module for its handlers
+    from .jobs import enqueue_job
+
+    return enqueue_job(user, 'warm_images', {
+        "start_date": str(start_date),
+        "days": days
+    })
+
+
+def _dishes_to_warm(user, start_date, end_date):
+    """
+    Unique dishes in the user's plan between two dates, split by image status
+
+    Catalog rows of the same dish name share one image (see food_catalog).
+
+    Returns:
+        tuple: (dishes without an image as {food_id: (name, meal_type)}, number already cached)
+    """
+    rows = (
+        MealItem.objects.filter(meal__user=user, meal__date__gte=start_date, meal__date__lte=end_date)
+        .order_by('meal__date', 'id')
+        .values_list('food_id', 'food__name_hash', 'food__name', 'meal__meal_type', 'food__image_url')
+    )
+
+    missing = {}
+    cached = set()
+    for food_id, name_hash, name, meal_type, image_url in rows:
+        if image_url:
+            cached.add(name_hash)
+        else:
+            # The first meal a dish appears in sets the meal type of its prompt
+            missing.setdefault(name_hash, (food_id, name, meal_type))
+    missing = {
+        food_id: (name, meal_type)
+        for name_hash, (food_id, name, meal_type) in missing.items()
+        if name_hash not in cached
+    }
+    return missing, len(cached)
+
+
+def _generate_image(name, meal_type):
+    """Generate and store one dish image within the process budget; returns its URL or None"""
+    with _image_slots:
+        _image_rate.wait()
+        image_data = generate_meal_image(name, meal_type)
+    if not image_data:
+        return None
+    return store_image(image_data)
+
+
+def generate_warm_images_payload(user, params):
+    """
+    Generate images for the dishes of the next plan days that don't have one
+
+    Each unique dish is generated once on a bounded thread pool. Files go to
+    the content-addressed image store; the catalog rows are only updated in
+    save_warm_images_payload. Progress counters are reported to the job row
+    as dishes finish.
+    """
+    from .jobs import report_progress
+
+    start_date = date.fromisoformat(params['start_date'])
+    end_date = start_date + timedelta(days=params['days'] - 1)
+    missing, cached = _dishes_to_warm(user, start_date, end_date)
+
+    progress = {
+        "dishes": len(missing) + cached,
+        "cached": cached,
+        "generated": 0,
+        "failed": 0
+    }
+    report_progress(progress)
+
+    images = {}
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(WARM_WORKERS, len(missing))) as pool:
+            futures = {
+                pool.submit(contextvars.copy_context().run, _generate_image, name, meal_type): food_id
+                for food_id, (name, meal_type) in missing.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    url = future.result()
+                except Exception as e:
+                    logger.warning("Error warming meal image: %s", e)
+                    url = None
+
+                if url:
+                    images[str(futures[future])] = url
+                    progress["generated"] += 1
+                else:
+                    progress["failed"] += 1
+                report_progress(progress)
+
+    return {"images": images, "progress": progress}
+
+
+def save_warm_images_payload(user, params, payload):
+    for food_id, url in payload["images"].items():
+        # Every row of the dish gets the image; keep one generated on demand while the job was running
+        FoodCatalog.objects.filter(
+            name_hash__in=FoodCatalog.objects.filter(id=int(food_id)).values('name_hash'),
+            image_url__isnull=True
+        ).update(image_url=url)
+
+    progress = payload["progress"]
+    return {
+        "success": True,
+        **progress,
+        "hit_rate": round(progress["cached"] / progress["dishes"], 3) if progress["dishes"] else None
+    }
+
+
+def stats():
+    """Warming counters of recent jobs plus image coverage of the food catalog"""
+    totals = {"jobs": 0, "dishes": 0, "cached": 0, "generated": 0, "failed": 0}
+    jobs = GenerationJob.objects.filter(
+        kind='warm_images', created_at__gte=timezone.now() - STATS_WINDOW
+    ).values_list('status', 'progress')
+    by_status = {}
+    for job_status, progress in jobs:
+        by_status[job_status] = by_status.get(job_status, 0) + 1
+        totals["jobs"] += 1
+        for key in ("dishes", "cached", "generated", "failed"):
+            totals[key] += (progress or {}).get(key, 0)
+
+    catalog = FoodCatalog.objects.aggregate(
+        dishes=Count('id'),
+        with_image=Count('id', filter=Q(image_url__isnull=False))
+    )
+
+    return {
+        "window_hours": STATS_WINDOW.total_seconds() / 3600,
+        "jobs": by_status,
+        "totals": totals,
+        "hit_rate": round(totals["cached"] / totals["dishes"], 3) if totals["dishes"] else None,
+        "catalog": {
+            **catalog,
+            "coverage": round(catalog["with_image"] / catalog["dishes"], 3) if catalog["dishes"] else None
+        }
+    }
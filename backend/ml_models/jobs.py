@@ -0,0 +1,141 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import GenerationJob
+from . import generation, image_warmer, llm_metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+# kind -> (generate, save, error prefix); generate may call the model but must not
+# write, save persists the payload and returns the response body stored on the job
+JOB_HANDLERS = {
+    'meal_plan': (generation.generate_meal_plan_payload, generation.save_meal_plan_payload, 'Failed to generate meal plan'),
+    'workout_plan': (generation.generate_workout_plan_payload, generation.save_workout_plan_payload, 'Failed to generate workout plan'),
+    'marathon_plan': (generation.generate_marathon_plan_payload, generation.save_marathon_plan_payload, 'Failed to generate marathon plan'),
+    'adaptive_workout': (generation.generate_adaptive_workout_payload, generation.save_adaptive_workout_payload, 'Failed to regenerate workout plan'),
+    'daily_workout': (generation.generate_daily_workout_payload, generation.save_daily_workout_payload, 'Failed to generate daily workout'),
+    'warm_images': (image_warmer.generate_warm_images_payload, image_warmer.save_warm_images_payload, 'Failed to warm meal images'),
+}
+
+# A running job whose worker has not finished within the lease is considered lost
+JOB_LEASE = timedelta(minutes=10)
+
+# Delay before retrying a failed attempt, multiplied by the attempt number
+RETRY_BACKOFF = timedelta(seconds=30)
+
+ACTIVE_STATUSES = [GenerationJob.STATUS_PENDING, GenerationJob.STATUS_RUNNING]
+
+# Job being run by the current thread, for report_progress
+_running = threading.local()
+
+
+def enqueue_job(user, kind, params):
+    """
+    Queue a generation job for the worker
+
+    If the user already has a pending or running job of the same kind with
+    the same parameters (e.g. a double tap or client retry), that job is
+    returned instead of queueing a duplicate.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    with transaction.atomic():
+        # Serialize enqueues per user so concurrent requests see each other's jobs
+        get_user_model().objects.select_for_update().filter(pk=user.pk).first()
+
+        for job in GenerationJob.objects.filter(user=user, kind=kind, status__in=ACTIVE_STATUSES):
+            if job.params == params:
+                return job
+
+        return GenerationJob.objects.create(user=user, kind=kind, params=params)
+
+
+def claim_next_job():
+    """Lock the oldest runnable job, mark it running and return it (None if the queue is empty)"""
+    while True:
+        with transaction.atomic():
+            current_time = timezone.now()
+            stale_before = current_time - JOB_LEASE
+            job = (
+                GenerationJob.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status=GenerationJob.STATUS_PENDING, run_after__lte=current_time) |
+                    Q(status=GenerationJob.STATUS_RUNNING, started_at__lt=stale_before)
+                )
+                .order_by('created_at')
+                .first()
+            )
+            if job is None:
+                return None
+
+            if job.attempts >= job.max_attempts:
+                # The worker running the last attempt was lost
+                job.status = GenerationJob.STATUS_FAILED
+                job.error = job.error or "Job timed out"
+                job.finished_at = timezone.now()
+                job.save(update_fields=['status', 'error', 'finished_at'])
+                continue
+
+            job.status = GenerationJob.STATUS_RUNNING
+            job.started_at = timezone.now()
+            job.attempts += 1
+            job.save(update_fields=['status', 'started_at', 'attempts'])
+            return job
+
+
+def report_progress(progress):
+    """Store progress counters on the job the current thread is running (no-op outside a job)"""
+    job_id = getattr(_running, 'job_id', None)
+    if job_id is not None:
+        GenerationJob.objects.filter(pk=job_id).update(progress=progress)
+
+
+def run_job(job):
+    """
+    Generate and persist a claimed job
+
+    The payload is saved in the same transaction that marks the job as
+    succeeded, with the job row locked. A job that was retried after a lost
+    worker, or claimed twice, therefore saves its plan exactly once.
+    """
+    generate, save, error_prefix = JOB_HANDLERS[job.kind]
+
+    try:
+        _running.job_id = job.id
+        try:
+            with llm_metrics.attribute(job.kind, job.user_id):
+                payload = generate(job.user, job.params)
+        finally:
+            _running.job_id = None
+
+        with transaction.atomic():
+            locked = GenerationJob.objects.select_for_update().select_related('user').get(pk=job.pk)
+            if locked.status == GenerationJob.STATUS_SUCCEEDED:
+                return locked
+
+            locked.result = save(locked.user, locked.params, payload)
+            locked.status = GenerationJob.STATUS_SUCCEEDED
+            locked.error = ""
+            locked.finished_at = timezone.now()
+            locked.save(update_fields=['result', 'status', 'error', 'finished_at'])
+            return locked
+    except Exception as e:
+        logger.warning("Generation job %s (%s) failed on attempt %s: %s", job.id, job.kind, job.attempts, e, exc_info=True)
+        failed = job.attempts >= job.max_attempts
+        GenerationJob.objects.filter(pk=job.pk).exclude(status=GenerationJob.STATUS_SUCCEEDED).update(
+            status=GenerationJob.STATUS_FAILED if failed else GenerationJob.STATUS_PENDING,
+            error=f"{error_prefix}: {e}",
+            run_after=timezone.now() + RETRY_BACKOFF * job.attempts,
+            finished_at=timezone.now() if failed else None
+        )
+        job.refresh_from_db()
+        return job
@@ -0,0 +1,353 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+from google import genai
+from google.genai import errors, types
+
+from . import llm_metrics, response_parser
+
+
+# Every Gemini call in the backend goes through this module: one pooled
+# client per process, a deadline per call, bounded retries with jitter, a
+# circuit breaker shared by all callers and optional hedged requests.
+
+logger = logging.getLogger(__name__)
+
+TEXT_MODEL = 'gemini-2.5-flash'
+IMAGE_MODEL = 'imagen-3.0-generate-001'
+
+DEFAULT_DEADLINE = 60.0   # Seconds a text call may take, retries included
+IMAGE_DEADLINE = 90.0     # Seconds an image call may take, retries included
+MAX_RETRIES = 2           # Extra attempts after a retryable failure
+BACKOFF_BASE = 1.0        # Seconds; the jitter range doubles with every retry
+BACKOFF_MAX = 8.0         # Upper bound of one backoff sleep
+GATEWAY_THREADS = 16      # Calls (including hedges) in flight per process
+
+BREAKER_WINDOW = 60.0       # Seconds of call outcomes the breaker looks at
+BREAKER_MIN_CALLS = 5       # Outcomes needed in the window before it can open
+BREAKER_ERROR_RATE = 0.5    # Failure share in the window that opens it
+BREAKER_COOLDOWN = 30.0     # Seconds open before a single probe call is let through
+
+# Latency-critical callers pass this as hedge_after: if the first request has
+# not answered by then a second identical one is sent and the faster one wins
+HEDGE_AFTER = 10.0
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """The model did not return a usable response within the call's deadline"""
+
+
+class CircuitOpenError(LLMUnavailable):
+    """The circuit breaker is open, the call was not attempted"""
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker shared by every call in the process
+
+    closed: calls go through and their outcomes are recorded. When at least
+    BREAKER_MIN_CALLS outcomes in the last BREAKER_WINDOW seconds have an
+    error rate of BREAKER_ERROR_RATE or more the breaker opens.
+    open: calls fail immediately with CircuitOpenError for BREAKER_COOLDOWN.
+    half_open: one probe call is let through; success closes the breaker,
+    failure opens it again.
+    """
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 error_rate=BREAKER_ERROR_RATE, cooldown=BREAKER_COOLDOWN):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.outcomes = deque()  # (monotonic time, ok)
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.probing = False
+        self.times_opened = 0
+
+    def _trim(self, now):
+        while self.outcomes and self.outcomes[0][0] < now - self.window:
+            self.outcomes.popleft()
+
+    def allow(self):
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+                self.probing = False
+            if self.state == 'half_open' and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record(self, ok):
+        with self.lock:
+            now = time.monotonic()
+            if self.state == 'half_open':
+                self.probing = False
+                if ok:
+                    self.state = 'closed'
+                    self.outcomes.clear()
+                else:
+                    self._open(now)
+                return
+            if self.state == 'open':
+                # A slow call started before the breaker opened
+                return
+
+            self.outcomes.append((now, ok))
+            self._trim(now)
+            failures = sum(1 for _, outcome_ok in self.outcomes if not outcome_ok)
+            if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.error_rate:
+                self._open(now)
+
+    def _open(self, now):
+        self.state = 'open'
+        self.opened_at = now
+        self.outcomes.clear()
+        self.times_opened += 1
+        llm_metrics.record_event('circuit_opened')
+        logger.warning("LLM circuit breaker opened; calls fail fast for %.0fs", self.cooldown)
+
+    def snapshot(self):
+        with self.lock:
+            self._trim(time.monotonic())
+            return {
+                "state": self.state,
+                "recent_calls": len(self.outcomes),
+                "recent_failures": sum(1 for _, ok in self.outcomes if not ok),
+                "times_opened": self.times_opened
+            }
+
+
+_client = None
+_client_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=GATEWAY_THREADS, thread_name_prefix='llm')
+breaker = CircuitBreaker()
+
+
+def get_client():
+    """The process-wide Gemini client; its HTTP connection pool is reused by every call"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_options = None
+                base_url = os.getenv('GEMINI_BASE_URL')
+                if base_url:
+                    # Points the client at another endpoint, e.g. testing.FakeModelServer
+                    http_options = types.HttpOptions(base_url=base_url)
+                _client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'), http_options=http_options)
+    return _client
+
+
+def reset():
+    """Drop the client and breaker state so the next call picks up new settings"""
+    global _client, breaker
+    with _client_lock:
+        _client = None
+    breaker = CircuitBreaker()
+
+
+def _is_retryable(error):
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    # Deadline hit while waiting, or the connection failed / timed out
+    return isinstance(error, (TimeoutError, httpx.TransportError))
+
+
+def _attempt(operation, timeout, hedge_after):
+    """
+    Run operation(timeout) on the gateway pool and wait at most `timeout` seconds
+
+    With hedge_after, a second identical request is started if the first has
+    not finished after hedge_after seconds; the first success is returned.
+    A request that is given up on keeps running until its own HTTP timeout
+    but nobody waits for it.
+    """
+    started = time.monotonic()
+    futures = [_pool.submit(operation, timeout)]
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done:
+            llm_metrics.record_event('hedge')
+            futures.append(_pool.submit(operation, timeout - hedge_after))
+
+    pending = set(futures)
+    error = None
+    while pending:
+        remaining = timeout - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result()
+            except Exception as e:
+                error = e
+
+    if error is not None and not pending:
+        raise error
+    raise TimeoutError(f"no response within {timeout:.1f}s")
+
+
+def _call(label, operation, deadline, retries, hedge_after):
+    """Run one gateway call: breaker check, attempts with jittered backoff, deadline"""
+    if not breaker.allow():
+        raise CircuitOpenError(f"{label}: circuit breaker open")
+
+    expires = time.monotonic() + deadline
+    error = None
+    for attempt in range(retries + 1):
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            result = _attempt(operation, remaining, hedge_after)
+        except Exception as e:
+            breaker.record(False)
+            error = e
+            if attempt == retries or not _is_retryable(e):
+                break
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            if time.monotonic() + delay >= expires:
+                break
+            logger.warning("%s attempt %s failed, retrying in %.1fs: %s", label, attempt + 1, delay, e)
+            llm_metrics.record_event('retry')
+            time.sleep(delay)
+            if not breaker.allow():
+                raise CircuitOpenError(f"{label}: circuit breaker open") from e
+            continue
+        breaker.record(True)
+        return result
+
+    raise LLMUnavailable(f"{label} failed: {error or 'deadline exceeded'}") from error
+
+
+def _generate_content(prompt, model, deadline, retries, hedge_after, parser):
+    """generate_content through _call, recorded in llm_metrics with sizes, tokens and parse result"""
+    def operation(timeout):
+        return get_client().models.generate_content(
+            model=model,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                http_options=types.HttpOptions(timeout=int(timeout * 1000))
+            )
+        )
+
+    started = time.perf_counter()
+    outcome = 'error'
+    text = ''
+    usage = None
+    json_ok = None
+    try:
+        response = _call(f"Gemini {model}", operation, deadline, retries, hedge_after)
+        outcome = 'ok'
+        text = response.text or ''
+        usage = response.usage_metadata
+        if parser is None:
+            return text
+        try:
+            result = parser(text)
+        except ValueError:
+            json_ok = False
+            raise
+        json_ok = True
+        return result
+    except CircuitOpenError:
+        outcome = 'circuit_open'
+        raise
+    finally:
+        llm_metrics.record_call(
+            model, outcome, time.perf_counter() - started, len(prompt), len(text),
+            usage.prompt_token_count if usage else None,
+            usage.candidates_token_count if usage else None,
+            json_ok
+        )
+
+
+def generate_text(prompt, model=TEXT_MODEL, deadline=DEFAULT_DEADLINE, retries=MAX_RETRIES, hedge_after=None):
+    """
+    Send a prompt to Gemini and return the response text
+
+    Args:
+        prompt (str): Prompt text
+        model (str): Gemini model name
+        deadline (float): Seconds the call may take in total, retries included
+        retries (int): Extra attempts after a timeout, connection error, 429 or 5xx
+        hedge_after (float): Send a duplicate request after this many seconds (None disables hedging)
+
+    Returns:
+        str: Response text
+
+    Raises:
+        CircuitOpenError: The breaker is open; callers should use their local fallback
+        LLMUnavailable: No response within the deadline
+    """
+    return _generate_content(prompt, model, deadline, retries, hedge_after, parser=None)
+
+
+def generate_json(prompt, model=TEXT_MODEL, deadline=DEFAULT_DEADLINE, retries=MAX_RETRIES, hedge_after=None,
+                  parser=response_parser.parse_json):
+    """
+    generate_text followed by parser(text), by default response_parser.parse_json
+
+    A parser raising ValueError is recorded as a failed JSON parse and the
+    error is raised to the caller.
+    """
+    return _generate_content(prompt, model, deadline, retries, hedge_after, parser=parser)
+
+
+def generate_image(prompt, model=IMAGE_MODEL, deadline=IMAGE_DEADLINE, retries=MAX_RETRIES):
+    """
+    Generate one square image for a prompt
+
+    Returns:
+        bytes: Image bytes, or None if the model returned no image (e.g. safety filtered)
+
+    Raises:
+        CircuitOpenError, LLMUnavailable: As for generate_text
+    """
+    def operation(timeout):
+        response = get_client().models.generate_images(
+            model=model,
+            prompt=prompt,
+            config=types.GenerateImagesConfig(
+                number_of_images=1,
+                aspect_ratio='1:1',
+                safety_filter_level='BLOCK_MEDIUM_AND_ABOVE',
+                person_generation='ALLOW_ADULT',
+                http_options=types.HttpOptions(timeout=int(timeout * 1000))
+            )
+        )
+        if response and response.generated_images:
+            return response.generated_images[0].image.image_bytes
+        return None
+
+    started = time.perf_counter()
+    outcome = 'error'
+    image = None
+    try:
+        image = _call(f"Imagen {model}", operation, deadline, retries, None)
+        outcome = 'ok'
+        return image
+    except CircuitOpenError:
+        outcome = 'circuit_open'
+        raise
+    finally:
+        llm_metrics.record_call(model, outcome, time.perf_counter() - started, len(prompt), len(image or b''))
+
+
+def stats():
+    """Circuit breaker state for the admin stats endpoint"""
+    return breaker.snapshot()
@@ -0,0 +1,341 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.db.models import Avg, Count, Q, Sum
+from django.utils import timezone
+
+
+# Every model call made through llm_gateway is recorded here twice: into
+# in-process histograms and counters rendered on /metrics (per worker
+# process, like any Prometheus client without a push gateway), and into a
+# buffer that a background thread writes to LLMCallLog for per-user reports.
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)  # Seconds
+
+FLUSH_INTERVAL = 10.0         # Seconds between background writes of buffered calls
+MAX_BUFFERED_CALLS = 10000    # Calls kept for the next write; the oldest are dropped beyond this
+LOG_RETENTION = timedelta(days=90)  # LLMCallLog rows older than this are deleted
+PRUNE_INTERVAL = 3600.0       # Seconds between deletes of expired rows
+
+# Estimated USD prices: (per 1M prompt tokens, per 1M response tokens) for text
+# models and per image for image models
+TOKEN_PRICES = {
+    'gemini-2.5-flash': (0.30, 2.50),
+}
+IMAGE_PRICES = {
+    'imagen-3.0-generate-001': 0.03,
+}
+
+# (endpoint, user id) the calls of the current request or job are attributed to
+_attribution = ContextVar('llm_attribution', default=('other', None))
+
+
+@contextmanager
+def attribute(endpoint, user_id=None):
+    """
+    Attribute the model calls made inside the block to an endpoint and user
+
+    The attribution is a context variable, so thread pools that start model
+    calls on behalf of the block have to run them in a copy of the current
+    context (contextvars.copy_context().run).
+    """
+    token = _attribution.set((endpoint, user_id))
+    try:
+        yield
+    finally:
+        _attribution.reset(token)
+
+
+class _Series:
+    """Histogram and counters of one (endpoint, model, outcome) label set"""
+
+    __slots__ = ('buckets', 'latency_sum', 'count', 'prompt_chars', 'response_chars',
+                 'prompt_tokens', 'response_tokens', 'json_ok', 'json_error')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # Last slot is +Inf
+        self.latency_sum = 0.0
+        self.count = 0
+        self.prompt_chars = 0
+        self.response_chars = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.json_ok = 0
+        self.json_error = 0
+
+
+class MetricsRecorder:
+    """
+    In-process LLM call metrics plus the buffer of rows for LLMCallLog
+
+    Recording a call only updates counters under a lock and appends a tuple
+    to a bounded deque; database writes happen on a daemon thread every
+    FLUSH_INTERVAL seconds (background=False leaves flushing to the caller).
+    """
+
+    def __init__(self, background=True):
+        self.background = background
+        self.lock = threading.Lock()
+        self.series = {}
+        self.fallbacks = {}
+        self.events = {}
+        self.buffer = deque(maxlen=MAX_BUFFERED_CALLS)
+        self.dropped = 0
+        self.flushed = 0
+        self.flusher = None
+        self.last_prune = 0.0
+
+    def record_call(self, model, outcome, latency, prompt_chars=0, response_chars=0,
+                    prompt_tokens=None, response_tokens=None, json_ok=None):
+        endpoint, user_id = _attribution.get()
+        key = (endpoint, model, outcome)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = _Series()
+            series.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+            series.latency_sum += latency
+            series.count += 1
+            series.prompt_chars += prompt_chars
+            series.response_chars += response_chars
+            series.prompt_tokens += prompt_tokens or 0
+            series.response_tokens += response_tokens or 0
+            if json_ok is not None:
+                if json_ok:
+                    series.json_ok += 1
+                else:
+                    series.json_error += 1
+            if len(self.buffer) == MAX_BUFFERED_CALLS:
+                self.dropped += 1
+
+        self.buffer.append((
+            time.time(), user_id, endpoint, model, outcome, latency,
+            prompt_chars, response_chars, prompt_tokens, response_tokens, json_ok
+        ))
+        if self.background and self.flusher is None:
+            self._start_flusher()
+
+    def record_fallback(self, kind):
+        """Count a local fallback used instead of (or after failing) a model call"""
+        endpoint, user_id = _attribution.get()
+        key = (endpoint, kind)
+        with self.lock:
+            self.fallbacks[key] = self.fallbacks.get(key, 0) + 1
+        self.buffer.append((time.time(), user_id, endpoint, 'local', 'fallback', 0.0, 0, 0, None, None, None))
+        if self.background and self.flusher is None:
+            self._start_flusher()
+
+    def record_event(self, event):
+        """Count a gateway event such as a retry, a hedged request or the breaker opening"""
+        with self.lock:
+            self.events[event] = self.events.get(event, 0) + 1
+
+    def _start_flusher(self):
+        with self.lock:
+            if self.flusher is not None:
+                return
+            self.flusher = threading.Thread(target=self._flush_loop, name='llm-metrics-flush', daemon=True)
+        self.flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error writing LLM call logs")
+            finally:
+                # This thread holds its own database connection
+                connection.close()
+
+    def flush(self):
+        """Write buffered calls to LLMCallLog and prune expired rows; returns the number written"""
+        from .models import LLMCallLog
+
+        rows = []
+        while self.buffer:
+            try:
+                rows.append(self.buffer.popleft())
+            except IndexError:
+                break
+
+        if rows:
+            LLMCallLog.objects.bulk_create([
+                LLMCallLog(
+                    created_at=datetime.fromtimestamp(at, tz=dt_timezone.utc),
+                    user_id=user_id,
+                    endpoint=endpoint,
+                    model=model,
+                    outcome=outcome,
+                    latency_ms=int(latency * 1000),
+                    prompt_chars=prompt_chars,
+                    response_chars=response_chars,
+                    prompt_tokens=prompt_tokens,
+                    response_tokens=response_tokens,
+                    json_ok=json_ok
+                )
+                for at, user_id, endpoint, model, outcome, latency, prompt_chars, response_chars,
+                    prompt_tokens, response_tokens, json_ok in rows
+            ], batch_size=1000)
+            self.flushed += len(rows)
+
+        if time.monotonic() - self.last_prune >= PRUNE_INTERVAL:
+            self.last_prune = time.monotonic()
+            LLMCallLog.objects.filter(created_at__lt=timezone.now() - LOG_RETENTION).delete()
+
+        return len(rows)
+
+    def render(self, breaker_state=None):
+        """Metrics in the Prometheus text exposition format"""
+        with self.lock:
+            series = [(key, s.buckets[:], s.latency_sum, s.count, s.prompt_chars, s.response_chars,
+                       s.prompt_tokens, s.response_tokens, s.json_ok, s.json_error)
+                      for key, s in sorted(self.series.items())]
+            fallbacks = sorted(self.fallbacks.items())
+            events = sorted(self.events.items())
+            dropped = self.dropped
+
+        lines = [
+            "# HELP fitwell_llm_call_seconds Latency of model calls including retries",
+            "# TYPE fitwell_llm_call_seconds histogram",
+        ]
+        for (endpoint, model, outcome), buckets, latency_sum, count, *_ in series:
+            labels = f'endpoint="{endpoint}",model="{model}",outcome="{outcome}"'
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS + (float('inf'),), buckets):
+                cumulative += bucket
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f'fitwell_llm_call_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"fitwell_llm_call_seconds_sum{{{labels}}} {latency_sum:.6f}")
+            lines.append(f"fitwell_llm_call_seconds_count{{{labels}}} {count}")
+
+        counters = [
+            ("fitwell_llm_prompt_chars_total", "Characters sent in prompts", 4),
+            ("fitwell_llm_response_chars_total", "Characters received in responses", 5),
+            ("fitwell_llm_prompt_tokens_total", "Prompt tokens reported by the API", 6),
+            ("fitwell_llm_response_tokens_total", "Response tokens reported by the API", 7),
+        ]
+        for name, help_text, index in counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for row in series:
+                endpoint, model, outcome = row[0]
+                lines.append(f'{name}{{endpoint="{endpoint}",model="{model}",outcome="{outcome}"}} {row[index]}')
+
+        lines += [
+            "# HELP fitwell_llm_json_parse_total Parsed JSON responses by result",
+            "# TYPE fitwell_llm_json_parse_total counter",
+        ]
+        for (endpoint, model, outcome), *rest in series:
+            json_ok, json_error = rest[-2], rest[-1]
+            if json_ok or json_error:
+                lines.append(f'fitwell_llm_json_parse_total{{endpoint="{endpoint}",model="{model}",result="ok"}} {json_ok}')
+                lines.append(f'fitwell_llm_json_parse_total{{endpoint="{endpoint}",model="{model}",result="error"}} {json_error}')
+
+        lines += [
+            "# HELP fitwell_llm_fallbacks_total Local fallbacks used instead of model output",
+            "# TYPE fitwell_llm_fallbacks_total counter",
+        ]
+        lines += [f'fitwell_llm_fallbacks_total{{endpoint="{endpoint}",kind="{kind}"}} {count}'
+                  for (endpoint, kind), count in fallbacks]
+
+        lines += [
+            "# HELP fitwell_llm_gateway_events_total Retries, hedged requests and breaker openings",
+            "# TYPE fitwell_llm_gateway_events_total counter",
+        ]
+        lines += [f'fitwell_llm_gateway_events_total{{event="{event}"}} {count}' for event, count in events]
+
+        if breaker_state is not None:
+            lines += [
+                "# HELP fitwell_llm_circuit_open 1 while the gateway circuit breaker is not closed",
+                "# TYPE fitwell_llm_circuit_open gauge",
+                f"fitwell_llm_circuit_open {0 if breaker_state == 'closed' else 1}",
+            ]
+
+        lines += [
+            "# HELP fitwell_llm_call_logs_dropped_total Calls dropped from a full log buffer",
+            "# TYPE fitwell_llm_call_logs_dropped_total counter",
+            f"fitwell_llm_call_logs_dropped_total {dropped}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+recorder = MetricsRecorder()
+record_call = recorder.record_call
+record_fallback = recorder.record_fallback
+record_event = recorder.record_event
+
+
+def estimated_cost(model, calls, prompt_tokens, response_tokens):
+    """Estimated USD cost of a model's calls (0 for unknown models)"""
+    if model in IMAGE_PRICES:
+        return calls * IMAGE_PRICES[model]
+    prompt_price, response_price = TOKEN_PRICES.get(model, (0.0, 0.0))
+    return ((prompt_tokens or 0) * prompt_price + (response_tokens or 0) * response_price) / 1_000_000
+
+
+def usage_report(days=30, user=None):
+    """
+    Model usage and estimated cost from LLMCallLog, per user or per endpoint
+
+    Args:
+        days (int): Days back from now to include
+        user (User): Only this user's calls, grouped by endpoint; None groups all calls by user
+
+    Returns:
+        dict: Window, grand totals and one row per user (or endpoint), most expensive first
+    """
+    from .models import LLMCallLog
+
+    calls = LLMCallLog.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+    group = 'user_id'
+    if user is not None:
+        calls = calls.filter(user=user)
+        group = 'endpoint'
+
+    rows = calls.values(group, 'model').annotate(
+        calls=Count('id', filter=~Q(outcome='fallback')),
+        failures=Count('id', filter=Q(outcome__in=['error', 'circuit_open'])),
+        fallbacks=Count('id', filter=Q(outcome='fallback')),
+        json_errors=Count('id', filter=Q(json_ok=False)),
+        prompt_tokens=Sum('prompt_tokens'),
+        response_tokens=Sum('response_tokens'),
+        avg_latency_ms=Avg('latency_ms', filter=~Q(outcome='fallback'))
+    )
+
+    totals = {"calls": 0, "failures": 0, "fallbacks": 0, "json_errors": 0,
+              "prompt_tokens": 0, "response_tokens": 0, "estimated_cost_usd": 0.0}
+    groups = {}
+    for row in rows:
+        entry = groups.setdefault(row[group], {group: row[group], **{key: 0 for key in totals}, "models": {}})
+        cost = estimated_cost(row['model'], row['calls'], row['prompt_tokens'], row['response_tokens'])
+        for key in ("calls", "failures", "fallbacks", "json_errors"):
+            entry[key] += row[key]
+            totals[key] += row[key]
+        for key in ("prompt_tokens", "response_tokens"):
+            entry[key] += row[key] or 0
+            totals[key] += row[key] or 0
+        entry["estimated_cost_usd"] += cost
+        totals["estimated_cost_usd"] += cost
+        if row['model'] != 'local':
+            entry["models"][row['model']] = {
+                "calls": row['calls'],
+                "avg_latency_ms": round(row['avg_latency_ms'] or 0)
+            }
+
+    for entry in [totals, *groups.values()]:
+        entry["estimated_cost_usd"] = round(entry["estimated_cost_usd"], 4)
+
+    return {
+        "days": days,
+        "totals": totals,
+        "rows": sorted(groups.values(), key=lambda entry: entry["estimated_cost_usd"], reverse=True)
+    }
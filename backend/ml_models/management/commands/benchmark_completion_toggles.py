@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from health_data.models import Workout
+from ml_models import completion
+from ml_models.models import WorkoutExerciseTracking
+
+
+def toggle_rows(user, workout_id, index, completed):
+    """
+    Previous toggle: ownership lookup, get_or_create of the index's row, save, count
+
+    Replayed on the tracking table as it is now, with the flag kept in
+    `notes`, so it runs the same queries the old view ran.
+    """
+    workout = Workout.objects.only('id').get(id=workout_id, user=user)
+    flag = "completed" if completed else ""
+    tracking, created = WorkoutExerciseTracking.objects.get_or_create(
+        workout=workout, exercise_index=index, defaults={"notes": flag}
+    )
+    if not created:
+        tracking.notes = flag
+        tracking.save()
+    return WorkoutExerciseTracking.objects.filter(workout=workout, notes="completed").count()
+
+
+def toggle_bitset(user, workout_id, index, completed):
+    return completion.set_completed(Workout, workout_id, user, index, completed)
+
+
+STRATEGIES = {"rows": toggle_rows, "bitset": toggle_bitset}
+
+
+class Command(BaseCommand):
+    help = "Toggle throughput of per-index tracking rows vs the completion bitset under concurrent clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=8)
+        parser.add_argument("--toggles", type=int, default=200, help="Toggles per client")
+        parser.add_argument("--plans", type=int, default=4, help="Workouts the clients share")
+        parser.add_argument("--exercises", type=int, default=120)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def run_clients(self, toggle, user, workout_ids, options):
+        errors = []
+
+        def client(seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(options["toggles"]):
+                    toggle(user, rng.choice(workout_ids), rng.randrange(options["exercises"]), rng.random() < 0.7)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [
+            threading.Thread(target=client, args=(options["seed"] * 1000 + i,))
+            for i in range(options["clients"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cost = time.perf_counter() - started
+        if errors:
+            raise CommandError(f"{len(errors)} clients failed: {errors[0]}")
+        return cost
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = User.objects.create_user(
+            username="benchmark_completion",
+            email="benchmark_completion@fitwell.local",
+            password=None
+        )
+        try:
+            exercises = [{"name": f"Exercise {i}", "calories": 10} for i in range(options["exercises"])]
+            workout_ids = []
+            for i in range(options["plans"]):
+                workout = Workout.objects.create(
+                    user=user, workout_name=f"Benchmark {i}", workout_type="AI Generated",
+                    duration=30, date=date.today()
+                )
+                completion.resize(workout, options["exercises"])
+                workout_ids.append(workout.id)
+
+            toggles = options["clients"] * options["toggles"]
+            self.stdout.write(
+                f"{options['clients']} clients x {options['toggles']} toggles over "
+                f"{options['plans']} workouts of {options['exercises']} exercises"
+            )
+            self.stdout.write(f"{'strategy':>10} {'s':>8} {'toggles/s':>10}")
+            for name, toggle in STRATEGIES.items():
+                cost = self.run_clients(toggle, user, workout_ids, options)
+                self.stdout.write(f"{name:>10} {cost:>8.2f} {toggles / cost:>10.0f}")
+
+            # The cached count must match the bits after concurrent toggles
+            for workout in Workout.objects.filter(id__in=workout_ids):
+                if workout.completed_count != completion.as_int(workout.completion_bits).bit_count():
+                    raise CommandError(f"Workout {workout.id}: completed_count out of step with its bitset")
+            self.stdout.write("bitset counts consistent")
+        finally:
+            user.delete()
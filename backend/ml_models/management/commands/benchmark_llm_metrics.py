@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ml_models import llm_metrics
+
+
+ENDPOINTS = ["meal_plan", "meal_plan_stream", "workout_plan", "daily_workout", "meal_image"]
+OUTCOMES = ["ok", "ok", "ok", "error", "circuit_open"]
+
+
+class Command(BaseCommand):
+    help = "Measure the per-call cost of recording LLM metrics, rendering /metrics and writing the call log"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=200000)
+
+    def handle(self, *args, **options):
+        calls = options["calls"]
+        # A private recorder: nothing reaches the process-wide metrics or a flush thread
+        recorder = llm_metrics.MetricsRecorder(background=False)
+        labels = [(endpoint, outcome) for endpoint in ENDPOINTS for outcome in OUTCOMES]
+
+        started = time.perf_counter()
+        for i in range(calls):
+            endpoint, outcome = labels[i % len(labels)]
+            with llm_metrics.attribute(endpoint, None):
+                pass
+        attribution_cost = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for i in range(calls):
+            endpoint, outcome = labels[i % len(labels)]
+            with llm_metrics.attribute(endpoint, None):
+                recorder.record_call("gemini-2.5-flash", outcome, (i % 500) / 100, 4000, 6000, 1000, 1500, outcome == "ok")
+        record_cost = time.perf_counter() - started - attribution_cost
+
+        started = time.perf_counter()
+        body = recorder.render(breaker_state="closed")
+        render_cost = time.perf_counter() - started
+
+        buffered = len(recorder.buffer)
+        with transaction.atomic():
+            started = time.perf_counter()
+            written = recorder.flush()
+            flush_cost = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"record_call: {record_cost / calls * 1e6:.2f} us per call ({calls} calls)")
+        self.stdout.write(f"render: {render_cost * 1000:.1f} ms for {len(body.splitlines())} lines")
+        self.stdout.write(
+            f"flush: {flush_cost * 1000:.0f} ms for {written} rows "
+            f"({flush_cost / max(written, 1) * 1e6:.0f} us per row, off the request path); "
+            f"{recorder.dropped} calls dropped from a buffer of {buffered}"
+        )
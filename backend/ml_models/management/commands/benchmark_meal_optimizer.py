@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ml_models.meal_optimizer import MEAL_SHARES, CALORIE_TOLERANCE, VARIETY_DAYS, load_food_table, optimize_meal_plan
+
+
+# (daily calories, diet type, allergies)
+PROFILES = [
+    (2000, "none", ""),
+    (1500, "vegan", ""),
+    (1800, "vegetarian", "nuts, dairy"),
+    (2500, "keto", ""),
+    (3200, "paleo", ""),
+    (1200, "vegan", "soy"),
+]
+
+
+def plan_quality(plan, calories):
+    """(share of meals within tolerance, largest meal error, main dishes repeated within VARIETY_DAYS)"""
+    within = meals = repeats = 0
+    worst = 0.0
+    last_seen = {}
+    for day in range(1, len(plan) + 1):
+        for meal, items in plan[str(day)].items():
+            error = abs(sum(item["calories"] for item in items) - calories * MEAL_SHARES[meal])
+            worst = max(worst, error)
+            within += error <= CALORIE_TOLERANCE
+            meals += 1
+
+            main = items[0]["name"].split(" (")[0]
+            if day - last_seen.get(main, -VARIETY_DAYS - 1) <= VARIETY_DAYS:
+                repeats += 1
+            last_seen[main] = day
+    return within / meals, worst, repeats
+
+
+class Command(BaseCommand):
+    help = "Time the local meal plan optimizer and report calorie accuracy and variety"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, nargs="+", default=[7, 90, 365])
+
+    def handle(self, *args, **options):
+        load_food_table()  # Exclude the one-off JSON load from the timings
+
+        self.stdout.write(
+            f"{'days':>5} {'calories':>8} {'diet':>11} {'allergies':>12} {'ms':>7} {'within':>7} {'worst':>6} {'repeats':>8}"
+        )
+        for days in options["days"]:
+            for calories, diet_type, allergies in PROFILES:
+                started = time.perf_counter()
+                plan = optimize_meal_plan(calories, diet_type, allergies, days)
+                elapsed = time.perf_counter() - started
+
+                within, worst, repeats = plan_quality(plan, calories)
+                self.stdout.write(
+                    f"{days:>5} {calories:>8} {diet_type:>11} {allergies or '-':>12} "
+                    f"{elapsed * 1000:>7.1f} {within:>7.1%} {worst:>6.0f} {repeats:>8}"
+                )
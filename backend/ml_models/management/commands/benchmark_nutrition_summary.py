@@ -0,0 +1,83 @@
+import random
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from ml_models.meal_optimizer import optimize_meal_plan
+from ml_models.models import MealItem, MealItemTracking
+from ml_models.nutrition import FEEDBACK_DAYS, NUTRIENTS, batch_feedback, item_contribution
+from ml_models.plan_storage import save_meal_plan
+
+
+def python_feedback(users, start_date, end_date):
+    """Previous computation: load every item with its latest tracking and sum in Python"""
+    feedback = {}
+    for user in users:
+        totals = defaultdict(float)
+        for item in MealItem.objects.for_user_dates(user, start_date, end_date).with_latest_tracking():
+            for nutrient, value in zip(NUTRIENTS, item_contribution(item, item.tracking_status, item.tracking_ratio or 0)):
+                totals[nutrient] += value
+        feedback[user.id] = {nutrient: round(totals[nutrient], 1) for nutrient in NUTRIENTS}
+    return feedback
+
+
+class Command(BaseCommand):
+    help = "Compare per-user Python nutrition feedback with the batched SQL aggregate on synthetic users"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        User = get_user_model()
+        today = date.today()
+        start_date = today - timedelta(days=FEEDBACK_DAYS)
+        plan = optimize_meal_plan(2000, "none", "", FEEDBACK_DAYS + 1)
+
+        users = [
+            User.objects.create_user(
+                username=f"benchmark_nutrition_{i}",
+                email=f"benchmark_nutrition_{i}@fitwell.local",
+                password=None
+            )
+            for i in range(options["users"])
+        ]
+        try:
+            tracking = []
+            for user in users:
+                _, items = save_meal_plan(user, plan, start_date, FEEDBACK_DAYS + 1)
+                for item in items:
+                    if rng.random() < 0.7:
+                        status = "eaten" if rng.random() < 0.8 else "skipped"
+                        tracking.append(MealItemTracking(meal_item=item, status=status, quantity_ratio=rng.choice([0.5, 1.0])))
+            MealItemTracking.objects.bulk_create(tracking, batch_size=1000)
+            self.stdout.write(f"{len(users)} users, {len(tracking)} tracking rows over {FEEDBACK_DAYS + 1} days")
+
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                expected = python_feedback(users, start_date, today)
+                python_cost = time.perf_counter() - started
+            python_queries = len(ctx.captured_queries)
+
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                batched = batch_feedback(users, today)
+                sql_cost = time.perf_counter() - started
+            sql_queries = len(ctx.captured_queries)
+
+            mismatches = sum(
+                1 for user in users
+                if any(abs(expected[user.id][n] - batched[user.id][n]) > 0.2 for n in NUTRIENTS)
+            )
+            self.stdout.write(f"{'strategy':>10} {'queries':>8} {'ms':>8}")
+            self.stdout.write(f"{'python':>10} {python_queries:>8} {python_cost * 1000:>8.0f}")
+            self.stdout.write(f"{'sql batch':>10} {sql_queries:>8} {sql_cost * 1000:>8.0f}")
+            self.stdout.write(f"users whose totals differ: {mismatches}")
+        finally:
+            User.objects.filter(id__in=[user.id for user in users]).delete()
@@ -0,0 +1,92 @@
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from ml_models.food_catalog import food_hash, food_name_hash, portion_for
+from ml_models.meal_optimizer import optimize_meal_plan
+from ml_models.models import FoodCatalog, MealPlan, MealItem, MealPlanCycle
+from ml_models import plan_cycles
+from ml_models.plan_storage import delete_meals_from, save_meal_plan
+
+
+def save_row_by_row(user, plan, start_date, days):
+    """Previous persistence path: one INSERT per meal and per item, no transaction"""
+    delete_meals_from(user, start_date)
+    for d in range(days):
+        day_date = start_date + timedelta(days=d)
+        for meal_type, items in plan[str(d + 1)].items():
+            meal = MealPlan.objects.create(user=user, date=day_date, meal_type=meal_type)
+            for food in items:
+                entry, _ = FoodCatalog.objects.get_or_create(
+                    food_hash=food_hash(food),
+                    defaults={
+                        "name_hash": food_name_hash(food["name"]),
+                        "name": food["name"],
+                        "calories": food["calories"],
+                        "protein": food["protein"],
+                        "carbs": food["carbs"],
+                        "fat": food["fat"]
+                    }
+                )
+                MealItem.objects.create(meal=meal, food=entry, portion=portion_for(entry, food))
+
+
+def save_bulk(user, plan, start_date, days):
+    save_meal_plan(user, plan, start_date, days, replace_from=start_date)
+
+
+def save_cycle(user, plan, start_date, days):
+    plan_cycles.save_plan(user, plan, start_date, days, replace_from=start_date)
+
+
+def stored_rows(user):
+    """(meal rows, item rows, cycle rows) the user's plan occupies"""
+    return (
+        MealPlan.objects.filter(user=user).count(),
+        MealItem.objects.filter(meal__user=user).count(),
+        MealPlanCycle.objects.filter(user=user).count()
+    )
+
+
+class Command(BaseCommand):
+    help = "Compare row-by-row, bulk and cycle meal plan persistence for 7/90/365-day plans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, nargs="+", default=[7, 90, 365])
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = User.objects.create_user(
+            username="benchmark_plan_save",
+            email="benchmark_plan_save@fitwell.local",
+            password=None
+        )
+        start_date = date.today()
+
+        try:
+            self.stdout.write(
+                f"{'days':>6} {'strategy':>12} {'queries':>8} {'best (ms)':>10} {'meals':>6} {'items':>6} {'cycles':>6}"
+            )
+            for days in options["days"]:
+                plan = optimize_meal_plan(2000, "none", "", days)
+                # A cycle is generated and saved from its base days only
+                base_plan = {str(d): plan[str(d)] for d in range(1, plan_cycles.generated_days(days) + 1)}
+                for name, strategy in (("row_by_row", save_row_by_row), ("bulk", save_bulk), ("cycle", save_cycle)):
+                    timings = []
+                    for _ in range(options["repeat"]):
+                        with CaptureQueriesContext(connection) as ctx:
+                            started = time.perf_counter()
+                            strategy(user, base_plan if name == "cycle" else plan, start_date, days)
+                            timings.append(time.perf_counter() - started)
+                    meals, items, cycles = stored_rows(user)
+                    self.stdout.write(
+                        f"{days:>6} {name:>12} {len(ctx.captured_queries):>8} {min(timings) * 1000:>10.1f} "
+                        f"{meals:>6} {items:>6} {cycles:>6}"
+                    )
+        finally:
+            user.delete()
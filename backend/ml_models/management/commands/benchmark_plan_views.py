@@ -0,0 +1,118 @@
+import json
+import time
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from health_data.models import Marathon, Workout
+from ml_models import completion, workout_storage
+from ml_models.models import MarathonDayTracking, WorkoutExerciseTracking
+
+
+# Queries each view may run for a request, whatever the plan size: the
+# plan lookup, its days and exercises, and one query for all tracking rows
+# (plus the ensure_indexed check for workout plans). Today's workout shows
+# no difficulty, so it reads completion from the bitset alone.
+MAX_QUERIES = {
+    "active-workout-plan": 5,
+    "todays-workout": 4,
+    "active-marathon-plan": 2,
+}
+
+
+class Command(BaseCommand):
+    help = "Query counts and latency of the workout / marathon plan views on a synthetic plan; fails above MAX_QUERIES"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90)
+        parser.add_argument("--exercises", type=int, default=8)
+        parser.add_argument("--weeks", type=int, default=16)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        today = date.today()
+        user = User.objects.create_user(
+            username="benchmark_plan_views",
+            email="benchmark_plan_views@fitwell.local",
+            password=None
+        )
+        try:
+            days = [
+                {
+                    "day_number": d,
+                    "day_name": f"Day {d}",
+                    "is_rest_day": False,
+                    "total_duration_minutes": 45,
+                    "total_calories": 300,
+                    "exercises": [
+                        {"name": f"Exercise {i}", "workout_type": "strength", "reps_or_duration": "3x12", "calories": 35}
+                        for i in range(options["exercises"])
+                    ]
+                }
+                for d in range(1, options["days"] + 1)
+            ]
+            plan = Workout.objects.create(
+                user=user, workout_name="Benchmark plan", workout_type="AI Generated",
+                duration=options["days"], date=today, description=json.dumps(days)
+            )
+            daily = Workout.objects.create(
+                user=user, workout_name="Benchmark daily", workout_type="Daily Progressive",
+                duration=45, date=today, is_daily_plan=True, plan_day_number=1,
+                description=json.dumps(days[0]["exercises"])
+            )
+            workout_storage.index_workout(plan, days)
+            workout_storage.index_workout(daily)
+
+            schedule = [
+                {"day": f"Week {w + 1} Day {d + 1}", "run_type": "easy", "distance_km": 5, "notes": ""}
+                for w in range(options["weeks"]) for d in range(7)
+            ]
+            marathon = Marathon.objects.create(
+                user=user, marathon_name="Benchmark marathon", distance=42.2,
+                target_date=today, notes=json.dumps(schedule)
+            )
+
+            # Every other exercise / run day completed with a difficulty, so each lookup has rows to find
+            for item, total in ((plan, options["days"] * options["exercises"]), (daily, options["exercises"]), (marathon, len(schedule))):
+                bits = completion.from_indices(range(0, total, 2), total)
+                type(item).objects.filter(pk=item.pk).update(
+                    completion_bits=bits, completion_total=total, completed_count=(total + 1) // 2
+                )
+            WorkoutExerciseTracking.objects.bulk_create(
+                [
+                    WorkoutExerciseTracking(workout=plan, exercise_index=i, difficulty="just_right")
+                    for i in range(0, options["days"] * options["exercises"], 2)
+                ],
+                batch_size=1000
+            )
+            MarathonDayTracking.objects.bulk_create(
+                [MarathonDayTracking(marathon=marathon, day_index=i, difficulty="just_right") for i in range(0, len(schedule), 2)]
+            )
+            self.stdout.write(
+                f"{options['days']} plan days x {options['exercises']} exercises, "
+                f"{len(schedule)} marathon days"
+            )
+
+            client = APIClient()
+            client.force_authenticate(user)
+            over = []
+            self.stdout.write(f"{'view':>22} {'queries':>8} {'max':>5} {'ms':>8}")
+            for view, limit in MAX_QUERIES.items():
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    response = client.get(f"/api/ml/{view}/")
+                    cost = time.perf_counter() - started
+                if response.status_code != 200:
+                    raise CommandError(f"{view} returned {response.status_code}")
+                queries = len(ctx.captured_queries)
+                self.stdout.write(f"{view:>22} {queries:>8} {limit:>5} {cost * 1000:>8.0f}")
+                if queries > limit:
+                    over.append(view)
+            if over:
+                raise CommandError(f"Query count above MAX_QUERIES: {', '.join(over)}")
+        finally:
+            user.delete()
@@ -0,0 +1,111 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from ml_models import response_parser
+
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "data", "response_corpus.json")
+
+SCHEMAS = {
+    "meal_plan": response_parser.MEAL_PLAN,
+    "workout_plan": response_parser.WORKOUT_PLAN,
+    "marathon_plan": response_parser.MARATHON_WEEK,
+}
+
+
+def legacy_parse(text):
+    """The fence split + json.loads every generator used before response_parser"""
+    text = text.strip()
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0].strip()
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0].strip()
+    return json.loads(text)
+
+
+def legacy_days(kind, text, expected):
+    """Days the old code could use: all of them if the JSON parsed (and, for meals, was complete), else none"""
+    try:
+        value = legacy_parse(text)
+    except ValueError:
+        return 0
+    if kind == "meal_plan":
+        complete = all(
+            isinstance(value.get(str(day)), dict) and value[str(day)]
+            and all(isinstance(items, list) and items for items in value[str(day)].values())
+            for day in range(1, expected + 1)
+        )
+        return expected if complete else 0
+    if kind == "workout_plan":
+        return len(value.get("days", []))
+    if kind == "marathon_plan":
+        return len(value.get("weekly_schedule", []))
+    return 1
+
+
+def expected_keys(kind, expected):
+    return response_parser.WEEKDAYS if kind == "marathon_plan" else range(1, expected + 1)
+
+
+class Command(BaseCommand):
+    help = "Compare response_parser with the old json.loads parsing on a corpus of recorded model responses"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=200, help="Parses per case for the timings")
+
+    def handle(self, *args, **options):
+        with open(CORPUS_PATH) as f:
+            corpus = json.load(f)
+
+        self.stdout.write(
+            f"{'case':<28} {'chars':>6} {'legacy':>7} {'parsed':>7} {'missing':<22} {'repaired':>8} {'us':>8}"
+        )
+        totals = {"expected": 0, "legacy": 0, "parsed": 0}
+        for case in corpus:
+            kind, text = case["kind"], case["text"]
+            expected = case["expected"] or 1
+            schema = SCHEMAS.get(kind)
+
+            def parse():
+                if schema is None:
+                    return response_parser.parse_json(text)
+                return response_parser.parse_plan(text, schema, expected_keys(kind, expected))
+
+            try:
+                result = parse()
+            except ValueError as e:
+                result = e
+
+            started = time.perf_counter()
+            for _ in range(options["repeat"]):
+                try:
+                    parse()
+                except ValueError:
+                    pass
+            elapsed = (time.perf_counter() - started) / options["repeat"]
+
+            if isinstance(result, ValueError):
+                parsed, missing, repaired = 0, "error", "-"
+            elif schema is None:
+                parsed, missing, repaired = 1, "-", "-"
+            else:
+                parsed = expected - len(result.missing)
+                missing = ",".join(str(key)[:3] for key in result.missing) or "-"
+                repaired = "yes" if result.repaired else "no"
+
+            legacy = legacy_days(kind, text, expected)
+            totals["expected"] += expected
+            totals["legacy"] += legacy
+            totals["parsed"] += parsed
+            self.stdout.write(
+                f"{case['name']:<28} {len(text):>6} {f'{legacy}/{expected}':>7} {f'{parsed}/{expected}':>7} "
+                f"{missing[:22]:<22} {repaired:>8} {elapsed * 1e6:>8.0f}"
+            )
+
+        self.stdout.write(
+            f"\nUsable days: legacy {totals['legacy']}/{totals['expected']}, "
+            f"response_parser {totals['parsed']}/{totals['expected']}"
+        )
@@ -0,0 +1,123 @@
+import json
+import time
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from health_data.models import DailyNutritionLog, HealthData, Marathon, Workout
+from ml_models import workout_storage
+from ml_models.meal_optimizer import optimize_meal_plan
+from ml_models.plan_storage import save_meal_plan
+
+
+SINGLE_ENDPOINTS = {
+    "exercise": "/api/ml/track-workout-exercise/",
+    "marathon_day": "/api/ml/track-marathon-day/",
+    "meal_item": "/api/ml/track-meal-item/",
+}
+
+
+def build_user(User, n, exercises, schedule, plan):
+    """A user with a workout plan, a marathon and a meal plan: (user, workout, marathon, meal items)"""
+    user = User.objects.create_user(
+        username=f"benchmark_tracking_{n}",
+        email=f"benchmark_tracking_{n}@fitwell.local",
+        password=None
+    )
+    workout = Workout.objects.create(
+        user=user, workout_name="Benchmark plan", workout_type="AI Generated",
+        duration=1, date=date.today(), description=json.dumps(exercises)
+    )
+    workout_storage.index_workout(workout)
+    marathon = Marathon.objects.create(
+        user=user, marathon_name="Benchmark marathon", distance=42.2,
+        target_date=date.today(), notes=json.dumps(schedule)
+    )
+    _, items = save_meal_plan(user, plan, date.today(), len(plan))
+    return user, workout, marathon, items
+
+
+def operations_for(workout, marathon, items, counts):
+    ops = [
+        {"kind": "exercise", "workout_id": workout.id, "exercise_index": i, "completed": True}
+        for i in range(counts["exercise"])
+    ]
+    ops += [
+        {"kind": "marathon_day", "marathon_id": marathon.id, "day_index": i, "completed": True}
+        for i in range(counts["marathon_day"])
+    ]
+    ops += [
+        {"kind": "meal_item", "meal_item_id": item.id, "status": "eaten" if i % 3 else "skipped", "quantity_ratio": 1.0}
+        for i, item in enumerate(items[:counts["meal_item"]])
+    ]
+    return ops
+
+
+def state(user, workout, marathon):
+    workout.refresh_from_db()
+    marathon.refresh_from_db()
+    health = HealthData.objects.filter(user=user, date=date.today()).values_list('calories_burned', 'distance', 'active_minutes').first()
+    logs = DailyNutritionLog.objects.filter(user=user).order_by('date').values_list('date', 'total_calories')
+    return bytes(workout.completion_bits), bytes(marathon.completion_bits), health, [(day, round(total, 1)) for day, total in logs]
+
+
+class Command(BaseCommand):
+    help = "Compare replaying tracking operations one call at a time with one track-batch/ call"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--exercises", type=int, default=20)
+        parser.add_argument("--days", type=int, default=10)
+        parser.add_argument("--meal-items", type=int, default=20)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        counts = {"exercise": options["exercises"], "marathon_day": options["days"], "meal_item": options["meal_items"]}
+        exercises = [{"name": f"Exercise {i}", "calories": 10 + i} for i in range(counts["exercise"])]
+        schedule = [{"day": f"Day {i + 1}", "run_type": "easy", "distance_km": 5} for i in range(counts["marathon_day"])]
+        plan = optimize_meal_plan(2000, "none", "", 3)  # Meal items over several dates
+
+        users = []
+        try:
+            single = build_user(User, 0, exercises, schedule, plan)
+            batch = build_user(User, 1, exercises, schedule, plan)
+            users = [single[0], batch[0]]
+            if len(single[3]) < counts["meal_item"]:
+                counts["meal_item"] = len(single[3])
+
+            client = APIClient()
+            client.force_authenticate(single[0])
+            ops = operations_for(*single[1:], counts)
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                for op in ops:
+                    response = client.post(SINGLE_ENDPOINTS[op["kind"]], op, format="json")
+                    if response.status_code != 200:
+                        raise CommandError(f"{op['kind']} call returned {response.status_code}")
+                singles_cost = time.perf_counter() - started
+            singles_queries = len(ctx.captured_queries)
+
+            client.force_authenticate(batch[0])
+            ops = operations_for(*batch[1:], counts)
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = client.post("/api/ml/track-batch/", {"operations": ops}, format="json")
+                batch_cost = time.perf_counter() - started
+            if response.status_code != 200 or response.data["failed"]:
+                raise CommandError(f"Batch failed: {response.status_code} {response.data}")
+            batch_queries = len(ctx.captured_queries)
+
+            self.stdout.write(f"{len(ops)} operations: {counts}")
+            self.stdout.write(f"{'strategy':>16} {'queries':>8} {'ms':>8}")
+            self.stdout.write(f"{'one call each':>16} {singles_queries:>8} {singles_cost * 1000:>8.0f}")
+            self.stdout.write(f"{'per call':>16} {singles_queries / len(ops):>8.1f} {singles_cost * 1000 / len(ops):>8.1f}")
+            self.stdout.write(f"{'track-batch':>16} {batch_queries:>8} {batch_cost * 1000:>8.0f}")
+
+            if state(*single[:3]) != state(*batch[:3]):
+                raise CommandError(f"State differs: {state(*single[:3])} vs {state(*batch[:3])}")
+            self.stdout.write("bitsets, HealthData and nutrition rollups match")
+        finally:
+            User.objects.filter(id__in=[user.id for user in users]).delete()
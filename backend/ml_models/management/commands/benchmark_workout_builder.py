@@ -0,0 +1,97 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.workout_builder import (
+    FEEDBACK_ADJUSTMENT, MAX_DIFFICULTY, MAX_MINUTES, MIN_DIFFICULTY, MIN_MINUTES,
+    baseline_calories, build_daily_workout, load_exercises
+)
+
+
+# (fitness level, goal, BMI, weight kg)
+PROFILES = [
+    ("beginner", "lose_weight", 31.5, 92),
+    ("beginner", "maintain", 22.0, 60),
+    ("intermediate", "gain_muscle", 24.0, 78),
+    ("intermediate", "general_fitness", 27.0, 70),
+    ("advanced", "improve_endurance", 21.0, 65),
+    ("advanced", "gain_muscle", 25.5, 85),
+]
+
+EXERCISE_FIELDS = {"name", "workout_type", "reps_or_duration", "calories"}
+
+
+def check_shape(workout):
+    """Problems with a workout against the daily workout prompt's requirements"""
+    problems = []
+    if set(workout) != {"workout_name", "total_duration_minutes", "total_calories", "exercises"}:
+        problems.append(f"keys {sorted(workout)}")
+    if not 6 <= len(workout["exercises"]) <= 8:
+        problems.append(f"{len(workout['exercises'])} exercises")
+    if not MIN_MINUTES <= workout["total_duration_minutes"] <= MAX_MINUTES:
+        problems.append(f"{workout['total_duration_minutes']} minutes")
+    if any(set(exercise) != EXERCISE_FIELDS for exercise in workout["exercises"]):
+        problems.append("exercise fields")
+    if workout["total_calories"] != sum(exercise["calories"] for exercise in workout["exercises"]):
+        problems.append("total calories")
+    return problems
+
+
+class Command(BaseCommand):
+    help = "Time the local daily workout builder and check its shape and feedback progression"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--builds", type=int, default=2000, help="Builds per profile for the timing")
+        parser.add_argument("--days", type=int, default=14, help="Days of the simulated progression")
+
+    def handle(self, *args, **options):
+        load_exercises()  # Exclude the one-off JSON load from the timings
+
+        self.stdout.write(
+            f"{'level':>12} {'goal':>17} {'bmi':>5} {'ms':>6} {'builds/s':>9} {'ex':>3} {'min':>4} {'kcal':>5}"
+        )
+        for level, goal, bmi, weight in PROFILES:
+            workout = build_daily_workout(level, goal, bmi, weight)
+            problems = check_shape(workout)
+            if problems:
+                raise CommandError(f"{level} {goal}: {', '.join(problems)}")
+            if workout != build_daily_workout(level, goal, bmi, weight):
+                raise CommandError(f"{level} {goal}: same inputs built a different workout")
+
+            started = time.perf_counter()
+            for day in range(options["builds"]):
+                build_daily_workout(level, goal, bmi, weight, day_number=day + 1, previous_feedback="just_right",
+                                    previous_calories=workout["total_calories"])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{level:>12} {goal:>17} {bmi:>5} {elapsed * 1000 / options['builds']:>6.2f} "
+                f"{options['builds'] / elapsed:>9.0f} {len(workout['exercises']):>3} "
+                f"{workout['total_duration_minutes']:>4} {workout['total_calories']:>5}"
+            )
+
+        # Feed each day's workout back as the previous one: calories must follow the +-15% rule
+        self.stdout.write(f"\nProgression over {options['days']} days (intermediate, 70 kg), kcal per day:")
+        for feedback in FEEDBACK_ADJUSTMENT:
+            previous, row = None, []
+            for day in range(1, options["days"] + 1):
+                workout = build_daily_workout(
+                    "intermediate", "general_fitness", 24.0, 70, day_number=day,
+                    previous_feedback=feedback if previous else None,
+                    previous_calories=previous["total_calories"] if previous else None,
+                    avoid_exercises=[exercise["name"] for exercise in previous["exercises"]] if previous else None
+                )
+                problems = check_shape(workout)
+                if problems:
+                    raise CommandError(f"{feedback} day {day}: {', '.join(problems)}")
+                if previous:
+                    expected = previous["total_calories"] * FEEDBACK_ADJUSTMENT[feedback]
+                    baseline = baseline_calories("intermediate", 70)
+                    expected = min(baseline * MAX_DIFFICULTY, max(baseline * MIN_DIFFICULTY, expected))
+                    if abs(workout["total_calories"] - expected) > 0.02 * expected + 5:
+                        raise CommandError(
+                            f"{feedback} day {day}: {workout['total_calories']} kcal, expected about {expected:.0f}"
+                        )
+                row.append(workout["total_calories"])
+                previous = workout
+            self.stdout.write(f"{feedback:>12}: {' '.join(str(calories) for calories in row)}")
+        self.stdout.write("shape, determinism and progression checks passed")
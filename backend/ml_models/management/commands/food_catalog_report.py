@@ -0,0 +1,107 @@
+import random
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, Length
+
+from ml_models.food_catalog import food_name_hash
+from ml_models.models import FoodCatalog, MealItem
+from ml_models.plan_storage import save_meal_plan
+
+
+# Approximate on-disk widths (bytes) of the fixed-size columns
+ID_BYTES = 8
+FLOAT_BYTES = 8
+HASH_BYTES = 64
+TIMESTAMP_BYTES = 8
+
+BASE_DISHES = [
+    "Oatmeal with Berries", "Greek Yogurt Parfait", "Vegetable Poha", "Masala Omelette",
+    "Grilled Chicken Salad", "Paneer Tikka Wrap", "Dal Tadka with Rice", "Quinoa Buddha Bowl",
+    "Salmon with Roasted Vegetables", "Chickpea Curry", "Tofu Stir Fry", "Rajma Chawal",
+    "Idli with Sambar", "Moong Dal Chilla", "Lentil Soup", "Turkey Sandwich",
+]
+STYLES = ["", "Spicy ", "Homestyle ", "Low-Fat ", "Protein "]
+
+
+class Command(BaseCommand):
+    help = "Report meal item storage with the food catalog against the old per-item rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed-users", type=int, default=0,
+            help="Seed this many synthetic users with plans (rolled back afterwards)"
+        )
+        parser.add_argument("--days", type=int, default=30, help="Plan length for seeded users")
+        parser.add_argument(
+            "--image-bytes", type=int, default=200_000,
+            help="Size of the fake base64 image attached to half of the seeded dishes"
+        )
+
+    def handle(self, *args, **options):
+        if not options["seed_users"]:
+            self.report()
+            return
+
+        with transaction.atomic():
+            self.seed(options["seed_users"], options["days"], options["image_bytes"])
+            self.report()
+            transaction.set_rollback(True)
+
+    def seed(self, users, days, image_bytes):
+        rng = random.Random(0)
+        User = get_user_model()
+        dishes = [style + dish for dish in BASE_DISHES for style in STYLES]
+        images = {dish: "data:image/png;base64," + "A" * image_bytes for dish in dishes[::2]}
+
+        def food():
+            dish = rng.choice(dishes)
+            # Same dish as the model tends to spell it: varied case and punctuation
+            name = rng.choice([dish, dish.lower(), dish.upper(), dish + ".", dish.replace(" with ", ", with ")])
+            calories = rng.choice([250, 300, 350, 400, 450, 500])
+            return {"name": name, "calories": calories, "protein": calories / 20, "carbs": calories / 8, "fat": calories / 40}
+
+        for n in range(users):
+            user = User.objects.create_user(
+                username=f"food_catalog_report_{n}",
+                email=f"food_catalog_report_{n}@fitwell.local",
+                password=None
+            )
+            plan = {
+                str(d + 1): {meal_type: [food(), food()] for meal_type in ("breakfast", "lunch", "dinner")}
+                for d in range(days)
+            }
+            save_meal_plan(user, plan, date.today(), days)
+
+        # One generated image per dish, as generate_meal_image_endpoint stores it
+        for dish, image in images.items():
+            FoodCatalog.objects.filter(name_hash=food_name_hash(dish)).update(image_url=image)
+
+    def report(self):
+        # Legacy layout: every item stores its own name, macros and image
+        legacy = MealItem.objects.aggregate(
+            rows=Count("id"),
+            text=Coalesce(Sum(Length("food__name")), 0) + Coalesce(Sum(Length("food__image_url")), 0)
+        )
+        catalog = FoodCatalog.objects.aggregate(
+            rows=Count("id"),
+            text=Coalesce(Sum(Length("name")), 0) + Coalesce(Sum(Length("image_url")), 0)
+        )
+
+        legacy_bytes = legacy["rows"] * (2 * ID_BYTES + 4 * FLOAT_BYTES) + legacy["text"]
+        item_bytes = legacy["rows"] * (3 * ID_BYTES + FLOAT_BYTES)
+        catalog_bytes = catalog["rows"] * (ID_BYTES + HASH_BYTES + 4 * FLOAT_BYTES + TIMESTAMP_BYTES) + catalog["text"]
+        current_bytes = item_bytes + catalog_bytes
+
+        self.stdout.write(f"Meal items:        {legacy['rows']}")
+        self.stdout.write(f"Catalog dishes:    {catalog['rows']}")
+        self.stdout.write(f"Per-item rows:     {legacy_bytes / 1024:,.1f} KiB")
+        self.stdout.write(
+            f"Catalog + items:   {current_bytes / 1024:,.1f} KiB "
+            f"(items {item_bytes / 1024:,.1f} KiB, catalog {catalog_bytes / 1024:,.1f} KiB)"
+        )
+        if legacy_bytes:
+            self.stdout.write(f"Reduction:         {(1 - current_bytes / legacy_bytes) * 100:.1f}%")
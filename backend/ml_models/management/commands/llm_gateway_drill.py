@@ -0,0 +1,81 @@
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from ml_models import llm_gateway, llm_metrics
+from ml_models.testing import FakeModelServer
+
+
+class Command(BaseCommand):
+    help = "Exercise the LLM gateway against a local fake model server with injected latency and failures"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=100, help="Calls per scenario")
+
+    def _run(self, calls, **kwargs):
+        """Make `calls` sequential gateway calls; returns (latencies, outcome counts)"""
+        latencies = []
+        outcomes = {"ok": 0, "unavailable": 0, "circuit_open": 0}
+        for _ in range(calls):
+            started = time.perf_counter()
+            try:
+                llm_gateway.generate_json("drill", **kwargs)
+                outcomes["ok"] += 1
+            except llm_gateway.CircuitOpenError:
+                outcomes["circuit_open"] += 1
+            except llm_gateway.LLMUnavailable:
+                outcomes["unavailable"] += 1
+            latencies.append(time.perf_counter() - started)
+        return latencies, outcomes
+
+    def _report(self, name, latencies, outcomes, requests):
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        self.stdout.write(
+            f"{name:<22} {outcomes['ok']:>4} {outcomes['unavailable']:>6} {outcomes['circuit_open']:>6} "
+            f"{requests:>6} {statistics.median(ordered) * 1000:>8.0f} {p95 * 1000:>8.0f} {max(ordered) * 1000:>8.0f}  "
+            f"{llm_gateway.stats()['state']}"
+        )
+
+    def handle(self, *args, **options):
+        calls = options["calls"]
+        fake = FakeModelServer()
+        fake.start()
+
+        os.environ['GEMINI_BASE_URL'] = fake.url
+        os.environ.setdefault('GEMINI_API_KEY', 'drill')
+        llm_gateway.reset()
+        # Keep the drill's fake calls out of the LLMCallLog table
+        llm_metrics.recorder.background = False
+        # Shorter waits than production so the drill finishes in seconds
+        llm_gateway.BACKOFF_BASE = 0.05
+        llm_gateway.BACKOFF_MAX = 0.2
+        llm_gateway.breaker = llm_gateway.CircuitBreaker(cooldown=1.0)
+
+        scenarios = [
+            # (name, server settings, gateway call arguments)
+            ("healthy", {"latency": 0.02}, {}),
+            ("flaky (30% 503)", {"latency": 0.02, "failure_rate": 0.3}, {}),
+            ("slow (deadline 0.5s)", {"latency": 2.0}, {"deadline": 0.5}),
+            ("outage", {"latency": 0.02, "failure_rate": 1.0}, {}),
+            ("recovered", {"latency": 0.02}, {}),
+            ("tail, no hedge", {"latency": 0.02, "slow_rate": 0.2, "slow_latency": 1.0}, {}),
+            ("tail, hedge 0.1s", {"latency": 0.02, "slow_rate": 0.2, "slow_latency": 1.0}, {"hedge_after": 0.1}),
+        ]
+
+        self.stdout.write(
+            f"{'scenario':<22} {'ok':>4} {'unav':>6} {'open':>6} {'sent':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  breaker"
+        )
+        try:
+            for name, server_settings, call_kwargs in scenarios:
+                if name == "recovered":
+                    # Let the breaker opened by the outage reach half-open
+                    time.sleep(llm_gateway.breaker.cooldown)
+                fake.configure(**server_settings)
+                fake.requests = 0
+                latencies, outcomes = self._run(calls, **call_kwargs)
+                self._report(name, latencies, outcomes, fake.requests)
+        finally:
+            fake.stop()
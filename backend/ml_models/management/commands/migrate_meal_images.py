@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from ml_models.image_store import decode_data_url, store_image
+from ml_models.models import FoodCatalog
+
+
+class Command(BaseCommand):
+    help = "Move base64 data-URL meal images into the content-addressed image store"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Count the rows without changing them")
+
+    def handle(self, *args, **options):
+        # Only ids are listed up front; each image is loaded, written and
+        # released on its own so memory stays flat however many there are
+        ids = list(
+            FoodCatalog.objects.filter(image_url__startswith="data:").order_by("id").values_list("id", flat=True)
+        )
+        self.stdout.write(f"{len(ids)} data-URL images to migrate")
+        if options["dry_run"]:
+            return
+
+        migrated = skipped = 0
+        for food_id in ids:
+            value = FoodCatalog.objects.filter(id=food_id).values_list("image_url", flat=True).first()
+            data = decode_data_url(value)
+            if data is None:
+                skipped += 1
+                continue
+
+            url = store_image(data)
+            # Conditional update, so an image regenerated meanwhile is not overwritten
+            migrated += FoodCatalog.objects.filter(id=food_id, image_url=value).update(image_url=url)
+
+        self.stdout.write(self.style.SUCCESS(f"Migrated {migrated} images, skipped {skipped} invalid data URLs"))
@@ -0,0 +1,82 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from ml_models import pregeneration
+
+
+class RateLimiter:
+    """Spaces call starts at least 60 / per_minute seconds apart across threads (0 = no limit)"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.next_start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            start = max(self.next_start, time.monotonic())
+            self.next_start = start + self.interval
+        time.sleep(max(0.0, start - time.monotonic()))
+
+
+class Command(BaseCommand):
+    help = "Generate tomorrow's daily progressive workout for every active user (schedule nightly)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Day to generate for, YYYY-MM-DD (default: tomorrow)")
+        parser.add_argument("--workers", type=int, default=4, help="Users generated in parallel")
+        parser.add_argument("--rate", type=float, default=30.0,
+                            help="Generations started per minute (0 = no limit)")
+        parser.add_argument("--limit", type=int, default=0, help="Stop after this many users (0 = all)")
+        parser.add_argument("--dry-run", action="store_true", help="List the users without generating")
+
+    def handle(self, *args, **options):
+        day = date.fromisoformat(options["date"]) if options["date"] else date.today() + timedelta(days=1)
+        users = list(pregeneration.active_daily_users(day))
+        if options["limit"]:
+            users = users[:options["limit"]]
+        self.stdout.write(f"Pregenerating daily workouts for {day}: {len(users)} user(s)")
+        if options["dry_run"] or not users:
+            for user in users:
+                self.stdout.write(f"  {user.id} {user.email}")
+            return
+
+        limiter = RateLimiter(options["rate"])
+
+        def generate(user):
+            limiter.wait()
+            try:
+                return pregeneration.pregenerate_daily_workout(user, day)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        counts = {"generated": 0, "skipped": 0, "failed": 0}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"])) as executor:
+            futures = {executor.submit(generate, user): user for user in users}
+            for done, future in enumerate(as_completed(futures), start=1):
+                user = futures[future]
+                try:
+                    counts["generated" if future.result() else "skipped"] += 1
+                except Exception as e:
+                    counts["failed"] += 1
+                    self.stderr.write(f"  user {user.id}: {e}")
+                if done % 25 == 0 or done == len(users):
+                    self.stdout.write(
+                        f"  {done}/{len(users)} done - {counts['generated']} generated, "
+                        f"{counts['skipped']} skipped, {counts['failed']} failed "
+                        f"({time.perf_counter() - started:.1f}s)"
+                    )
+
+        self.stdout.write(
+            f"Finished in {time.perf_counter() - started:.1f}s: {counts['generated']} generated, "
+            f"{counts['skipped']} already had one, {counts['failed']} failed"
+        )
@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.nutrition import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild DailyNutritionLog rollups from meal items and their latest tracking"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First date to rebuild (YYYY-MM-DD), default 30 days ago")
+        parser.add_argument("--end", help="Last date to rebuild (YYYY-MM-DD), default today")
+        parser.add_argument("--user", help="Only rebuild rollups for this user email")
+
+    def handle(self, *args, **options):
+        try:
+            end_date = date.fromisoformat(options["end"]) if options["end"] else date.today()
+            start_date = date.fromisoformat(options["start"]) if options["start"] else end_date - timedelta(days=30)
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        if start_date > end_date:
+            raise CommandError("--start must not be after --end")
+
+        user = None
+        if options["user"]:
+            User = get_user_model()
+            try:
+                user = User.objects.get(email=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User not found: {options['user']}")
+
+        result = rebuild_rollups(start_date, end_date, user=user)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt nutrition rollups {start_date} to {end_date}: "
+            f"{result['created']} created, {result['updated']} updated"
+        ))
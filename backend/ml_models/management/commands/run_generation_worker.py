@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ml_models.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Process queued AI plan generation jobs (run one or more of these next to the web server)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=float, default=2.0,
+                            help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once the queue is empty instead of polling")
+        parser.add_argument("--max-jobs", type=int, default=0,
+                            help="Exit after processing this many jobs (0 = no limit)")
+
+    def handle(self, *args, **options):
+        processed = 0
+        self.stdout.write("Generation worker started")
+
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+                continue
+
+            started = time.perf_counter()
+            job = run_job(job)
+            processed += 1
+            self.stdout.write(
+                f"Job {job.id} ({job.kind}) -> {job.status} "
+                f"in {time.perf_counter() - started:.1f}s (attempt {job.attempts})"
+            )
+
+            if options["max_jobs"] and processed >= options["max_jobs"]:
+                break
+
+        self.stdout.write(f"Generation worker stopped after {processed} job(s)")
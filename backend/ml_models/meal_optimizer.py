@@ -0,0 +1,344 @@
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+
+FOODS_PATH = os.path.join(os.path.dirname(__file__), "data", "foods.json")
+
+# Share of the daily calories per meal (same split as the Gemini prompt)
+MEAL_SHARES = {"breakfast": 0.30, "lunch": 0.35, "dinner": 0.35}
+
+CALORIE_TOLERANCE = 20  # Allowed kcal difference between a meal and its share
+MIN_ITEMS = 3
+MAX_ITEMS = 5
+VARIETY_DAYS = 7        # A main dish is not repeated within this many days while the table allows it
+SIDE_VARIETY_DAYS = 1   # Sides (fruit, rice, salads) may come back after this many days
+REPAIR_ROUNDS = 4       # Swap/add/drop passes used to bring a meal within tolerance
+SIDE_CHOICES = 12       # Fewest side dishes offered to a meal when relaxing the variety rule
+SERVINGS = (1, 0.5, 2)  # Servings of a food a meal may contain; other than 1 only when single servings can't fit
+
+# Food tags each diet type never allows
+DIET_EXCLUDED_TAGS = {
+    "vegetarian": {"meat", "fish", "shellfish"},
+    "vegan": {"meat", "fish", "shellfish", "egg", "dairy"},
+    "pescatarian": {"meat"},
+    "gluten_free": {"gluten"},
+    "dairy_free": {"dairy"},
+    "paleo": {"grain", "legume", "dairy", "sugar"},
+    "keto": {"grain", "sugar"},
+    "low_carb": {"sugar"},
+}
+
+# Most carbs (g) in one serving of a food; relaxed if too few foods qualify
+DIET_MAX_CARBS = {"keto": 10, "low_carb": 20}
+
+# Allergy words -> food tags they exclude; other words exclude foods whose name contains them
+ALLERGEN_TAGS = {
+    "dairy": ("dairy",), "milk": ("dairy",), "lactose": ("dairy",), "cheese": ("dairy",),
+    "egg": ("egg",), "eggs": ("egg",),
+    "gluten": ("gluten",), "wheat": ("gluten",),
+    "nut": ("nuts",), "nuts": ("nuts",), "tree nuts": ("nuts",), "almond": ("nuts",), "almonds": ("nuts",),
+    "peanut": ("peanuts",), "peanuts": ("peanuts",),
+    "soy": ("soy",), "soya": ("soy",),
+    "fish": ("fish",), "shellfish": ("shellfish",), "shrimp": ("shellfish",), "prawn": ("shellfish",),
+    "prawns": ("shellfish",), "seafood": ("fish", "shellfish"),
+    "sesame": ("sesame",),
+}
+
+
+class FoodTable:
+    """
+    The bundled food table as NumPy arrays
+
+    Each food appears once per entry of SERVINGS; `base` maps a row back to
+    its food, so variety is tracked per food whatever the serving size.
+    """
+
+    def __init__(self, foods):
+        self.foods = foods
+        self.food_names = [food["name"].lower() for food in foods]
+
+        count = len(foods)
+        self.base = np.tile(np.arange(count), len(SERVINGS))
+        self.servings = np.repeat(np.array(SERVINGS, dtype=float), count)
+
+        def column(key):
+            return np.array([food[key] for food in foods], dtype=float)[self.base]
+
+        self.calories = column("calories") * self.servings
+        self.carbs_per_serving = column("carbs")
+        self.protein_density = column("protein") / column("calories")
+        self.is_main = np.array([food["role"] == "main" for food in foods])[self.base]
+        self.meal_masks = {
+            meal: np.array([meal in food["meals"] for food in foods])[self.base] for meal in MEAL_SHARES
+        }
+        tags = sorted({tag for food in foods for tag in food["tags"]})
+        self.tag_masks = {
+            tag: np.array([tag in food["tags"] for food in foods])[self.base] for tag in tags
+        }
+
+    def __len__(self):
+        return len(self.base)
+
+    def item(self, row):
+        food = self.foods[self.base[row]]
+        servings = float(self.servings[row])
+        if servings == 1:
+            return {key: food[key] for key in ("name", "calories", "protein", "carbs", "fat")}
+        return {
+            "name": f"{food['name']} ({servings:g} servings)",
+            **{key: round(food[key] * servings, 1) for key in ("calories", "protein", "carbs", "fat")}
+        }
+
+
+@lru_cache(maxsize=1)
+def load_food_table():
+    with open(FOODS_PATH, encoding="utf-8") as f:
+        return FoodTable(json.load(f))
+
+
+def _allergy_terms(allergies):
+    if not allergies:
+        return []
+    if isinstance(allergies, (list, tuple)):
+        allergies = ",".join(str(a) for a in allergies)
+    terms = re.split(r",|;|/|\band\b", str(allergies).lower())
+    return [" ".join(term.split()) for term in terms if term.strip() and term.strip() != "none"]
+
+
+def allowed_foods(table, diet_type, allergies):
+    """
+    Boolean mask of foods allowed by a diet type and an allergy list
+
+    Diet exclusions and allergies are strict; a carb limit (keto, low_carb)
+    is dropped for a meal when it would leave fewer than MIN_ITEMS foods.
+
+    Returns:
+        tuple: (strict mask, mask with the carb limit applied)
+    """
+    diet_type = (diet_type or "none").lower()
+    mask = np.ones(len(table), dtype=bool)
+
+    for tag in DIET_EXCLUDED_TAGS.get(diet_type, ()):
+        if tag in table.tag_masks:
+            mask &= ~table.tag_masks[tag]
+
+    for term in _allergy_terms(allergies):
+        tags = ALLERGEN_TAGS.get(term)
+        if tags:
+            for tag in tags:
+                if tag in table.tag_masks:
+                    mask &= ~table.tag_masks[tag]
+        else:
+            stem = term[:-1] if len(term) > 3 and term.endswith("s") else term
+            mask &= np.array([stem not in name for name in table.food_names])[table.base]
+
+    limited = mask.copy()
+    if diet_type in DIET_MAX_CARBS:
+        limited &= table.carbs_per_serving <= DIET_MAX_CARBS[diet_type]
+
+    return mask, limited
+
+
+def _meal_pools(table, strict, limited):
+    """(mains mask, sides mask) for every meal"""
+    single = table.servings == 1
+    pools = {}
+    for meal, meal_mask in table.meal_masks.items():
+        allowed = limited & meal_mask
+        if (allowed & single).sum() < MIN_ITEMS:
+            allowed = strict & meal_mask
+        if (allowed & single).sum() < MIN_ITEMS:
+            raise ValueError(f"Not enough {meal} foods for this diet and allergy combination")
+
+        mains = allowed & table.is_main
+        sides = allowed & ~table.is_main
+        if not mains.any():
+            mains = allowed
+        if not sides.any():
+            sides = allowed
+        pools[meal] = (mains, sides)
+    return pools
+
+
+def _fresh(pool, last_used, day, needed, gap):
+    """
+    Rows of a pool whose food was not used in the last `gap` days
+
+    Falls back to the least recently used foods (never one already used
+    today, if avoidable) when fewer than `needed` rows are fresh.
+    """
+    fresh = pool & (last_used < day - gap)
+    if fresh.sum() >= needed:
+        return fresh
+
+    candidates = np.flatnonzero(pool & (last_used < day))
+    if len(candidates) == 0:
+        candidates = np.flatnonzero(pool)
+    order = candidates[np.argsort(last_used[candidates], kind="stable")]
+    relaxed = np.zeros_like(pool)
+    relaxed[order[:needed]] = True
+    return relaxed | fresh
+
+
+def _solve_meal(table, target, mains, sides, last_used, day, rng, prefer_protein):
+    """
+    Pick 3-5 foods whose calories add up to `target` (greedy fill plus repair)
+
+    Args:
+        last_used: Day each row's food was last used
+
+    Returns:
+        list: Rows of the food table, main dish first
+    """
+    cal = table.calories
+    base = table.base
+
+    main_idx = np.flatnonzero(_fresh(mains, last_used, day, 3, VARIETY_DAYS))
+    side_idx = np.flatnonzero(_fresh(sides, last_used, day, SIDE_CHOICES, SIDE_VARIETY_DAYS))
+    min_side = cal[side_idx].min() if len(side_idx) else 0.0
+
+    # Main dish: leaves room for at least two sides and is a meaningful part of the meal
+    fit = main_idx[(cal[main_idx] <= target - 2 * min_side) & (cal[main_idx] >= 0.3 * target)]
+    if len(fit) == 0:
+        fit = main_idx[np.argsort(np.abs(cal[main_idx] - 0.5 * target))[:3]]
+    if prefer_protein and len(fit) > 2:
+        fit = fit[table.protein_density[fit] >= np.median(table.protein_density[fit])]
+    chosen = [int(rng.choice(fit))]
+    total = cal[chosen[0]]
+
+    # A food appears at most once per meal, whatever its serving size
+    taken = np.zeros(len(table.foods), dtype=bool)
+    taken[base[chosen[0]]] = True
+
+    def unused(rows):
+        return rows[~taken[base[rows]]]
+
+    # First side at random (keeps meals varied), the rest closest to the remaining calories
+    first = unused(side_idx)
+    first = first[cal[first] <= target - total - min_side]
+    if len(first):
+        pick = int(rng.choice(first))
+        chosen.append(pick)
+        taken[base[pick]] = True
+        total += cal[pick]
+
+    while len(chosen) < MIN_ITEMS or (target - total > CALORIE_TOLERANCE and len(chosen) < MAX_ITEMS):
+        candidates = unused(side_idx)
+        if len(candidates) == 0:
+            break
+        pick = int(candidates[np.argmin(np.abs(total + cal[candidates] - target))])
+        chosen.append(pick)
+        taken[base[pick]] = True
+        total += cal[pick]
+
+    # Repair: best single swap, add or drop of a side until within tolerance
+    for _ in range(REPAIR_ROUNDS):
+        error = total - target
+        if abs(error) <= CALORIE_TOLERANCE:
+            break
+
+        candidates = unused(side_idx)
+        best_error, best_move = abs(error), None
+
+        if len(candidates) and len(chosen) > 1:
+            current = np.array(chosen[1:])
+            # (chosen side, candidate) matrix of the error after swapping them
+            swapped = np.abs(error - cal[current][:, None] + cal[candidates][None, :])
+            row, col = np.unravel_index(np.argmin(swapped), swapped.shape)
+            if swapped[row, col] < best_error:
+                best_error, best_move = swapped[row, col], ("swap", int(row) + 1, int(candidates[col]))
+
+        if len(candidates) and len(chosen) < MAX_ITEMS:
+            added = np.abs(error + cal[candidates])
+            col = int(np.argmin(added))
+            if added[col] < best_error:
+                best_error, best_move = added[col], ("add", None, int(candidates[col]))
+
+        if len(chosen) > MIN_ITEMS:
+            current = np.array(chosen[1:])
+            dropped = np.abs(error - cal[current])
+            row = int(np.argmin(dropped))
+            if dropped[row] < best_error:
+                best_error, best_move = dropped[row], ("drop", row + 1, None)
+
+        if best_move is None:
+            break
+        move, position, row = best_move
+        if move == "swap":
+            total += cal[row] - cal[chosen[position]]
+            taken[base[chosen[position]]] = False
+            taken[base[row]] = True
+            chosen[position] = row
+        elif move == "add":
+            total += cal[row]
+            taken[base[row]] = True
+            chosen.append(row)
+        else:
+            dropped_row = chosen.pop(position)
+            taken[base[dropped_row]] = False
+            total -= cal[dropped_row]
+
+    return chosen, abs(total - target)
+
+
+def optimize_meal_plan(calories, diet_type, allergies, days, goal=None, avoid_dishes=None, first_day=1):
+    """
+    Build a meal plan locally from the bundled food table (no API call)
+
+    Every meal gets a main dish and sides, 3-5 foods in total, whose calories
+    are within CALORIE_TOLERANCE of the meal's share of the daily target
+    (half or double servings are only used when single servings can't get
+    there).
+    Diet type and allergies are respected, and main dishes don't repeat
+    within VARIETY_DAYS days as long as the table has enough foods for the
+    diet. The result only depends on the arguments, so the same request
+    always gets the same plan.
+
+    Args:
+        calories (int): Daily calorie target
+        diet_type (str): Dietary preference (vegetarian, vegan, keto, etc.)
+        allergies (str): Comma separated allergies
+        days (int): Number of days to plan
+        goal (str): Fitness goal; muscle gain prefers protein-dense main dishes
+        avoid_dishes (list): Dish names used just before this plan (kept out of its first days)
+        first_day (int): Plan day number of day "1", so chunks of one plan differ
+
+    Returns:
+        dict: Meal plan keyed by day number ("1".."days"), as generate_meal_plan
+    """
+    table = load_food_table()
+    pools = _meal_pools(table, *allowed_foods(table, diet_type, allergies))
+    single = table.servings == 1
+    prefer_protein = "muscle" in str(goal or "").lower()
+
+    seed_text = f"{calories}|{diet_type}|{allergies}|{goal}|{first_day}"
+    rng = np.random.default_rng(int(hashlib.sha256(seed_text.encode("utf-8")).hexdigest()[:16], 16))
+
+    # Day each food was last used; far in the past means "never"
+    last_used = np.full(len(table.foods), -(VARIETY_DAYS + 1), dtype=int)
+    if avoid_dishes:
+        avoid = {name.lower() for name in avoid_dishes}
+        last_used[[i for i, name in enumerate(table.food_names) if name in avoid]] = 0
+
+    plan = {}
+    for day in range(1, days + 1):
+        plan_day = {}
+        for meal, share in MEAL_SHARES.items():
+            mains, sides = pools[meal]
+            target = calories * share
+            row_last_used = last_used[table.base]
+            chosen, error = _solve_meal(
+                table, target, mains & single, sides & single, row_last_used, day, rng, prefer_protein
+            )
+            if error > CALORIE_TOLERANCE:
+                chosen, error = _solve_meal(table, target, mains, sides, row_last_used, day, rng, prefer_protein)
+            last_used[table.base[chosen]] = day
+            plan_day[meal] = [table.item(row) for row in chosen]
+        plan[str(day)] = plan_day
+
+    return plan
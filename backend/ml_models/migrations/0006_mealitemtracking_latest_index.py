@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0005_alter_mealitem_food_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mealitemtracking',
+            index=models.Index(fields=['meal_item', '-timestamp'], name='ml_models_m_meal_it_64bead_idx'),
+        ),
+    ]
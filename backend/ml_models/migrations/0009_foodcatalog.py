@@ -0,0 +1,75 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Step 1 of 3: the catalog and a nullable reference to it. The backfill
+# (0010_foodcatalog_backfill) and dropping the old columns
+# (0011_foodcatalog_slim_mealitem) run as separate migrations, so on
+# PostgreSQL no ALTER TABLE shares a transaction with the bulk UPDATE of
+# every meal item ("pending trigger events"). The old columns become
+# nullable here so migrating back can re-add them before they are refilled.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0008_generationcacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FoodCatalog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('food_hash', models.CharField(max_length=64, unique=True)),
+                ('name_hash', models.CharField(db_index=True, max_length=64)),
+                ('name', models.CharField(max_length=255)),
+                ('calories', models.FloatField()),
+                ('protein', models.FloatField()),
+                ('carbs', models.FloatField()),
+                ('fat', models.FloatField()),
+                ('image_url', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'food_catalog',
+            },
+        ),
+        migrations.AddField(
+            model_name='mealitem',
+            name='food',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='meal_items', to='ml_models.foodcatalog'),
+        ),
+        migrations.AddField(
+            model_name='mealitem',
+            name='portion',
+            field=models.FloatField(default=1.0),
+        ),
+        migrations.AlterField(
+            model_name='mealitem',
+            name='food_name',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='mealitem',
+            name='calories',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='mealitem',
+            name='protein',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='mealitem',
+            name='carbs',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='mealitem',
+            name='fat',
+            field=models.FloatField(null=True),
+        ),
+    ]
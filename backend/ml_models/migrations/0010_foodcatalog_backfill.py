@@ -0,0 +1,123 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:02
+
+import hashlib
+import re
+from django.db import migrations
+
+
+# Step 2 of 3: backfill the catalog from the meal items (see 0009_foodcatalog)
+
+BATCH_SIZE = 2000
+MACROS = ('protein', 'carbs', 'fat')
+
+
+# Frozen copies of food_catalog.food_name_hash / food_hash so later changes there can't alter this migration
+def _normalize(name):
+    return " ".join(re.sub(r"[^\w\s]", " ", str(name).lower()).split())
+
+
+def _name_hash(name):
+    return hashlib.sha256(_normalize(name).encode("utf-8")).hexdigest()
+
+
+def _food_hash(item):
+    calories = float(item.calories or 0)
+    if calories <= 0:
+        profile = ("0 kcal",) + tuple(round(float(getattr(item, n) or 0), 1) for n in MACROS)
+    else:
+        profile = tuple(round(float(getattr(item, n) or 0) * 100 / calories, 1) for n in MACROS)
+    key = "|".join([_normalize(item.food_name)] + [str(value) for value in profile])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def move_items_to_catalog(apps, schema_editor):
+    """
+    Create one catalog row per distinct dish and macro profile and point every meal item at it
+
+    Items of a dish whose macros are in the same proportions share a row and
+    get the portion that matches their calories, so each item keeps its own
+    macros (to the 0.1 g per 100 kcal the profile is rounded to).
+    """
+    FoodCatalog = apps.get_model('ml_models', 'FoodCatalog')
+    MealItem = apps.get_model('ml_models', 'MealItem')
+
+    catalog = {}
+    images = {}  # name_hash -> first image generated for the dish, shared by all its rows
+    last_id = 0
+    while True:
+        items = list(
+            MealItem.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE]
+        )
+        if not items:
+            break
+        last_id = items[-1].id
+
+        new_entries = {}
+        for item in items:
+            name_hash = _name_hash(item.food_name)
+            if item.image_url and name_hash not in images:
+                images[name_hash] = item.image_url
+                # Rows of the dish created before its first image was seen
+                FoodCatalog.objects.filter(name_hash=name_hash, image_url__isnull=True).update(image_url=item.image_url)
+                for entry in new_entries.values():
+                    if entry.name_hash == name_hash:
+                        entry.image_url = item.image_url
+            food_hash = _food_hash(item)
+            if food_hash not in catalog and food_hash not in new_entries:
+                # First occurrence of a dish and profile defines its catalog portion
+                new_entries[food_hash] = FoodCatalog(
+                    food_hash=food_hash,
+                    name_hash=name_hash,
+                    name=item.food_name[:255],
+                    calories=item.calories,
+                    protein=item.protein,
+                    carbs=item.carbs,
+                    fat=item.fat,
+                    image_url=images.get(name_hash)
+                )
+
+        FoodCatalog.objects.bulk_create(new_entries.values(), batch_size=500)
+        catalog.update(
+            (entry.food_hash, entry)
+            for entry in FoodCatalog.objects.filter(food_hash__in=list(new_entries))
+        )
+
+        for item in items:
+            entry = catalog[_food_hash(item)]
+            item.food = entry
+            item.portion = round(item.calories / entry.calories, 4) if entry.calories and item.calories else 1.0
+        MealItem.objects.bulk_update(items, ['food', 'portion'], batch_size=500)
+
+
+def restore_items_from_catalog(apps, schema_editor):
+    """Copy each item's catalog name, image and portion-scaled macros back into its own columns"""
+    MealItem = apps.get_model('ml_models', 'MealItem')
+
+    last_id = 0
+    while True:
+        items = list(
+            MealItem.objects.filter(id__gt=last_id).select_related('food').order_by('id')[:BATCH_SIZE]
+        )
+        if not items:
+            break
+        last_id = items[-1].id
+
+        for item in items:
+            item.food_name = item.food.name
+            item.image_url = item.food.image_url
+            for nutrient in ('calories', 'protein', 'carbs', 'fat'):
+                setattr(item, nutrient, round(getattr(item.food, nutrient) * item.portion, 1))
+        MealItem.objects.bulk_update(
+            items, ['food_name', 'image_url', 'calories', 'protein', 'carbs', 'fat'], batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0009_foodcatalog'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_items_to_catalog, restore_items_from_catalog),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Step 3 of 3: meal items keep only the catalog reference and portion (see 0009_foodcatalog)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0010_foodcatalog_backfill'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='mealitem',
+            name='food_name',
+        ),
+        migrations.RemoveField(
+            model_name='mealitem',
+            name='calories',
+        ),
+        migrations.RemoveField(
+            model_name='mealitem',
+            name='protein',
+        ),
+        migrations.RemoveField(
+            model_name='mealitem',
+            name='carbs',
+        ),
+        migrations.RemoveField(
+            model_name='mealitem',
+            name='fat',
+        ),
+        migrations.RemoveField(
+            model_name='mealitem',
+            name='image_url',
+        ),
+        migrations.AlterField(
+            model_name='mealitem',
+            name='food',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='meal_items', to='ml_models.foodcatalog'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0011_foodcatalog_slim_mealitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='progress',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
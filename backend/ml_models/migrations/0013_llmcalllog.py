@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0012_generationjob_progress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCallLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=64)),
+                ('outcome', models.CharField(max_length=20)),
+                ('latency_ms', models.IntegerField(default=0)),
+                ('prompt_chars', models.IntegerField(default=0)),
+                ('response_chars', models.IntegerField(default=0)),
+                ('prompt_tokens', models.IntegerField(blank=True, null=True)),
+                ('response_tokens', models.IntegerField(blank=True, null=True)),
+                ('json_ok', models.BooleanField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='llm_calls', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'llm_call_log',
+                'indexes': [models.Index(fields=['created_at'], name='llm_call_lo_created_3dd98e_idx'), models.Index(fields=['user', 'created_at'], name='llm_call_lo_user_id_11f4f5_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0013_llmcalllog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MealPlanCycle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('days', models.JSONField()),
+                ('rotation', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meal_plan_cycles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'meal_plan_cycle',
+                'indexes': [models.Index(fields=['user', 'end_date'], name='meal_plan_c_user_id_5acb33_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:25
+
+import django.db.models.deletion
+import json
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+DAY_FIELDS = ("day_number", "day_name", "is_rest_day", "total_duration_minutes", "total_calories")
+EXERCISE_FIELDS = ("name", "workout_type", "reps_or_duration", "calories")
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _build_rows(description):
+    # Frozen copy of workout_storage.build_rows so later changes there can't alter this migration
+    try:
+        entries = json.loads(description) if description else []
+    except ValueError:
+        entries = []
+    if not isinstance(entries, list):
+        entries = []
+    if not (entries and isinstance(entries[0], dict) and 'day_number' in entries[0]):
+        entries = [{"day_number": 0, "exercises": entries}]
+
+    rows = []
+    exercise_index = 0
+    for day in entries:
+        if not isinstance(day, dict):
+            continue
+        day_fields = {
+            "day_number": int(_number(day.get("day_number"))),
+            "day_name": str(day.get("day_name") or "")[:100],
+            "is_rest_day": bool(day.get("is_rest_day", False)),
+            "total_duration_minutes": _number(day.get("total_duration_minutes")),
+            "total_calories": _number(day.get("total_calories")),
+            "extra": {key: value for key, value in day.items() if key not in DAY_FIELDS and key != "exercises"}
+        }
+        exercises = []
+        for position, exercise in enumerate(day.get("exercises") or []):
+            if not isinstance(exercise, dict):
+                exercise = {"name": str(exercise)}
+            exercises.append({
+                "exercise_index": exercise_index,
+                "position": position,
+                "name": str(exercise.get("name") or "")[:255],
+                "workout_type": str(exercise.get("workout_type") or "general")[:50],
+                "reps_or_duration": str(exercise.get("reps_or_duration") or "")[:255],
+                "calories": _number(exercise.get("calories")),
+                "extra": {key: value for key, value in exercise.items() if key not in EXERCISE_FIELDS}
+            })
+            exercise_index += 1
+        rows.append((day_fields, exercises))
+    return rows
+
+
+def index_existing_workouts(apps, schema_editor):
+    """Create plan day and exercise rows from every workout's description JSON"""
+    Workout = apps.get_model('health_data', 'Workout')
+    WorkoutPlanDay = apps.get_model('ml_models', 'WorkoutPlanDay')
+    WorkoutPlanExercise = apps.get_model('ml_models', 'WorkoutPlanExercise')
+
+    last_id = 0
+    while True:
+        workouts = list(Workout.objects.filter(id__gt=last_id).order_by('id').only('id', 'description')[:BATCH_SIZE])
+        if not workouts:
+            break
+        last_id = workouts[-1].id
+
+        rows = [(workout, _build_rows(workout.description)) for workout in workouts]
+        days = WorkoutPlanDay.objects.bulk_create(
+            [WorkoutPlanDay(workout=workout, **day_fields) for workout, plan in rows for day_fields, _ in plan]
+        )
+        days = iter(days)
+        exercises = []
+        for workout, plan in rows:
+            for _, plan_exercises in plan:
+                day = next(days)
+                exercises.extend(WorkoutPlanExercise(workout=workout, day=day, **fields) for fields in plan_exercises)
+        WorkoutPlanExercise.objects.bulk_create(exercises, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_data', '0005_add_workout_feedback_fields'),
+        ('ml_models', '0014_mealplancycle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkoutPlanDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_number', models.IntegerField()),
+                ('day_name', models.CharField(blank=True, max_length=100)),
+                ('is_rest_day', models.BooleanField(default=False)),
+                ('total_duration_minutes', models.FloatField(default=0)),
+                ('total_calories', models.FloatField(default=0)),
+                ('extra', models.JSONField(blank=True, default=dict)),
+                ('workout', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plan_days', to='health_data.workout')),
+            ],
+            options={
+                'db_table': 'workout_plan_day',
+                'ordering': ['day_number', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkoutPlanExercise',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exercise_index', models.IntegerField()),
+                ('position', models.IntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('workout_type', models.CharField(default='general', max_length=50)),
+                ('reps_or_duration', models.CharField(blank=True, max_length=255)),
+                ('calories', models.FloatField(default=0)),
+                ('extra', models.JSONField(blank=True, default=dict)),
+                ('day', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exercises', to='ml_models.workoutplanday')),
+                ('workout', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plan_exercises', to='health_data.workout')),
+            ],
+            options={
+                'db_table': 'workout_plan_exercise',
+                'ordering': ['exercise_index'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='workoutplanday',
+            index=models.Index(fields=['workout', 'day_number'], name='workout_pla_workout_b552a6_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='workoutplanexercise',
+            unique_together={('workout', 'exercise_index')},
+        ),
+        migrations.RunPython(index_existing_workouts, migrations.RunPython.noop),
+    ]
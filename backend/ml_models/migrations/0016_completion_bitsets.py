@@ -0,0 +1,118 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:31
+
+import json
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count
+
+
+BATCH_SIZE = 500
+
+
+def _bitset(completed, total):
+    # Frozen copy of completion.from_indices so later changes there can't alter this migration
+    value = 0
+    for index in completed:
+        if 0 <= index < total:
+            value |= 1 << index
+    return value.to_bytes((total + 7) // 8, 'little')
+
+
+def _schedule_length(notes):
+    try:
+        schedule = json.loads(notes) if notes else []
+    except ValueError:
+        return 0
+    return len(schedule) if isinstance(schedule, list) else 0
+
+
+def _fill(Plan, Tracking, plan_field, index_field, totals_for):
+    last_id = 0
+    while True:
+        plans = list(Plan.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not plans:
+            break
+        last_id = plans[-1].id
+
+        completed = defaultdict(list)
+        for plan_id, index in Tracking.objects.filter(**{f'{plan_field}__in': plans, 'completed': True}).values_list(f'{plan_field}_id', index_field):
+            completed[plan_id].append(index)
+        totals = totals_for(plans)
+        for plan in plans:
+            plan.completion_total = totals.get(plan.id, 0)
+            plan.completion_bits = _bitset(completed[plan.id], plan.completion_total)
+            plan.completed_count = int.from_bytes(plan.completion_bits, 'little').bit_count()
+        Plan.objects.bulk_update(plans, ['completion_bits', 'completion_total', 'completed_count'])
+
+    # Rows that only recorded completion have nothing left to keep
+    Tracking.objects.filter(difficulty__isnull=True, notes='').delete()
+
+
+def fill_completion_bitsets(apps, schema_editor):
+    """Move completion from the per-index tracking rows to the plans' bitsets"""
+    WorkoutPlanExercise = apps.get_model('ml_models', 'WorkoutPlanExercise')
+
+    def workout_totals(workouts):
+        return dict(
+            WorkoutPlanExercise.objects.filter(workout__in=workouts)
+            .values('workout_id').annotate(n=Count('id')).values_list('workout_id', 'n')
+        )
+
+    def marathon_totals(marathons):
+        return {marathon.id: _schedule_length(marathon.notes) for marathon in marathons}
+
+    _fill(
+        apps.get_model('health_data', 'Workout'), apps.get_model('ml_models', 'WorkoutExerciseTracking'),
+        'workout', 'exercise_index', workout_totals
+    )
+    _fill(
+        apps.get_model('health_data', 'Marathon'), apps.get_model('ml_models', 'MarathonDayTracking'),
+        'marathon', 'day_index', marathon_totals
+    )
+
+
+def _restore(Plan, Tracking, plan_field, index_field):
+    for plan in Plan.objects.exclude(completed_count=0).iterator():
+        value = int.from_bytes(bytes(plan.completion_bits), 'little')
+        indices = [index for index in range(value.bit_length()) if value >> index & 1]
+        Tracking.objects.bulk_create(
+            [Tracking(**{plan_field: plan, index_field: index, 'completed': True}) for index in indices],
+            update_conflicts=True,
+            unique_fields=[plan_field, index_field],
+            update_fields=['completed']
+        )
+
+
+def restore_completed_rows(apps, schema_editor):
+    """Recreate completed tracking rows from the bitsets"""
+    _restore(apps.get_model('health_data', 'Workout'), apps.get_model('ml_models', 'WorkoutExerciseTracking'), 'workout', 'exercise_index')
+    _restore(apps.get_model('health_data', 'Marathon'), apps.get_model('ml_models', 'MarathonDayTracking'), 'marathon', 'day_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_data', '0006_completion_bitsets'),
+        ('ml_models', '0015_workoutplanday_workoutplanexercise'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_completion_bitsets, restore_completed_rows),
+        migrations.RemoveField(
+            model_name='marathondaytracking',
+            name='completed',
+        ),
+        migrations.RemoveField(
+            model_name='marathondaytracking',
+            name='completed_at',
+        ),
+        migrations.RemoveField(
+            model_name='workoutexercisetracking',
+            name='completed',
+        ),
+        migrations.RemoveField(
+            model_name='workoutexercisetracking',
+            name='completed_at',
+        ),
+    ]
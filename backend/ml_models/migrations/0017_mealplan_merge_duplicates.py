@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:28
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+# Step 1 of 2: merge meals that share a user, date and meal type so the
+# unique constraint (0018_mealplan_unique_meal_cycle_anchor) can be added.
+# Run separately so on PostgreSQL the ALTER TABLE doesn't share a
+# transaction with these UPDATEs ("pending trigger events").
+
+
+def merge_duplicate_meals(apps, schema_editor):
+    """Move the items of every duplicate meal onto the oldest one and delete the rest"""
+    MealPlan = apps.get_model('ml_models', 'MealPlan')
+    MealItem = apps.get_model('ml_models', 'MealItem')
+
+    duplicates = (
+        MealPlan.objects.values('user_id', 'date', 'meal_type')
+        .annotate(meals=Count('id'), keep=Min('id'))
+        .filter(meals__gt=1)
+    )
+    for group in duplicates.iterator():
+        meals = MealPlan.objects.filter(
+            user_id=group['user_id'], date=group['date'], meal_type=group['meal_type']
+        ).exclude(id=group['keep'])
+        # Items keep their ids, so their tracking and the nutrition rollups are unchanged
+        MealItem.objects.filter(meal__in=meals).update(meal_id=group['keep'])
+        meals.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0016_completion_bitsets'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_meals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Step 2 of 2: one meal per user, date and meal type (see 0017_mealplan_merge_duplicates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0017_mealplan_merge_duplicates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealplancycle',
+            name='anchor_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='mealplan',
+            constraint=models.UniqueConstraint(fields=('user', 'date', 'meal_type'), name='unique_meal_per_user_date_type'),
+        ),
+    ]
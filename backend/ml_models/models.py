@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import OuterRef, Subquery
 from django.conf import settings
+from django.utils import timezone
 
 # UserBodyProfile removed - using User table directly (has age, gender, height, weight)
 
@@ -8,15 +10,86 @@ class MealPlan(models.Model):
     date = models.DateField()
     meal_type = models.CharField(max_length=20)
 
+    class Meta:
+        constraints = [
+            # One meal of each type a day; materializing a plan cycle on read relies on it
+            models.UniqueConstraint(fields=['user', 'date', 'meal_type'], name='unique_meal_per_user_date_type'),
+        ]
 
-class MealItem(models.Model):
-    meal = models.ForeignKey(MealPlan, on_delete=models.CASCADE, related_name="items")
-    food_name = models.CharField(max_length=255)  # Increased from 100 to 255
-    calories = models.FloatField()
+
+class MealItemQuerySet(models.QuerySet):
+    def for_user_dates(self, user, start_date, end_date=None):
+        """Items of the user's meals from start_date to end_date (inclusive, open-ended if None)"""
+        queryset = self.filter(meal__user=user, meal__date__gte=start_date)
+        if end_date is not None:
+            queryset = queryset.filter(meal__date__lte=end_date)
+        return queryset
+
+    def with_latest_tracking(self):
+        """
+        Attach the most recent MealItemTracking of each item in the same query
+
+        Adds `tracking_status` (None if never tracked) and `tracking_ratio`,
+        and joins the catalog row the item's nutrients come from.
+        """
+        latest = MealItemTracking.objects.filter(meal_item=OuterRef('pk')).order_by('-timestamp', '-id')
+        return self.select_related('food').annotate(
+            tracking_status=Subquery(latest.values('status')[:1]),
+            tracking_ratio=Subquery(latest.values('quantity_ratio')[:1])
+        )
+
+
+class FoodCatalog(models.Model):
+    """One row per dish and macro profile; meal items reference it instead of repeating name, macros and image"""
+    food_hash = models.CharField(max_length=64, unique=True)  # sha256 of the normalized name and macro profile
+    name_hash = models.CharField(max_length=64, db_index=True)  # sha256 of the normalized name
+    name = models.CharField(max_length=255)
+    calories = models.FloatField()  # Macros of one catalog portion
     protein = models.FloatField()
     carbs = models.FloatField()
     fat = models.FloatField()
-    image_url = models.TextField(null=True, blank=True)  # Store base64 or URL
+    image_url = models.TextField(null=True, blank=True)  # Short URL in the image store (see image_store.py)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'food_catalog'
+
+    def __str__(self):
+        return self.name
+
+
+class MealItem(models.Model):
+    meal = models.ForeignKey(MealPlan, on_delete=models.CASCADE, related_name="items")
+    food = models.ForeignKey(FoodCatalog, on_delete=models.PROTECT, related_name="meal_items")
+    portion = models.FloatField(default=1.0)  # Multiplier of the catalog portion
+
+    objects = MealItemQuerySet.as_manager()
+
+    # Nutrients of this item (catalog values scaled by the portion); use select_related('food')
+    @property
+    def food_name(self):
+        return self.food.name
+
+    @property
+    def calories(self):
+        return self.food.calories * self.portion
+
+    @property
+    def protein(self):
+        return self.food.protein * self.portion
+
+    @property
+    def carbs(self):
+        return self.food.carbs * self.portion
+
+    @property
+    def fat(self):
+        return self.food.fat * self.portion
+
+    @property
+    def image_url(self):
+        return self.food.image_url
+
 
 class MealItemTracking(models.Model):
     meal_item = models.ForeignKey(MealItem, on_delete=models.CASCADE)
@@ -24,8 +97,30 @@ class MealItemTracking(models.Model):
     quantity_ratio = models.FloatField()  # 1.0 full, 0.5 half
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['meal_item', '-timestamp']),
+        ]
+
 
-# Workout Plan Exercise Tracking
+# Long meal plans stored as a repeating base cycle (see plan_cycles.py)
+class MealPlanCycle(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='meal_plan_cycles')
+    start_date = models.DateField()
+    end_date = models.DateField()  # Last plan day, inclusive
+    days = models.JSONField()  # Base days: [{"breakfast": [[food_id, portion], ...], ...}, ...]
+    rotation = models.IntegerField(default=0)  # Base days each pass of the cycle is shifted by
+    anchor_date = models.DateField(null=True, blank=True)  # Date of base day 1 of the first pass; start_date if null
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'meal_plan_cycle'
+        indexes = [
+            models.Index(fields=['user', 'end_date']),
+        ]
+
+
+# Workout Plan Exercise Tracking: per-exercise details; completion is the bitset on the workout (see completion.py)
 class WorkoutExerciseTracking(models.Model):
     DIFFICULTY_CHOICES = [
         ('easy', 'Easy'),
@@ -35,10 +130,8 @@ class WorkoutExerciseTracking(models.Model):
     
     workout = models.ForeignKey('health_data.Workout', on_delete=models.CASCADE, related_name='exercise_tracking')
     exercise_index = models.IntegerField()  # Index in the exercises JSON array
-    completed = models.BooleanField(default=False)
     difficulty = models.CharField(max_length=20, choices=DIFFICULTY_CHOICES, null=True, blank=True)
     notes = models.TextField(blank=True)
-    completed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -47,7 +140,42 @@ class WorkoutExerciseTracking(models.Model):
         ordering = ['exercise_index']
 
 
-# Marathon Plan Day Tracking
+# Workout plan days and exercises as rows (see workout_storage.py); Workout.description keeps the JSON copy
+class WorkoutPlanDay(models.Model):
+    workout = models.ForeignKey('health_data.Workout', on_delete=models.CASCADE, related_name='plan_days')
+    day_number = models.IntegerField()  # 0 for single-day workouts stored as a plain exercise list
+    day_name = models.CharField(max_length=100, blank=True)
+    is_rest_day = models.BooleanField(default=False)
+    total_duration_minutes = models.FloatField(default=0)
+    total_calories = models.FloatField(default=0)
+    extra = models.JSONField(default=dict, blank=True)  # Other keys of the generated day
+
+    class Meta:
+        db_table = 'workout_plan_day'
+        ordering = ['day_number', 'id']
+        indexes = [
+            models.Index(fields=['workout', 'day_number']),
+        ]
+
+
+class WorkoutPlanExercise(models.Model):
+    workout = models.ForeignKey('health_data.Workout', on_delete=models.CASCADE, related_name='plan_exercises')
+    day = models.ForeignKey(WorkoutPlanDay, on_delete=models.CASCADE, related_name='exercises')
+    exercise_index = models.IntegerField()  # Global index across all days, as used by WorkoutExerciseTracking
+    position = models.IntegerField()  # Index within its day
+    name = models.CharField(max_length=255)
+    workout_type = models.CharField(max_length=50, default='general')
+    reps_or_duration = models.CharField(max_length=255, blank=True)
+    calories = models.FloatField(default=0)
+    extra = models.JSONField(default=dict, blank=True)  # Other keys of the generated exercise
+
+    class Meta:
+        db_table = 'workout_plan_exercise'
+        unique_together = ['workout', 'exercise_index']
+        ordering = ['exercise_index']
+
+
+# Marathon Plan Day Tracking: per-day details; completion is the bitset on the marathon (see completion.py)
 class MarathonDayTracking(models.Model):
     DIFFICULTY_CHOICES = [
         ('easy', 'Easy'),
@@ -57,13 +185,87 @@ class MarathonDayTracking(models.Model):
     
     marathon = models.ForeignKey('health_data.Marathon', on_delete=models.CASCADE, related_name='day_tracking')
     day_index = models.IntegerField()  # Index in the weekly_schedule JSON array
-    completed = models.BooleanField(default=False)
     difficulty = models.CharField(max_length=20, choices=DIFFICULTY_CHOICES, null=True, blank=True)
     notes = models.TextField(blank=True)
-    completed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         db_table = 'marathon_day_tracking'
         unique_together = ['marathon', 'day_index']
         ordering = ['day_index']
+
+
+# Background generation jobs (LLM plan generation off the request cycle)
+class GenerationJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='generation_jobs')
+    kind = models.CharField(max_length=50)  # Key in jobs.JOB_HANDLERS
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    result = models.JSONField(null=True, blank=True)  # API response body once succeeded
+    progress = models.JSONField(default=dict, blank=True)  # Counters reported while running
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)  # Backoff before a retry
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'generation_job'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['user', 'kind', 'status']),
+        ]
+
+
+# Cached model output for normalized generation parameters (see generation_cache.py)
+class GenerationCacheEntry(models.Model):
+    key = models.CharField(max_length=64, unique=True)  # sha256 of kind + normalized params
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict)
+    payload = models.JSONField()
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'generation_cache_entry'
+        indexes = [
+            models.Index(fields=['last_used_at']),
+        ]
+
+
+# One row per Gemini call or local fallback, written in batches by llm_metrics
+class LLMCallLog(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='llm_calls')
+    endpoint = models.CharField(max_length=50)  # Feature that made the call, e.g. a job kind
+    model = models.CharField(max_length=64)  # 'local' for fallback rows
+    outcome = models.CharField(max_length=20)  # ok, error, circuit_open or fallback
+    latency_ms = models.IntegerField(default=0)
+    prompt_chars = models.IntegerField(default=0)
+    response_chars = models.IntegerField(default=0)
+    prompt_tokens = models.IntegerField(null=True, blank=True)
+    response_tokens = models.IntegerField(null=True, blank=True)
+    json_ok = models.BooleanField(null=True, blank=True)  # None when the response was not parsed
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'llm_call_log'
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
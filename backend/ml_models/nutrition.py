@@ -0,0 +1,307 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.utils.timezone import now
+
+from health_data.models import DailyNutritionLog
+from .models import MealItem
+
+
+NUTRIENTS = ("calories", "protein", "carbs", "fat")
+
+
+def item_contribution(item, status, quantity_ratio):
+    """Nutrients a meal item adds to the day's intake for a tracking status"""
+    if status != "eaten":
+        return (0.0, 0.0, 0.0, 0.0)
+    ratio = float(quantity_ratio)
+    return (
+        item.calories * ratio,
+        item.protein * ratio,
+        item.carbs * ratio,
+        item.fat * ratio
+    )
+
+
+# ---------------- DAILY ROLLUPS ---------------- #
+def apply_rollup_delta(user_id, day, delta):
+    """
+    Add a nutrient delta to the user's DailyNutritionLog row for a day
+
+    The row is created on first use and then updated with F() expressions,
+    so concurrent deltas for the same day never overwrite each other.
+    """
+    if not any(delta):
+        return
+
+    DailyNutritionLog.objects.get_or_create(user_id=user_id, date=day)
+    DailyNutritionLog.objects.filter(user_id=user_id, date=day).update(
+        total_calories=F("total_calories") + delta[0],
+        total_protein=F("total_protein") + delta[1],
+        total_carbs=F("total_carbs") + delta[2],
+        total_fat=F("total_fat") + delta[3]
+    )
+
+
+def apply_rollup_deltas(user_id, deltas):
+    """
+    Add nutrient deltas to several of the user's DailyNutritionLog rows in two queries
+
+    Missing rows are inserted (existing ones are left alone), then one
+    UPDATE adds each day's delta with F() expressions.
+
+    Args:
+        deltas (dict): date -> (calories, protein, carbs, fat) delta
+    """
+    deltas = {day: delta for day, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    DailyNutritionLog.objects.bulk_create(
+        [DailyNutritionLog(user_id=user_id, date=day) for day in deltas],
+        ignore_conflicts=True
+    )
+    DailyNutritionLog.objects.filter(user_id=user_id, date__in=deltas).update(**{
+        f"total_{nutrient}": F(f"total_{nutrient}") + Case(
+            *[When(date=day, then=Value(delta[n])) for day, delta in deltas.items()],
+            default=Value(0.0),
+            output_field=FloatField()
+        )
+        for n, nutrient in enumerate(NUTRIENTS)
+    })
+
+
+def eaten_by_date(items):
+    """
+    Eaten nutrients of a MealItem queryset per date, summed in one query
+
+    Returns:
+        dict: date -> (calories, protein, carbs, fat) of the items whose latest tracking is "eaten"
+    """
+    rows = (
+        items.with_latest_tracking()
+        .filter(tracking_status="eaten")
+        .values(date=F("meal__date"))
+        .annotate(**{
+            nutrient: Sum(F(f"food__{nutrient}") * F("portion") * F("tracking_ratio"), output_field=FloatField())
+            for nutrient in NUTRIENTS
+        })
+        .order_by()
+    )
+    return {row["date"]: tuple(row[nutrient] or 0.0 for nutrient in NUTRIENTS) for row in rows}
+
+
+def apply_item_rollups(user_id, items, sign):
+    """
+    Add (sign=1) or subtract (sign=-1) the eaten share of meal items in their days' rollups
+
+    Tracked items that are deleted or repointed at another dish change the
+    day's intake without a tracking change, so callers subtract them before
+    the change and add rewritten items back after it, in the same transaction.
+    """
+    apply_rollup_deltas(user_id, {
+        day: tuple(sign * value for value in totals) for day, totals in eaten_by_date(items).items()
+    })
+
+
+def rollup_totals(user, start_date, end_date=None):
+    """
+    Summed intake from the user's DailyNutritionLog rows in a date range
+
+    Returns:
+        dict: calories, protein, carbs and fat (0 when there are no rows)
+    """
+    logs = DailyNutritionLog.objects.filter(user=user, date__gte=start_date)
+    if end_date is not None:
+        logs = logs.filter(date__lte=end_date)
+
+    sums = logs.aggregate(
+        calories=Sum("total_calories"),
+        protein=Sum("total_protein"),
+        carbs=Sum("total_carbs"),
+        fat=Sum("total_fat")
+    )
+    return {key: sums[key] or 0 for key in NUTRIENTS}
+
+
+# ---------------- SQL SUMMARIES ---------------- #
+def _empty_totals():
+    return {"calories": 0.0, "protein": 0.0, "carbs": 0.0, "fat": 0.0, "items": 0, "eaten": 0}
+
+
+def _add_totals(totals, row):
+    for key in NUTRIENTS + ("items", "eaten"):
+        totals[key] += row[key] or 0
+
+
+def _rounded(totals):
+    return {key: round(value, 1) if key in NUTRIENTS else value for key, value in totals.items()}
+
+
+def summary_rows(start_date, end_date, users=None):
+    """
+    Eaten nutrients per user, date and meal type, aggregated in the database
+
+    One query: every item gets the status and ratio of its latest tracking
+    (MealItem.with_latest_tracking) and contributes catalog nutrients x
+    portion x ratio when that status is "eaten", 0 otherwise.
+
+    Args:
+        start_date (date), end_date (date): Inclusive date window
+        users (iterable): Users or user ids to include; None for every user
+
+    Returns:
+        QuerySet: dicts with user_id, date, meal_type, calories, protein,
+        carbs, fat, items (planned items) and eaten (items tracked as eaten)
+    """
+    items = MealItem.objects.filter(meal__date__gte=start_date, meal__date__lte=end_date)
+    if users is not None:
+        items = items.filter(meal__user__in=list(users))
+
+    ratio = Case(
+        When(tracking_status="eaten", then=F("tracking_ratio")),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+    return (
+        items.with_latest_tracking()
+        .annotate(eaten_ratio=ratio)
+        .values(user_id=F("meal__user_id"), date=F("meal__date"), meal_type=F("meal__meal_type"))
+        .annotate(
+            **{
+                nutrient: Sum(F(f"food__{nutrient}") * F("portion") * F("eaten_ratio"), output_field=FloatField())
+                for nutrient in NUTRIENTS
+            },
+            items=Count("id"),
+            eaten=Count("id", filter=Q(tracking_status="eaten"))
+        )
+        .order_by()
+    )
+
+
+def nutrition_summaries(start_date, end_date, users=None):
+    """
+    Nutrition summaries of many users at once (batch mode of nutrition_summary)
+
+    Returns:
+        dict: user_id -> summary (see nutrition_summary); users without
+        planned items in the window are absent
+    """
+    summaries = {}
+    for row in summary_rows(start_date, end_date, users):
+        summary = summaries.get(row["user_id"])
+        if summary is None:
+            summary = summaries[row["user_id"]] = {"overall": _empty_totals(), "days": {}, "meal_types": {}}
+        _add_totals(summary["overall"], row)
+        _add_totals(summary["days"].setdefault(row["date"], _empty_totals()), row)
+        _add_totals(summary["meal_types"].setdefault(row["meal_type"], _empty_totals()), row)
+
+    for summary in summaries.values():
+        summary["overall"] = _rounded(summary["overall"])
+        summary["days"] = {day: _rounded(totals) for day, totals in sorted(summary["days"].items())}
+        summary["meal_types"] = {meal_type: _rounded(totals) for meal_type, totals in summary["meal_types"].items()}
+    return summaries
+
+
+def nutrition_summary(user, start_date, end_date):
+    """
+    What the user ate in a date window: overall, per day and per meal type
+
+    Returns:
+        dict: {"overall": totals, "days": {date: totals}, "meal_types": {meal_type: totals}},
+        totals being calories, protein, carbs, fat, items and eaten. Only
+        days with planned items appear in "days".
+    """
+    return nutrition_summaries(start_date, end_date, [user]).get(
+        user.id, {"overall": _rounded(_empty_totals()), "days": {}, "meal_types": {}}
+    )
+
+
+# ---------------- FEEDBACK ---------------- #
+FEEDBACK_DAYS = 7  # Days of intake passed to the AI meal planner
+
+
+def _feedback(overall):
+    return {nutrient: overall[nutrient] for nutrient in NUTRIENTS}
+
+
+def get_feedback(user):
+    """User's intake over the last 7 days, passed to the AI meal planner as feedback"""
+    today = now().date()
+    return _feedback(nutrition_summary(user, today - timedelta(days=FEEDBACK_DAYS), today)["overall"])
+
+
+def batch_feedback(users=None, today=None):
+    """
+    get_feedback for many users in one query, for nightly jobs
+
+    Args:
+        users (iterable): Users or user ids; None for every user with a plan in the window
+        today (date): Last day of the window (default today)
+
+    Returns:
+        dict: user_id -> feedback; users without planned items get zero feedback
+    """
+    today = today or now().date()
+    summaries = nutrition_summaries(today - timedelta(days=FEEDBACK_DAYS), today, users)
+    feedback = {user_id: _feedback(summary["overall"]) for user_id, summary in summaries.items()}
+    for user in users or ():
+        feedback.setdefault(getattr(user, "id", user), _feedback(_rounded(_empty_totals())))
+    return feedback
+
+
+def rebuild_rollups(start_date, end_date, user=None):
+    """
+    Recompute DailyNutritionLog rows from meal items and their latest tracking
+
+    Every existing row in the range is overwritten; days that only have
+    raw data get a new row.
+
+    Returns:
+        dict: Number of rows created and updated
+    """
+    logs = DailyNutritionLog.objects.filter(date__gte=start_date, date__lte=end_date)
+    if user is not None:
+        logs = logs.filter(user=user)
+
+    # Summed in the database per user, day and meal type; only the days are kept here
+    totals = defaultdict(lambda: [0.0, 0.0, 0.0, 0.0])
+    for row in summary_rows(start_date, end_date, None if user is None else [user]):
+        key = (row["user_id"], row["date"])
+        for i, nutrient in enumerate(NUTRIENTS):
+            totals[key][i] += row[nutrient] or 0
+
+    with transaction.atomic():
+        to_update = []
+        for log in logs.select_for_update():
+            log.total_calories, log.total_protein, log.total_carbs, log.total_fat = totals.pop(
+                (log.user_id, log.date), (0.0, 0.0, 0.0, 0.0)
+            )
+            to_update.append(log)
+
+        DailyNutritionLog.objects.bulk_update(
+            to_update,
+            ["total_calories", "total_protein", "total_carbs", "total_fat"],
+            batch_size=500
+        )
+        DailyNutritionLog.objects.bulk_create(
+            [
+                DailyNutritionLog(
+                    user_id=user_id,
+                    date=day,
+                    total_calories=values[0],
+                    total_protein=values[1],
+                    total_carbs=values[2],
+                    total_fat=values[3]
+                )
+                for (user_id, day), values in totals.items()
+            ],
+            batch_size=500
+        )
+
+    return {
+        "created": len(totals),
+        "updated": len(to_update)
+    }
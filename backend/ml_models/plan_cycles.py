@@ -0,0 +1,246 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+
+from .food_catalog import food_hash, get_or_create_foods, portion_for
+from .models import FoodCatalog, MealItem, MealPlan, MealPlanCycle
+from .plan_storage import BULK_BATCH_SIZE, delete_meals_from, save_meal_plan
+from .portion_scaling import scale_plan_portions
+
+
+# Long plans are stored as a base cycle of CYCLE_DAYS generated days plus a
+# rotation rule, one MealPlanCycle row per plan. MealPlan/MealItem rows for
+# a day are only written when the day is first read (materialize) or falls
+# in the look-ahead window after saving; tracking, recalculation and images
+# keep working on those rows exactly as for short plans. A cycle covers
+# start_date..end_date; its passes count from anchor_date (start_date if
+# unset), so a cycle split at a recalculation keeps its rotation.
+
+CYCLE_MIN_DAYS = 28   # Plans longer than this are stored as a cycle
+CYCLE_DAYS = 14       # Generated base days of a cycle
+CYCLE_ROTATION = 3    # Base days every further pass is shifted by, so dishes move across weekdays
+LOOKAHEAD_DAYS = 3    # Days materialized when the plan is saved (covers image_warmer.WARM_DAYS)
+
+# Variation on every second pass: lunch and dinner have the same calorie
+# share, so swapping them changes the day without changing its totals
+ODD_PASS_SWAPS = {"lunch": "dinner", "dinner": "lunch"}
+
+
+def generated_days(days):
+    """Days to generate for a plan of `days` days: the base cycle for long plans"""
+    return CYCLE_DAYS if days > CYCLE_MIN_DAYS else days
+
+
+def base_day(cycle, day_date):
+    """
+    Meals of one plan date from its cycle
+
+    Returns:
+        dict: meal_type -> [[food_id, portion], ...]
+    """
+    n = (day_date - (cycle.anchor_date or cycle.start_date)).days
+    length = len(cycle.days)
+    cycle_pass = n // length
+    day = cycle.days[(n + cycle_pass * cycle.rotation) % length]
+    if cycle_pass % 2:
+        return {ODD_PASS_SWAPS.get(meal_type, meal_type): foods for meal_type, foods in day.items()}
+    return day
+
+
+def save_plan(user, plan, start_date, days, replace_from=None):
+    """
+    Store a generated plan: as rows for short plans, as a cycle for long ones
+
+    Args:
+        plan (dict): Day-keyed plan with generated_days(days) days
+        start_date (date): Date of plan day "1"
+        days (int): Plan length in days
+        replace_from (date): As for plan_storage.save_meal_plan
+    """
+    if days <= CYCLE_MIN_DAYS:
+        save_meal_plan(user, plan, start_date, days, replace_from=replace_from)
+        return
+
+    with transaction.atomic():
+        if replace_from is not None:
+            delete_meals_from(user, replace_from)
+        create_cycle(user, plan, start_date, start_date, start_date + timedelta(days=days - 1))
+    materialize(user, start_date, start_date + timedelta(days=LOOKAHEAD_DAYS - 1))
+
+
+def create_cycle(user, plan, anchor_date, start_date, end_date):
+    """
+    Store a generated plan as the base days of a cycle covering start_date..end_date
+
+    Args:
+        plan (dict): Day-keyed base days
+        anchor_date (date): Date of base day "1" in the first pass; dates before
+            start_date (e.g. base days already stored as rows) are not covered
+
+    Returns:
+        MealPlanCycle
+    """
+    base_days = [plan[str(d)] for d in range(1, len(plan) + 1)]
+    catalog = get_or_create_foods(food for day in base_days for foods in day.values() for food in foods)
+    encoded = []
+    for day in base_days:
+        encoded_day = {}
+        for meal_type, foods in day.items():
+            entries = [catalog[food_hash(food)] for food in foods]
+            encoded_day[meal_type] = [[entry.id, portion_for(entry, food)] for entry, food in zip(entries, foods)]
+        encoded.append(encoded_day)
+
+    return MealPlanCycle.objects.create(
+        user=user,
+        start_date=start_date,
+        end_date=end_date,
+        days=encoded,
+        rotation=CYCLE_ROTATION,
+        anchor_date=anchor_date if anchor_date != start_date else None
+    )
+
+
+def materialize(user, start_date, end_date):
+    """
+    Write MealPlan/MealItem rows for the cycle days between two dates that have none yet
+
+    Cheap when nothing is missing: one query for the overlapping cycles, and
+    one for the dates that already have rows if any cycle overlaps. Runs on
+    GET requests, so a day written concurrently by a plan save (the unique
+    meal constraint rejects the second copy) is skipped on a retry.
+
+    Returns:
+        int: Number of days materialized
+    """
+    try:
+        return _materialize(user, start_date, end_date)
+    except IntegrityError:
+        return _materialize(user, start_date, end_date)
+
+
+def _materialize(user, start_date, end_date):
+    with transaction.atomic():
+        # Locking the cycles serializes concurrent reads of the same days
+        cycles = list(
+            MealPlanCycle.objects.select_for_update()
+            .filter(user=user, start_date__lte=end_date, end_date__gte=start_date)
+            .order_by('id')
+        )
+        if not cycles:
+            return 0
+
+        stored = set(
+            MealPlan.objects.filter(user=user, date__gte=start_date, date__lte=end_date)
+            .values_list('date', flat=True)
+        )
+        meals = []
+        foods_per_meal = []
+        for cycle in cycles:
+            day_date = max(start_date, cycle.start_date)
+            last = min(end_date, cycle.end_date)
+            while day_date <= last:
+                if day_date not in stored:
+                    stored.add(day_date)
+                    for meal_type, foods in base_day(cycle, day_date).items():
+                        meals.append(MealPlan(user=user, date=day_date, meal_type=meal_type))
+                        foods_per_meal.append(foods)
+                day_date += timedelta(days=1)
+
+        if not meals:
+            return 0
+        meals = MealPlan.objects.bulk_create(meals, batch_size=BULK_BATCH_SIZE)
+        MealItem.objects.bulk_create(
+            [
+                MealItem(meal=meal, food_id=food_id, portion=portion)
+                for meal, foods in zip(meals, foods_per_meal)
+                for food_id, portion in foods
+            ],
+            batch_size=BULK_BATCH_SIZE
+        )
+        return len({meal.date for meal in meals})
+
+
+def active_plan(user, today):
+    """
+    The user's plan from today onward, materialized rows and cycle days together
+
+    Returns:
+        dict: start_date, end_date, days (dates with meals) and meals (meal
+        count), or None if there is no meal from today on
+    """
+    stored = {}
+    for day_date in MealPlan.objects.filter(user=user, date__gte=today).values_list('date', flat=True):
+        stored[day_date] = stored.get(day_date, 0) + 1
+
+    meals_per_date = dict(stored)
+    for cycle in MealPlanCycle.objects.filter(user=user, end_date__gte=today):
+        day_date = max(today, cycle.start_date)
+        while day_date <= cycle.end_date:
+            if day_date not in meals_per_date:
+                meals_per_date[day_date] = len(base_day(cycle, day_date))
+            day_date += timedelta(days=1)
+
+    if not meals_per_date:
+        return None
+    return {
+        "start_date": min(meals_per_date),
+        "end_date": max(meals_per_date),
+        "days": len(meals_per_date),
+        "meals": sum(meals_per_date.values())
+    }
+
+
+def rescale_cycles(user, start_date, daily_calories):
+    """
+    Scale the portions of the user's cycles from start_date onward to a new daily calorie target
+
+    Used by recalculation for the days that are not materialized yet; the
+    materialized ones are handled row by row. A cycle that started before
+    start_date is split: its earlier days keep their portions, and a new
+    cycle with the same anchor and rotation covers start_date onward.
+
+    Returns:
+        int: Number of base days rescaled
+    """
+    with transaction.atomic():
+        cycles = list(
+            MealPlanCycle.objects.select_for_update().filter(user=user, end_date__gte=start_date).order_by('id')
+        )
+        food_ids = {food_id for cycle in cycles for day in cycle.days for foods in day.values() for food_id, _ in foods}
+        catalog = {entry.id: entry for entry in FoodCatalog.objects.filter(id__in=food_ids)}
+
+        rescaled = 0
+        for cycle in cycles:
+            plan = {
+                str(index): {
+                    meal_type: [
+                        {"calories": catalog[food_id].calories * portion, "protein": 0, "carbs": 0, "fat": 0}
+                        for food_id, portion in foods
+                    ]
+                    for meal_type, foods in day.items()
+                }
+                for index, day in enumerate(cycle.days)
+            }
+            scaled = scale_plan_portions(plan, daily_calories, label="meal plan cycle")
+            for index, day in enumerate(cycle.days):
+                for meal_type, foods in day.items():
+                    for food, scaled_food in zip(foods, scaled[str(index)][meal_type]):
+                        calories = catalog[food[0]].calories
+                        if calories:
+                            food[1] = round(scaled_food["calories"] / calories, 4)
+
+            if cycle.start_date < start_date:
+                # The dates before start_date keep the old cycle and its portions
+                MealPlanCycle.objects.create(
+                    user=user,
+                    start_date=start_date,
+                    end_date=cycle.end_date,
+                    days=cycle.days,
+                    rotation=cycle.rotation,
+                    anchor_date=cycle.anchor_date or cycle.start_date
+                )
+                MealPlanCycle.objects.filter(id=cycle.id).update(end_date=start_date - timedelta(days=1))
+            else:
+                cycle.save(update_fields=['days'])
+            rescaled += len(cycle.days)
+        return rescaled
@@ -0,0 +1,186 @@
+from datetime import timedelta
+
+from django.db import transaction
+
+from .food_catalog import food_hash, get_or_create_foods, portion_for
+from .models import MealPlan, MealItem, MealPlanCycle
+from .nutrition import apply_item_rollups
+
+
+# Rows per INSERT statement; keeps a 365-day plan to a handful of round trips
+BULK_BATCH_SIZE = 500
+
+# Portion differences below this are not worth an UPDATE
+PORTION_EPSILON = 0.01
+
+
+def delete_meals_from(user, start_date):
+    """
+    Delete the user's meals from start_date onward, materialized or not
+
+    Cycles that started earlier are cut off the day before so their past
+    days can still be read. What the deleted items were tracked as eaten is
+    taken off the DailyNutritionLog rollups.
+
+    Returns:
+        int: Number of MealPlan rows deleted
+    """
+    with transaction.atomic():
+        apply_item_rollups(user.id, MealItem.objects.filter(meal__user=user, meal__date__gte=start_date), -1)
+        deleted, per_model = MealPlan.objects.filter(user=user, date__gte=start_date).delete()
+        cycles = MealPlanCycle.objects.filter(user=user, end_date__gte=start_date)
+        cycles.filter(start_date__gte=start_date).delete()
+        cycles.update(end_date=start_date - timedelta(days=1))
+    return per_model.get(MealPlan._meta.label, 0)
+
+
+def delete_meals_on(user, dates):
+    """
+    Delete the user's stored meals on some dates, taking eaten items off the rollups
+
+    Returns:
+        int: Number of MealPlan rows deleted
+    """
+    with transaction.atomic():
+        apply_item_rollups(user.id, MealItem.objects.filter(meal__user=user, meal__date__in=dates), -1)
+        deleted, per_model = MealPlan.objects.filter(user=user, date__in=dates).delete()
+    return per_model.get(MealPlan._meta.label, 0)
+
+
+def save_meal_plan(user, plan, start_date, days, replace_from=None):
+    """
+    Persist a generated meal plan in a single transaction
+
+    Meals are written first with one bulk insert. Dishes not yet in the food
+    catalog are added in bulk, then every item is linked to its meal id and
+    catalog row and written with a second bulk insert.
+
+    Args:
+        user: Owner of the plan
+        plan (dict): Day-keyed plan as returned by generate_meal_plan
+            ({"1": {"breakfast": [...], "lunch": [...], "dinner": [...]}, ...})
+        start_date (date): Date of plan day "1"
+        days (int): Number of plan days to store
+        replace_from (date): If given, the user's meals from this date onward
+            (rows and cycles) are deleted inside the same transaction before
+            the new plan is saved
+
+    Returns:
+        tuple: (meals, items) lists of the saved MealPlan and MealItem rows
+    """
+    meals = []
+    foods_per_meal = []
+
+    for d in range(days):
+        day_date = start_date + timedelta(days=d)
+        for meal_type, items in plan[str(d + 1)].items():
+            meals.append(MealPlan(user=user, date=day_date, meal_type=meal_type))
+            foods_per_meal.append(items)
+
+    with transaction.atomic():
+        if replace_from is not None:
+            delete_meals_from(user, replace_from)
+
+        meals = MealPlan.objects.bulk_create(meals, batch_size=BULK_BATCH_SIZE)
+
+        catalog = get_or_create_foods(food for foods in foods_per_meal for food in foods)
+
+        items = []
+        for meal, foods in zip(meals, foods_per_meal):
+            for food in foods:
+                entry = catalog[food_hash(food)]
+                items.append(MealItem(meal=meal, food=entry, portion=portion_for(entry, food)))
+        MealItem.objects.bulk_create(items, batch_size=BULK_BATCH_SIZE)
+
+    return meals, items
+
+
+def update_meal_plan_days(user, existing, changes, portion_updates=()):
+    """
+    Rewrite some of a user's meals in place with as few changed rows as possible
+
+    For every changed meal the new foods are matched against its current
+    items: an item already holding the same dish is kept (or only gets its
+    portion updated), the remaining items are repointed at the remaining new
+    dishes with one bulk UPDATE, and only a difference in item count costs
+    INSERTs or DELETEs. Meal rows stay in place, so tracking history of items
+    outside `changes` is untouched. The DailyNutritionLog rollups follow the
+    eaten share of deleted and rewritten items.
+
+    Args:
+        user: Owner of the plan
+        existing (dict): (date, meal_type) -> list of the meal's current MealItem rows
+            (select_related('meal', 'food')); meals missing here are created
+        changes (dict): (date, meal_type) -> list of new food dicts; an empty
+            list removes the meal
+        portion_updates (iterable): MealItem rows whose portion was changed by the caller
+
+    Returns:
+        dict: Item counts - kept, updated, inserted, deleted
+    """
+    catalog = get_or_create_foods(food for foods in changes.values() for food in foods)
+    counts = {"kept": 0, "updated": 0, "inserted": 0, "deleted": 0}
+    updates = list(portion_updates)
+    deletes = []
+    new_meals = []
+    pending_inserts = []  # (meal or index into new_meals, catalog entry, portion)
+
+    for (day_date, meal_type), foods in changes.items():
+        items = list(existing.get((day_date, meal_type), []))
+        unmatched = []
+        for food in foods:
+            entry = catalog[food_hash(food)]
+            portion = portion_for(entry, food)
+            match = next((item for item in items if item.food_id == entry.id), None)
+            if match is None:
+                unmatched.append((entry, portion))
+                continue
+            items.remove(match)
+            if abs(match.portion - portion) > PORTION_EPSILON:
+                match.portion = portion
+                updates.append(match)
+            else:
+                counts["kept"] += 1
+
+        for (entry, portion), item in zip(unmatched, items):
+            item.food = entry
+            item.portion = portion
+            updates.append(item)
+        deletes.extend(item.id for item in items[len(unmatched):])
+
+        extra = unmatched[len(items):]
+        if extra:
+            if existing.get((day_date, meal_type)):
+                meal = existing[(day_date, meal_type)][0].meal
+            else:
+                new_meals.append(MealPlan(user=user, date=day_date, meal_type=meal_type))
+                meal = len(new_meals) - 1
+            pending_inserts.extend((meal, entry, portion) for entry, portion in extra)
+
+    changed_ids = [item.id for item in updates] + deletes
+    with transaction.atomic():
+        if changed_ids:
+            apply_item_rollups(user.id, MealItem.objects.filter(id__in=changed_ids), -1)
+        created = MealPlan.objects.bulk_create(new_meals, batch_size=BULK_BATCH_SIZE)
+        inserts = [
+            MealItem(meal=created[meal] if isinstance(meal, int) else meal, food=entry, portion=portion)
+            for meal, entry, portion in pending_inserts
+        ]
+        MealItem.objects.bulk_create(inserts, batch_size=BULK_BATCH_SIZE)
+        if updates:
+            MealItem.objects.bulk_update(updates, ["food", "portion"], batch_size=BULK_BATCH_SIZE)
+            apply_item_rollups(user.id, MealItem.objects.filter(id__in=[item.id for item in updates]), 1)
+        if deletes:
+            MealItem.objects.filter(id__in=deletes).delete()
+        # Meals whose items were all removed
+        removed = [day_date for (day_date, meal_type), foods in changes.items() if not foods]
+        if removed:
+            MealPlan.objects.filter(
+                user=user, date__in=removed, items__isnull=True,
+                meal_type__in={meal_type for (_, meal_type), foods in changes.items() if not foods}
+            ).delete()
+
+    counts["updated"] = len(updates)
+    counts["inserted"] = len(inserts)
+    counts["deleted"] = len(deletes)
+    return counts
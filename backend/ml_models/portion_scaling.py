@@ -0,0 +1,119 @@
+import logging
+
+import numpy as np
+
+from .meal_optimizer import MEAL_SHARES, CALORIE_TOLERANCE
+
+
+logger = logging.getLogger(__name__)
+
+
+MIN_PORTION = 0.5   # Smallest multiplier applied to one food
+MAX_PORTION = 2.0   # Largest multiplier applied to one food
+OTHER_MEAL_SHARE = 0.10  # Share given to meals outside MEAL_SHARES (e.g. snacks) before normalizing
+SOLVER_ROUNDS = 10  # Clip-and-resolve passes for foods that hit a bound
+
+MACROS = ("calories", "protein", "carbs", "fat")
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _solve_multipliers(calories, meal_index, targets):
+    """
+    Smallest bounded per-food changes that make every meal hit its target
+
+    Minimizes sum((m - 1)^2) subject to sum(calories * m) == target per meal
+    and MIN_PORTION <= m <= MAX_PORTION. Without bounds the solution is
+    m = 1 + lambda * calories (bigger foods absorb more of the correction);
+    foods that cross a bound are clipped and the rest of their meal is solved
+    again, which converges in a few passes.
+    """
+    meals = len(targets)
+    multipliers = np.ones_like(calories)
+    free = calories > 0
+
+    for _ in range(SOLVER_ROUNDS):
+        fixed_total = np.bincount(meal_index, weights=np.where(free, 0.0, calories * multipliers), minlength=meals)
+        free_total = np.bincount(meal_index, weights=np.where(free, calories, 0.0), minlength=meals)
+        free_squares = np.bincount(meal_index, weights=np.where(free, calories * calories, 0.0), minlength=meals)
+
+        remaining = targets - fixed_total - free_total
+        lam = np.divide(remaining, free_squares, out=np.zeros(meals), where=free_squares > 0)
+        solved = 1 + lam[meal_index] * calories
+        multipliers = np.where(free, solved, multipliers)
+
+        clipped = free & ((multipliers < MIN_PORTION) | (multipliers > MAX_PORTION))
+        if not clipped.any():
+            break
+        multipliers = np.clip(multipliers, MIN_PORTION, MAX_PORTION)
+        free &= ~clipped
+
+    return np.clip(multipliers, MIN_PORTION, MAX_PORTION)
+
+
+def scale_plan_portions(plan, daily_calories, label="meal plan"):
+    """
+    Scale food portions so every meal hits its share of the daily calories
+
+    All foods of the plan are loaded into NumPy arrays, per-meal totals are
+    compared with the 30/35/35 split and each food gets a bounded portion
+    multiplier (see _solve_multipliers); protein, carbs and fat are scaled
+    with the calories. Meals that would need more than MAX_PORTION or less
+    than MIN_PORTION keep the closest reachable total. The correction that
+    was needed is printed.
+
+    Args:
+        plan (dict): Day-keyed plan as returned by generate_meal_plan
+        daily_calories (int): Daily calorie target
+        label (str): Name of the plan in the log line
+
+    Returns:
+        dict: New plan with scaled foods (the input plan is not modified)
+    """
+    foods = []
+    meal_index = []
+    meal_shares = []
+    for day_key, day in plan.items():
+        shares = {meal: MEAL_SHARES.get(meal, OTHER_MEAL_SHARE) for meal in day}
+        share_total = sum(shares.values()) or 1.0
+        for meal, items in day.items():
+            meal_shares.append(shares[meal] / share_total)
+            for food in items:
+                foods.append(food)
+                meal_index.append(len(meal_shares) - 1)
+
+    if not foods:
+        return plan
+
+    values = np.array([[_number(food.get(key)) for key in MACROS] for food in foods])
+    meal_index = np.array(meal_index)
+    targets = daily_calories * np.array(meal_shares)
+
+    before = np.bincount(meal_index, weights=values[:, 0], minlength=len(targets))
+    multipliers = _solve_multipliers(values[:, 0], meal_index, targets)
+    scaled = np.round(values * multipliers[:, None], 1)
+    after = np.bincount(meal_index, weights=scaled[:, 0], minlength=len(targets))
+
+    error_before = np.abs(before - targets)
+    error_after = np.abs(after - targets)
+    logger.info(
+        "Portion scaling for %s: %s days, %s meals, %s off by more than %s kcal "
+        "(mean %.0f, max %.0f kcal); mean portion change %.1f%%; %s meals still off after scaling",
+        label, len(plan), len(targets), int((error_before > CALORIE_TOLERANCE).sum()), CALORIE_TOLERANCE,
+        error_before.mean(), error_before.max(), np.abs(multipliers - 1).mean() * 100,
+        int((error_after > CALORIE_TOLERANCE).sum())
+    )
+
+    scaled_foods = iter(
+        {**food, **{key: float(value) for key, value in zip(MACROS, row)}}
+        for food, row in zip(foods, scaled)
+    )
+    return {
+        day_key: {meal: [next(scaled_foods) for _ in items] for meal, items in day.items()}
+        for day_key, day in plan.items()
+    }
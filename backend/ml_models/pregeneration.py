@@ -0,0 +1,124 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from health_data.models import Workout
+from . import generation, llm_metrics
+from .jobs import enqueue_job
+from .models import GenerationJob
+
+
+# Tomorrow's daily progressive workout only depends on today's workout and
+# its feedback, the user's profile and the inputs of their last daily
+# workout request, so the pregenerate_daily_workouts command generates it
+# overnight and get_todays_workout finds it stored in the morning. Feedback
+# given after the nightly run invalidates the pregenerated workout
+# (see refresh_after_feedback).
+
+ACTIVE_DAYS = 3  # Users with a daily workout this recently are still following the progression
+
+# Inputs used when the user's last request can't be found (the generate_daily_workout defaults)
+DEFAULT_PARAMS = {
+    "fitness_level": "intermediate",
+    "avg_steps": 5000,
+    "sleep_hours": 7,
+    "spo2": 98,
+}
+
+
+def _age(date_of_birth, day):
+    return day.year - date_of_birth.year - ((day.month, day.day) < (date_of_birth.month, date_of_birth.day))
+
+
+def active_daily_users(day):
+    """
+    Users to pregenerate a daily workout for on `day`
+
+    Users with a complete profile and a daily workout in the ACTIVE_DAYS
+    before `day`, who don't have one for `day` yet.
+    """
+    recent = Workout.objects.filter(
+        is_daily_plan=True,
+        date__gte=day - timedelta(days=ACTIVE_DAYS),
+        date__lt=day
+    ).values('user_id')
+    planned = Workout.objects.filter(is_daily_plan=True, date=day).values('user_id')
+    return (
+        get_user_model().objects.filter(id__in=recent, is_active=True)
+        .exclude(id__in=planned)
+        .exclude(height__isnull=True).exclude(weight__isnull=True)
+        .exclude(date_of_birth__isnull=True).exclude(gender__isnull=True).exclude(gender='')
+        .order_by('id')
+    )
+
+
+def daily_workout_params(user, day):
+    """
+    daily_workout job params for `day`: the user's last request with the profile refreshed
+
+    Fitness level, goal and health inputs are only entered in the app's
+    request form, so they are carried over from the last daily_workout job.
+    """
+    last = (
+        GenerationJob.objects.filter(user=user, kind='daily_workout', status=GenerationJob.STATUS_SUCCEEDED)
+        .order_by('-created_at')
+        .values_list('params', flat=True)
+        .first()
+    ) or {}
+    params = {**DEFAULT_PARAMS, **last}
+    params.update({
+        "age": _age(user.date_of_birth, day),
+        "weight": user.weight,
+        "height": user.height,
+        "goal": last.get("goal") or user.fitness_goal or "general_fitness",
+        "start_date": str(day),
+        "fresh": False
+    })
+    return params
+
+
+def pregenerate_daily_workout(user, day):
+    """
+    Generate and store the user's daily workout for `day`
+
+    Returns:
+        bool: False if a workout for `day` was stored meanwhile (nothing saved)
+    """
+    params = daily_workout_params(user, day)
+    with llm_metrics.attribute('daily_workout_pregeneration', user.id):
+        payload = generation.generate_daily_workout_payload(user, params)
+
+    with transaction.atomic():
+        # Serialize with the user's own requests, as enqueue_job does
+        get_user_model().objects.select_for_update().filter(pk=user.pk).first()
+        if Workout.objects.filter(user=user, is_daily_plan=True, date=day).exists():
+            return False
+        generation.save_daily_workout_payload(user, params, payload)
+    return True
+
+
+def refresh_after_feedback(workout):
+    """
+    Replace the next day's pregenerated workout after feedback on `workout`
+
+    The pregenerated workout was built from the feedback known at the time;
+    if it hasn't been started, it is deleted and a daily_workout job queued
+    so the next day uses the new feedback. Workouts of past days are left alone.
+
+    Returns:
+        GenerationJob or None
+    """
+    next_day = workout.date + timedelta(days=1)
+    if next_day <= date.today():
+        return None
+    stale = Workout.objects.filter(
+        user=workout.user,
+        is_daily_plan=True,
+        date=next_day,
+        completed_count=0
+    )
+    if not stale.exists():
+        return None
+    stale.delete()
+    return enqueue_job(workout.user, 'daily_workout', daily_workout_params(workout.user, next_day))
@@ -0,0 +1,151 @@
+from collections import defaultdict
+
+from .ai_meal_planner import generate_meal_plan
+from .models import MealItem
+from .plan_storage import PORTION_EPSILON, update_meal_plan_days
+from .portion_scaling import scale_plan_portions
+
+
+# Recalculation keeps the stored plan wherever it can: a day within
+# DAY_TOLERANCE of the adjusted target is left alone, a day that portion
+# scaling can bring back within tolerance only gets portion UPDATEs, and
+# only the days left over are regenerated and diffed onto their rows.
+# Meals with a tracked item are never touched.
+
+# Allowed kcal difference between a stored day and the adjusted target. Below
+# the +/-100 kcal recalculation step, so an adjustment always reaches the
+# plan, and above the 3 x CALORIE_TOLERANCE a scaled day can still be off by.
+DAY_TOLERANCE = 75
+
+
+def _food_dict(item):
+    return {
+        "id": item.id,
+        "name": item.food_name,
+        "calories": item.calories,
+        "protein": item.protein,
+        "carbs": item.carbs,
+        "fat": item.fat
+    }
+
+
+def recalculate_plan_in_place(user, start_date, adjusted_calories, diet_type, allergies, goal, feedback):
+    """
+    Bring the user's meals from start_date onward to adjusted_calories with minimal row churn
+
+    Args:
+        user: Owner of the plan
+        start_date (date): First day to recalculate (today)
+        adjusted_calories (int): Daily calorie target after the adjustment
+        diet_type (str), allergies (str), goal (str): Passed to generate_meal_plan
+        feedback (dict): Feedback from recalculation_adjustment, used for regenerated days
+
+    Returns:
+        dict: days (kept / rescaled / regenerated counts) and rows (item counts:
+        kept, updated, replaced - replaced being items inserted or deleted)
+    """
+    items = (
+        MealItem.objects.for_user_dates(user, start_date)
+        .with_latest_tracking()
+        .select_related('meal')
+        .order_by('meal__date', 'meal__id', 'id')
+    )
+    plan = defaultdict(lambda: defaultdict(list))  # date -> meal_type -> items
+    for item in items:
+        plan[item.meal.date][item.meal.meal_type].append(item)
+
+    days = {"kept": 0, "rescaled": 0, "regenerated": 0}
+    kept_items = 0
+    to_scale = {}  # date -> (budget for the adjustable meals, {meal_type: items})
+
+    for day_date, meals in plan.items():
+        total = sum(item.calories for meal_items in meals.values() for item in meal_items)
+        adjustable = {
+            meal_type: meal_items for meal_type, meal_items in meals.items()
+            if not any(item.tracking_status for item in meal_items)
+        }
+        if abs(total - adjusted_calories) <= DAY_TOLERANCE or not adjustable:
+            days["kept"] += 1
+            kept_items += sum(len(meal_items) for meal_items in meals.values())
+            continue
+
+        frozen_calories = sum(
+            item.calories for meal_type, meal_items in meals.items()
+            if meal_type not in adjustable for item in meal_items
+        )
+        kept_items += sum(len(meal_items) for meal_type, meal_items in meals.items() if meal_type not in adjustable)
+        to_scale[day_date] = (max(adjusted_calories - frozen_calories, 0), adjustable)
+
+    # Portion scaling first: the same dishes, only portions change. Days with
+    # a tracked meal have their own budget; the rest share one scaling pass.
+    portion_updates = []
+    regenerate = []
+    batches = defaultdict(list)
+    for day_date, (budget, _) in to_scale.items():
+        batches[budget].append(day_date)
+
+    for budget, dates in batches.items():
+        scaled = scale_plan_portions(
+            {
+                day_date.isoformat(): {
+                    meal_type: [_food_dict(item) for item in meal_items]
+                    for meal_type, meal_items in to_scale[day_date][1].items()
+                }
+                for day_date in dates
+            },
+            budget,
+            label="recalculation"
+        )
+        for day_date in dates:
+            adjustable = to_scale[day_date][1]
+            scaled_day = scaled[day_date.isoformat()]
+            scaled_total = sum(food["calories"] for foods in scaled_day.values() for food in foods)
+            if abs(scaled_total - budget) > DAY_TOLERANCE:
+                regenerate.append(day_date)
+                continue
+            days["rescaled"] += 1
+            for meal_type, meal_items in adjustable.items():
+                for item, food in zip(meal_items, scaled_day[meal_type]):
+                    portion = round(item.portion * food["calories"] / item.calories, 4) if item.calories else item.portion
+                    if abs(portion - item.portion) > PORTION_EPSILON:
+                        item.portion = portion
+                        portion_updates.append(item)
+                    else:
+                        kept_items += 1
+
+    # Only the days scaling could not fix are sent to the model
+    changes = {}
+    if regenerate:
+        regenerate.sort()
+        new_plan = generate_meal_plan(
+            calories=adjusted_calories,
+            diet_type=diet_type,
+            allergies=allergies,
+            goal=goal,
+            days=len(regenerate),
+            feedback=feedback
+        )
+        for index, day_date in enumerate(regenerate, start=1):
+            adjustable = to_scale[day_date][1]
+            new_day = new_plan[str(index)]
+            for meal_type in adjustable.keys() | new_day.keys():
+                if meal_type in plan[day_date] and meal_type not in adjustable:
+                    continue
+                changes[(day_date, meal_type)] = new_day.get(meal_type, [])
+        days["regenerated"] = len(regenerate)
+
+    existing = {
+        (day_date, meal_type): meal_items
+        for day_date, meals in plan.items()
+        for meal_type, meal_items in meals.items()
+    }
+    counts = update_meal_plan_days(user, existing, changes, portion_updates)
+
+    return {
+        "days": days,
+        "rows": {
+            "kept": kept_items + counts["kept"],
+            "updated": counts["updated"],
+            "replaced": counts["inserted"] + counts["deleted"]
+        }
+    }
@@ -0,0 +1,259 @@
+import json
+import re
+from collections import namedtuple
+
+
+# Model responses are parsed here instead of with a bare json.loads: the
+# JSON object is found inside markdown fences or prose, trailing junk is
+# ignored, and a truncated response is cut back to its last complete value.
+# Plan responses are then validated day by day against a schema, so a broken
+# day costs one re-request of that day instead of the whole plan.
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Strings (including one left open by truncation) and the characters that
+# open, close or separate JSON containers
+TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|"(?:[^"\\]|\\.)*\Z|[{}\[\],]', re.DOTALL)
+TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+
+_decoder = json.JSONDecoder()
+
+ParsedResponse = namedtuple('ParsedResponse', ['value', 'missing', 'dropped', 'repaired'])
+ParsedResponse.__doc__ = """
+value: the parsed response with only the valid days
+missing: sorted keys of expected days that were absent, invalid or cut off
+dropped: number of days present in the response that failed validation
+repaired: True if the JSON had to be salvaged (truncation or trailing commas)
+"""
+
+
+def _is_number(value):
+    """Numbers, and numeric strings the model sometimes returns instead"""
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _salvage(text):
+    """
+    Close a truncated JSON document after its last complete value
+
+    Returns:
+        tuple: (value, number of containers that were closed here), or None
+    """
+    stack = []
+    cut = None
+    for match in TOKEN_RE.finditer(text):
+        token = match.group()
+        if token in '{[':
+            stack.append(token)
+        elif token in '}]':
+            if not stack:
+                break
+            stack.pop()
+            cut = (match.end(), tuple(stack))
+            if not stack:
+                break
+        elif token == ',':
+            # Everything before a separator is complete
+            cut = (match.start(), tuple(stack))
+
+    if cut is None:
+        return None
+    end, open_containers = cut
+    closing = ''.join('}' if container == '{' else ']' for container in reversed(open_containers))
+    try:
+        return json.loads(TRAILING_COMMA_RE.sub(r'\1', text[:end]) + closing), len(open_containers)
+    except ValueError:
+        return None
+
+
+def load_json(text):
+    """
+    Parse the JSON object in a model response
+
+    Tolerates markdown fences, prose around the object, trailing junk,
+    trailing commas and truncation (the object is closed after its last
+    complete value).
+
+    Returns:
+        tuple: (value, depth) - depth is None if the object parsed as is,
+        otherwise the number of containers that were left open by truncation
+        and closed here (0 when only trailing commas were fixed)
+
+    Raises:
+        ValueError: The response contains no usable JSON object
+    """
+    start = text.find('{')
+    if start < 0:
+        raise ValueError("No JSON object in model response")
+    text = text[start:]
+
+    try:
+        value, _ = _decoder.raw_decode(text)
+        return value, None
+    except ValueError:
+        pass
+
+    salvaged = _salvage(text)
+    if salvaged is None:
+        raise ValueError("Model response is not valid JSON and could not be salvaged")
+    return salvaged
+
+
+def parse_json(text):
+    """
+    Tolerant replacement for json.loads on a model response (see load_json)
+
+    Truncated responses are rejected: without a plan schema there is no way
+    to tell which part of a salvaged object is complete.
+    """
+    value, depth = load_json(text)
+    if depth:
+        raise ValueError("Model response is truncated")
+    return value
+
+
+class MealPlanSchema:
+    """Day-keyed meal plan: {"1": {"breakfast": [food, ...], ...}, ...}"""
+
+    # Containers above a day: the root object
+    depth = 1
+
+    def items(self, value):
+        if not isinstance(value, dict):
+            raise ValueError("Meal plan response is not an object")
+        return [(int(key), day) for key, day in value.items() if str(key).isdigit()]
+
+    def rebuild(self, value, items):
+        return {str(key): day for key, day in sorted(items, key=lambda item: item[0])}
+
+    def valid_item(self, day):
+        if not isinstance(day, dict) or not day:
+            return False
+        for foods in day.values():
+            if not isinstance(foods, list) or not foods:
+                return False
+            for food in foods:
+                if not isinstance(food, dict) or not isinstance(food.get('name'), str) or not _is_number(food.get('calories')):
+                    return False
+        return True
+
+
+class WorkoutPlanSchema:
+    """Multi-day workout plan: {"plan_title": ..., "days": [{"day_number": 1, "exercises": [...]}, ...]}"""
+
+    # Containers above a day: the root object and the days list
+    depth = 2
+
+    def items(self, value):
+        if not isinstance(value, dict) or not isinstance(value.get('days'), list):
+            raise ValueError("Workout plan response has no days list")
+        return [
+            (day.get('day_number') if isinstance(day, dict) and isinstance(day.get('day_number'), int) else index, day)
+            for index, day in enumerate(value['days'], start=1)
+        ]
+
+    def rebuild(self, value, items):
+        return {**value, "days": [day for _, day in sorted(items, key=lambda item: item[0])]}
+
+    def valid_item(self, day):
+        if not isinstance(day, dict) or not isinstance(day.get('exercises'), list):
+            return False
+        if not day['exercises'] and not day.get('is_rest_day'):
+            return False
+        return all(isinstance(exercise, dict) and isinstance(exercise.get('name'), str) for exercise in day['exercises'])
+
+
+class MarathonWeekSchema:
+    """Marathon training week: {"weekly_schedule": [{"day": "Monday", "run_type": ..., "distance_km": ...}, ...]}"""
+
+    # Containers above a day: the root object and the weekly_schedule list
+    depth = 2
+
+    def items(self, value):
+        if not isinstance(value, dict) or not isinstance(value.get('weekly_schedule'), list):
+            raise ValueError("Marathon plan response has no weekly_schedule list")
+        return [
+            (str(day.get('day', '')).strip().capitalize() if isinstance(day, dict) else None, day)
+            for day in value['weekly_schedule']
+        ]
+
+    def rebuild(self, value, items):
+        order = {day: index for index, day in enumerate(WEEKDAYS)}
+        return {**value, "weekly_schedule": [day for _, day in sorted(items, key=lambda item: order[item[0]])]}
+
+    def valid_item(self, day):
+        return (
+            isinstance(day, dict)
+            and str(day.get('day', '')).strip().capitalize() in WEEKDAYS
+            and isinstance(day.get('run_type'), str)
+            and _is_number(day.get('distance_km'))
+        )
+
+
+MEAL_PLAN = MealPlanSchema()
+WORKOUT_PLAN = WorkoutPlanSchema()
+MARATHON_WEEK = MarathonWeekSchema()
+
+
+def parse_plan(text, schema, expected):
+    """
+    Parse a plan response and keep every complete, valid day
+
+    Args:
+        text (str): Raw model response
+        schema: MEAL_PLAN, WORKOUT_PLAN or MARATHON_WEEK
+        expected (iterable): Day keys the response should contain (day numbers, or weekday names)
+
+    Returns:
+        ParsedResponse: The plan rebuilt from the valid expected days and the keys still missing
+
+    Raises:
+        ValueError: No JSON object, or not the shape of this plan
+    """
+    value, depth = load_json(text)
+    items = schema.items(value)
+
+    # Truncation inside the last day closed it early; whatever it holds is partial
+    if depth is not None and depth > schema.depth and items:
+        items = items[:-1]
+
+    expected = list(expected)
+    wanted = set(expected)
+    kept = {}
+    dropped = 0
+    for key, item in items:
+        if key not in wanted or key in kept:
+            continue
+        if schema.valid_item(item):
+            kept[key] = item
+        else:
+            dropped += 1
+
+    return ParsedResponse(
+        value=schema.rebuild(value, list(kept.items())),
+        missing=[key for key in expected if key not in kept],
+        dropped=dropped,
+        repaired=depth is not None
+    )
+
+
+def merge_plan(schema, parsed, extra):
+    """Combine a partial plan with a response that was asked for its missing days only"""
+    items = dict(schema.items(parsed.value))
+    for key, item in schema.items(extra.value):
+        if key in parsed.missing:
+            items[key] = item
+    return ParsedResponse(
+        value=schema.rebuild(parsed.value, list(items.items())),
+        missing=[key for key in parsed.missing if key in extra.missing],
+        dropped=parsed.dropped + extra.dropped,
+        repaired=parsed.repaired or extra.repaired
+    )
@@ -0,0 +1,84 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Test support: stand-ins for external services, used by tests.py and the
+# llm_gateway_drill command. Nothing in the app imports this module.
+
+
+class FakeModelServer:
+    """
+    Local stand-in for the Gemini REST API with injectable latency and failures
+
+    Every generateContent request sleeps `latency` seconds (`slow_latency`
+    for a `slow_rate` share of requests) and then fails with a 503 for a
+    `failure_rate` share, otherwise it answers with a small JSON object.
+    `latency_sequence` gives the first requests fixed latencies in order,
+    for deterministic tests.
+    """
+
+    def __init__(self):
+        self.latency = 0.0
+        self.slow_rate = 0.0
+        self.slow_latency = 0.0
+        self.failure_rate = 0.0
+        self.latency_sequence = []
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def configure(self, latency=0.0, slow_rate=0.0, slow_latency=0.0, failure_rate=0.0, latency_sequence=()):
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.failure_rate = failure_rate
+        self.latency_sequence = list(latency_sequence)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request_body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with fake.lock:
+                    fake.requests += 1
+                    latency = fake.latency_sequence.pop(0) if fake.latency_sequence else None
+                if latency is None:
+                    latency = fake.slow_latency if random.random() < fake.slow_rate else fake.latency
+                time.sleep(latency)
+
+                if random.random() < fake.failure_rate:
+                    status, body = 503, {"error": {"code": 503, "message": "injected failure", "status": "UNAVAILABLE"}}
+                else:
+                    text = json.dumps({"ok": True})
+                    status, body = 200, {
+                        "candidates": [{"content": {"role": "model", "parts": [{"text": f"```json\n{text}\n```"}]}, "finishReason": "STOP"}],
+                        # Roughly four characters per token, like the real API
+                        "usageMetadata": {"promptTokenCount": len(request_body) // 4, "candidatesTokenCount": len(text) // 4}
+                    }
+
+                data = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The gateway gave up on this request
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
@@ -0,0 +1,791 @@
+import json
+import os
+import time
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from health_data.models import HealthData, Marathon, Workout
+from . import (
+    ai_meal_planner, completion, generation, llm_gateway, llm_metrics, plan_cycles, pregeneration, recalculation,
+    views, workout_storage
+)
+from .meal_optimizer import optimize_meal_plan
+from .models import (
+    MarathonDayTracking, MealItem, MealItemTracking, MealPlan, MealPlanCycle, WorkoutExerciseTracking
+)
+from .nutrition import get_feedback, rebuild_rollups
+from .plan_storage import save_meal_plan, update_meal_plan_days
+from .response_parser import ParsedResponse
+from .testing import FakeModelServer
+
+
+def create_user(username, **fields):
+    """A user with a complete profile, as the generation endpoints require"""
+    profile = {"height": 175, "weight": 70, "date_of_birth": date(1990, 1, 1), "gender": "male"}
+    profile.update(fields)
+    return get_user_model().objects.create_user(
+        username=username, email=f"{username}@fitwell.local", password=None, **profile
+    )
+
+
+def api_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+# ---------------- MEAL PLAN QUERY COUNTS ---------------- #
+class MealPlanQueryCountTests(TestCase):
+    """Meal plan endpoints attach every item's latest tracking in the same query, whatever the plan size"""
+
+    PLAN_SIZES = (3, 7)  # Future days; the counts must not change with the size
+
+    def tracked_plan_user(self, days):
+        """A user with a plan from 3 days ago to `days` days ahead, every item up to today tracked twice"""
+        user = create_user(f"meal_queries_{days}")
+        today = date.today()
+        start = today - timedelta(days=3)
+        save_meal_plan(user, optimize_meal_plan(2000, "none", "", days + 3), start, days + 3)
+        items = MealItem.objects.filter(meal__user=user, meal__date__lte=today)
+        MealItemTracking.objects.bulk_create(
+            [MealItemTracking(meal_item=item, status="skipped", quantity_ratio=1.0) for item in items] +
+            [MealItemTracking(meal_item=item, status="eaten", quantity_ratio=0.5) for item in items]
+        )
+        rebuild_rollups(start, today, user)
+        return user
+
+    def test_meal_plan(self):
+        for days in self.PLAN_SIZES:
+            with self.subTest(days=days):
+                client = api_client(self.tracked_plan_user(days))
+                with self.assertNumQueries(5):
+                    response = client.get(f"/api/ml/meal-plan/?date={date.today()}")
+                self.assertEqual(response.status_code, 200)
+                items = [item for meal in response.data["meals"].values() for item in meal["items"]]
+                self.assertTrue(items)
+                # The latest of the two tracking rows is the one attached
+                self.assertTrue(all(item["status"] == "eaten" and item["quantity_ratio"] == 0.5 for item in items))
+
+    def test_daily_nutrition(self):
+        for days in self.PLAN_SIZES:
+            with self.subTest(days=days):
+                client = api_client(self.tracked_plan_user(days))
+                with self.assertNumQueries(1):
+                    self.assertEqual(client.get("/api/ml/daily_nutrition/").status_code, 200)
+
+    def test_get_feedback(self):
+        for days in self.PLAN_SIZES:
+            with self.subTest(days=days):
+                user = self.tracked_plan_user(days)
+                with self.assertNumQueries(1):
+                    feedback = get_feedback(user)
+                self.assertGreater(feedback["calories"], 0)
+
+    def test_recalculate_meal_plan(self):
+        def local_plan(*args, days, **kwargs):
+            return optimize_meal_plan(2200, "none", "", days)
+
+        for days in self.PLAN_SIZES:
+            with self.subTest(days=days):
+                client = api_client(self.tracked_plan_user(days))
+                with mock.patch.object(recalculation, "generate_meal_plan", side_effect=local_plan):
+                    with self.assertNumQueries(17):
+                        response = client.post("/api/ml/recalculate-meal-plan/", {}, format="json")
+                self.assertEqual(response.status_code, 200)
+
+
+# ---------------- MEAL PLAN REQUESTS ---------------- #
+class MealPlanRequestTests(TestCase):
+    """generate-ai-meal-plan/ rejects bad days and flag values before generating anything"""
+
+    def setUp(self):
+        self.user = create_user("requests")
+        self.client = api_client(self.user)
+
+    def generate(self, format="json", **data):
+        return self.client.post("/api/ml/generate-ai-meal-plan/", {"engine": "local", **data}, format=format)
+
+    def test_days_validated(self):
+        for days in ("week", None, 0, -3, 366):
+            response = self.generate(days=days)
+            self.assertEqual(response.status_code, 400, days)
+        self.assertFalse(MealPlan.objects.filter(user=self.user).exists())
+        self.assertEqual(self.generate(days="3").status_code, 200)
+
+    def test_form_false_flags(self):
+        self.assertEqual(self.generate(days=3).status_code, 200)
+        # A form value of "false" doesn't replace the active plan
+        response = self.generate(format="multipart", days=3, force_new="false", fresh="false")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "active_plan_exists")
+        self.assertEqual(self.generate(days=3, force_new=True, fresh="maybe").status_code, 400)
+
+
+# ---------------- NUTRITION ROLLUPS ---------------- #
+class NutritionRollupTests(TestCase):
+    """DailyNutritionLog keeps matching the raw tracking when tracked meals are replaced or deleted"""
+
+    def setUp(self):
+        self.user = create_user("rollups")
+        self.client = api_client(self.user)
+        self.today = date.today()
+
+    def generate_plan(self, force_new=False):
+        response = self.client.post(
+            "/api/ml/generate-ai-meal-plan/",
+            {"engine": "local", "days": 3, "force_new": force_new},
+            format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def track_first_item(self):
+        item = MealItem.objects.filter(meal__user=self.user, meal__date=self.today).order_by("id").first()
+        response = self.client.post(
+            "/api/ml/track-meal-item/",
+            {"meal_item_id": item.id, "status": "eaten", "quantity_ratio": 1.0},
+            format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return item
+
+    def assertRollupMatchesSummary(self, calories):
+        rollup = self.client.get("/api/ml/daily_nutrition/").data
+        summary = self.client.get(f"/api/ml/nutrition-summary/?start={self.today}&end={self.today}").data
+        self.assertAlmostEqual(rollup["calories"], calories, places=1)
+        self.assertAlmostEqual(summary["overall"]["calories"], calories, places=1)
+
+    def test_replaced_plan(self):
+        self.generate_plan()
+        item = self.track_first_item()
+        self.assertRollupMatchesSummary(item.calories)
+
+        self.generate_plan(force_new=True)
+        self.assertRollupMatchesSummary(0)
+
+    def test_deleted_plan(self):
+        self.generate_plan()
+        self.track_first_item()
+
+        self.assertEqual(self.client.delete("/api/ml/delete-meal-plan/").status_code, 200)
+        self.assertRollupMatchesSummary(0)
+
+    def test_rewritten_meal(self):
+        self.generate_plan()
+        item = self.track_first_item()
+        meal = item.meal
+        existing = {(meal.date, meal.meal_type): list(meal.items.select_related("meal", "food").order_by("id"))}
+
+        # The tracked item is repointed at another dish with twice its calories
+        new_food = {"name": "Rollup Test Dish", "calories": item.calories * 2, "protein": 10, "carbs": 10, "fat": 10}
+        update_meal_plan_days(self.user, existing, {(meal.date, meal.meal_type): [new_food]})
+        self.assertRollupMatchesSummary(item.calories * 2)
+
+        # Removing the meal takes the eaten item off the day
+        existing = {(meal.date, meal.meal_type): list(meal.items.select_related("meal", "food"))}
+        update_meal_plan_days(self.user, existing, {(meal.date, meal.meal_type): []})
+        self.assertRollupMatchesSummary(0)
+
+    def test_tracking_is_validated_and_owner_scoped(self):
+        self.generate_plan()
+        item = MealItem.objects.filter(meal__user=self.user, meal__date=self.today).order_by("id").first()
+
+        for payload in (
+            {"meal_item_id": item.id, "status": "devoured", "quantity_ratio": 1.0},
+            {"meal_item_id": item.id, "status": "eaten", "quantity_ratio": "most"},
+            {"meal_item_id": item.id, "status": "eaten", "quantity_ratio": None},
+        ):
+            response = self.client.post("/api/ml/track-meal-item/", payload, format="json")
+            self.assertEqual(response.status_code, 400, payload)
+
+        # Another user can't track (or see the calories of) this user's items
+        other = api_client(create_user("rollups-other"))
+        response = other.post(
+            "/api/ml/track-meal-item/",
+            {"meal_item_id": item.id, "status": "eaten", "quantity_ratio": 1.0},
+            format="json"
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(MealItemTracking.objects.filter(meal_item=item).exists())
+        self.assertRollupMatchesSummary(0)
+
+
+# ---------------- FOOD CATALOG ---------------- #
+class FoodCatalogTests(TestCase):
+    """Meal items keep their own macros when they share a dish name"""
+
+    def test_same_name_keeps_each_items_macros(self):
+        user = create_user("catalog")
+        today = date.today()
+        foods = [
+            {"name": "Chicken Salad", "calories": 400, "protein": 30, "carbs": 20, "fat": 10},
+            {"name": "chicken salad.", "calories": 200, "protein": 15, "carbs": 10, "fat": 5},  # Half portion
+            {"name": "Chicken Salad", "calories": 400, "protein": 10, "carbs": 60, "fat": 10},  # Other recipe
+        ]
+        save_meal_plan(user, {"1": {"lunch": foods}}, today, 1)
+
+        items = list(MealItem.objects.filter(meal__user=user).select_related("food").order_by("id"))
+        for item, food in zip(items, foods):
+            for nutrient in ("calories", "protein", "carbs", "fat"):
+                self.assertAlmostEqual(getattr(item, nutrient), food[nutrient], places=1)
+        # The half portion reuses the first row; the other recipe gets its own
+        self.assertEqual(items[0].food_id, items[1].food_id)
+        self.assertNotEqual(items[0].food_id, items[2].food_id)
+
+
+# ---------------- STREAMED MEAL PLANS ---------------- #
+def fake_meal_plan_response(prompt, days, hedge_after=None):
+    """request_meal_plan stand-in: a complete parsed response of `days` days, without a model call"""
+    return ParsedResponse(value=optimize_meal_plan(2100, "none", "", days), missing=[], dropped=0, repaired=False)
+
+
+class StreamMealPlanTests(TestCase):
+    """generate-ai-meal-plan/stream/ stores each day before sending it, in day order"""
+
+    DAYS = 10  # Two chunks: days 1-7 and 8-10
+
+    def setUp(self):
+        self.user = create_user("stream")
+        self.client = api_client(self.user)
+        self.today = date.today()
+        # Previous plan, longer than the new one
+        save_meal_plan(self.user, optimize_meal_plan(1800, "none", "", 14), self.today, 14)
+        self.previous = self.stored_item_ids()
+
+    def stored_item_ids(self):
+        items = {}
+        for day_date, item_id in MealItem.objects.filter(meal__user=self.user).order_by("id").values_list("meal__date", "id"):
+            items.setdefault(day_date, []).append(item_id)
+        return items
+
+    def stream(self):
+        with mock.patch.object(ai_meal_planner, "request_meal_plan", side_effect=fake_meal_plan_response) as request, \
+                mock.patch.object(llm_metrics, "record_fallback") as record_fallback:
+            response = self.client.post(
+                "/api/ml/generate-ai-meal-plan/stream/",
+                {"days": self.DAYS, "force_new": True, "fresh": True},
+                format="json"
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "application/x-ndjson")
+            content = b"".join(response.streaming_content).decode()
+        # The plan came from the stand-in, not from a fallback after it failed
+        self.assertTrue(request.called)
+        record_fallback.assert_not_called()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_days_are_stored_in_order(self):
+        lines = self.stream()
+
+        self.assertEqual(lines[0]["type"], "start")
+        self.assertEqual(lines[-1]["type"], "done")
+        day_lines = lines[1:-1]
+        self.assertEqual([line["day"] for line in day_lines], list(range(1, self.DAYS + 1)))
+
+        for line in day_lines:
+            day_date = self.today + timedelta(days=line["day"] - 1)
+            self.assertEqual(line["date"], str(day_date))
+            # Every item sent is the stored row of that date
+            sent = {item["id"] for meal in line["meals"].values() for item in meal["items"]}
+            stored = set(MealItem.objects.filter(meal__user=self.user, meal__date=day_date).values_list("id", flat=True))
+            self.assertEqual(sent, stored)
+
+        # The previous plan's days past the new end are gone
+        self.assertEqual(
+            MealPlan.objects.filter(user=self.user).values("date").distinct().count(), self.DAYS
+        )
+
+    def test_failure_keeps_previous_plan_for_later_days(self):
+        save = views.save_meal_plan
+        calls = []
+
+        def failing_save(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 4:
+                raise RuntimeError("database went away")
+            return save(*args, **kwargs)
+
+        with mock.patch.object(views, "save_meal_plan", side_effect=failing_save):
+            lines = self.stream()
+
+        self.assertEqual([line["type"] for line in lines], ["start"] + ["day"] * 3 + ["error"])
+        self.assertEqual(lines[-1]["stored_days"], 3)
+
+        items = self.stored_item_ids()
+        self.assertEqual(len(items), 14)  # No date was left without meals
+        for offset in range(14):
+            day_date = self.today + timedelta(days=offset)
+            if offset < 3:
+                self.assertNotEqual(items[day_date], self.previous[day_date])
+            else:
+                self.assertEqual(items[day_date], self.previous[day_date])
+
+
+# ---------------- GENERATION CACHE ---------------- #
+class MealPlanCacheTests(TestCase):
+    """Cached meal plans are only reused for the same (bucketed) intake feedback"""
+
+    FEEDBACK = {"calories": 14000, "protein": 700, "carbs": 1750, "fat": 450}
+
+    def generate(self, feedback):
+        with mock.patch.object(ai_meal_planner, "request_meal_plan", side_effect=fake_meal_plan_response) as request:
+            ai_meal_planner.generate_meal_plan(2100, "none", "", "maintain", 3, feedback=feedback)
+        return request.call_count
+
+    def test_feedback_is_part_of_the_key(self):
+        self.assertEqual(self.generate(None), 1)
+        self.assertEqual(self.generate(None), 0)
+        # Feedback changes the prompt, so a plan cached without it is not reused
+        self.assertEqual(self.generate(self.FEEDBACK), 1)
+        self.assertEqual(self.generate({**self.FEEDBACK, "protein": 702}), 0)
+        self.assertEqual(self.generate({**self.FEEDBACK, "protein": 900}), 1)
+
+
+# ---------------- PLAN CYCLES ---------------- #
+class PlanCycleTests(TestCase):
+    """Long plans stored as a cycle: materialized on read, rescaled only from the recalculation date"""
+
+    DAYS = 60
+
+    def setUp(self):
+        self.user = create_user("cycles")
+        self.start = date.today() - timedelta(days=10)
+        plan = optimize_meal_plan(2000, "none", "", plan_cycles.generated_days(self.DAYS))
+        plan_cycles.save_plan(self.user, plan, self.start, self.DAYS)
+
+    def cycle_day(self, day_date):
+        cycle = MealPlanCycle.objects.get(user=self.user, start_date__lte=day_date, end_date__gte=day_date)
+        return plan_cycles.base_day(cycle, day_date)
+
+    def test_concurrent_materialize(self):
+        day_date = date.today() + timedelta(days=5)
+        base_day = plan_cycles.base_day
+        calls = []
+
+        def racing_base_day(cycle, when):
+            # Another request stores the day while this one is building it
+            if not calls:
+                MealPlan.objects.create(user=self.user, date=when, meal_type="breakfast")
+            calls.append(when)
+            return base_day(cycle, when)
+
+        with mock.patch.object(plan_cycles, "base_day", side_effect=racing_base_day):
+            plan_cycles.materialize(self.user, day_date, day_date)
+
+        meal_types = list(MealPlan.objects.filter(user=self.user, date=day_date).values_list("meal_type", flat=True))
+        self.assertEqual(sorted(meal_types), sorted(set(meal_types)))
+        self.assertEqual(len(calls), 2)  # The retry built the day again
+
+    def test_rescale_keeps_earlier_days(self):
+        today = date.today()
+        dates = [self.start + timedelta(days=n) for n in range(self.DAYS)]
+        before = {day_date: self.cycle_day(day_date) for day_date in dates}
+
+        self.assertTrue(plan_cycles.rescale_cycles(self.user, today, 2600))
+
+        for day_date in dates:
+            after = self.cycle_day(day_date)
+            # Same dishes in the same rotation on every date
+            self.assertEqual(
+                {meal: [food for food, _ in foods] for meal, foods in after.items()},
+                {meal: [food for food, _ in foods] for meal, foods in before[day_date].items()}
+            )
+            portions_changed = after != before[day_date]
+            self.assertEqual(portions_changed, day_date >= today, day_date)
+
+    def test_stream_long_plan(self):
+        client = api_client(self.user)
+        with mock.patch.object(ai_meal_planner, "request_meal_plan", side_effect=fake_meal_plan_response):
+            response = client.post(
+                "/api/ml/generate-ai-meal-plan/stream/",
+                {"days": self.DAYS, "force_new": True, "fresh": True},
+                format="json"
+            )
+            lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+        base_days = plan_cycles.generated_days(self.DAYS)
+        self.assertEqual([line["type"] for line in lines], ["start"] + ["day"] * base_days + ["done"])
+        self.assertEqual(lines[-1]["streamed_days"], base_days)
+
+        # A later date repeats the streamed days through the cycle
+        today = date.today()
+        self.assertEqual(plan_cycles.active_plan(self.user, today)["days"], self.DAYS)
+        later = today + timedelta(days=40)
+        response = client.get(f"/api/ml/meal-plan/?date={later}")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(MealPlan.objects.filter(user=self.user, date=later).exists())
+
+
+# ---------------- WORKOUT AND MARATHON QUERY COUNTS ---------------- #
+def create_plans(user, days, exercises):
+    """A `days`-day workout plan of `exercises` exercises a day, today's daily workout and a `days`-week marathon"""
+    today = date.today()
+    plan_days = [
+        {
+            "day_number": d,
+            "day_name": f"Day {d}",
+            "is_rest_day": False,
+            "total_duration_minutes": 45,
+            "total_calories": 300,
+            "exercises": [
+                {"name": f"Exercise {i}", "workout_type": "strength", "reps_or_duration": "3x12", "calories": 35}
+                for i in range(exercises)
+            ]
+        }
+        for d in range(1, days + 1)
+    ]
+    plan = Workout.objects.create(
+        user=user, workout_name="Test plan", workout_type="AI Generated",
+        duration=days, date=today, description=json.dumps(plan_days)
+    )
+    daily = Workout.objects.create(
+        user=user, workout_name="Test daily", workout_type="Daily Progressive",
+        duration=45, date=today, is_daily_plan=True, plan_day_number=1,
+        description=json.dumps(plan_days[0]["exercises"])
+    )
+    workout_storage.index_workout(plan, plan_days)
+    workout_storage.index_workout(daily)
+
+    schedule = [
+        {"day": f"Week {w + 1} Day {d + 1}", "run_type": "easy", "distance_km": 5, "notes": ""}
+        for w in range(days) for d in range(7)
+    ]
+    marathon = Marathon.objects.create(
+        user=user, marathon_name="Test marathon", distance=42.2,
+        target_date=today, notes=json.dumps(schedule)
+    )
+    return plan, daily, marathon
+
+
+class PlanViewQueryCountTests(TestCase):
+    """Workout and marathon plan views read completion and tracking in a fixed number of queries"""
+
+    PLAN_SIZES = (7, 60)  # Plan days (and marathon weeks); the counts must not change with the size
+    EXERCISES = 6
+
+    def plan_user(self, days):
+        """A user with a workout plan, today's daily workout and a marathon, every other index completed"""
+        user = create_user(f"plan_queries_{days}")
+        plan, daily, marathon = create_plans(user, days, self.EXERCISES)
+        schedule = json.loads(marathon.notes)
+
+        for item, total in ((plan, days * self.EXERCISES), (daily, self.EXERCISES), (marathon, len(schedule))):
+            type(item).objects.filter(pk=item.pk).update(
+                completion_bits=completion.from_indices(range(0, total, 2), total),
+                completion_total=total,
+                completed_count=(total + 1) // 2
+            )
+        WorkoutExerciseTracking.objects.bulk_create([
+            WorkoutExerciseTracking(workout=plan, exercise_index=i, difficulty="just_right")
+            for i in range(0, days * self.EXERCISES, 2)
+        ])
+        MarathonDayTracking.objects.bulk_create([
+            MarathonDayTracking(marathon=marathon, day_index=i, difficulty="just_right")
+            for i in range(0, len(schedule), 2)
+        ])
+        return user
+
+    def view_responses(self, view, queries):
+        """GET the view for each plan size within `queries` queries; yields (days, response data)"""
+        for days in self.PLAN_SIZES:
+            with self.subTest(days=days):
+                client = api_client(self.plan_user(days))
+                with self.assertNumQueries(queries):
+                    response = client.get(f"/api/ml/{view}/")
+                self.assertEqual(response.status_code, 200)
+                yield days, response.data
+
+    def test_active_workout_plan(self):
+        for days, data in self.view_responses("active-workout-plan", 5):
+            exercises = [exercise for day in data["days"] for exercise in day["exercises"]]
+            self.assertEqual(len(exercises), days * self.EXERCISES)
+            for exercise in exercises:
+                completed = exercise["index"] % 2 == 0
+                self.assertEqual(exercise["completed"], completed)
+                self.assertEqual(exercise["difficulty"], "just_right" if completed else None)
+
+    def test_todays_workout(self):
+        for days, data in self.view_responses("todays-workout", 4):
+            self.assertTrue(data["has_workout"])
+
+    def test_active_marathon_plan(self):
+        for days, data in self.view_responses("active-marathon-plan", 2):
+            self.assertEqual(len(data["schedule"]), days * 7)
+            for day in data["schedule"]:
+                completed = day["index"] % 2 == 0
+                self.assertEqual(day["completed"], completed)
+                self.assertEqual(day["difficulty"], "just_right" if completed else None)
+
+
+# ---------------- COMPLETION TRACKING ---------------- #
+class CompletionTrackingTests(TestCase):
+    """Exercises and marathon days add to today's HealthData only when they go from not completed to completed"""
+
+    def setUp(self):
+        self.user = create_user("completion")
+        self.client = api_client(self.user)
+        self.plan, _, self.marathon = create_plans(self.user, 2, 4)
+
+    def burned(self):
+        health = HealthData.objects.filter(user=self.user, date=date.today()).first()
+        return (health.calories_burned, health.distance, health.active_minutes) if health else (0, 0, 0)
+
+    def track_exercise(self, completed, format="json"):
+        data = {"workout_id": self.plan.id, "exercise_index": 1}
+        if completed is not None:
+            data["completed"] = completed
+        return self.client.post("/api/ml/track-workout-exercise/", data, format=format)
+
+    def track_day(self, completed):
+        return self.client.post(
+            "/api/ml/track-marathon-day/",
+            {"marathon_id": self.marathon.id, "day_index": 0, "completed": completed},
+            format="json"
+        )
+
+    def test_exercise_calories_logged_once(self):
+        self.assertEqual(self.track_exercise(None).status_code, 200)
+        self.assertEqual(self.track_exercise(True).status_code, 200)
+        self.assertEqual(self.burned()[0], 35)
+
+        # Cleared and completed again is a new completion
+        self.assertEqual(self.track_exercise(False).status_code, 200)
+        self.assertEqual(self.burned()[0], 35)
+        self.assertEqual(self.track_exercise(True).status_code, 200)
+        self.assertEqual(self.burned()[0], 70)
+
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.completed_count, 1)
+
+    def test_marathon_day_logged_once(self):
+        for _ in range(2):
+            self.assertEqual(self.track_day(True).status_code, 200)
+        self.assertEqual(self.burned(), (300, 5, 30))
+        self.marathon.refresh_from_db()
+        self.assertEqual(self.marathon.completed_count, 1)
+
+    def test_form_false_clears(self):
+        self.assertEqual(self.track_exercise("true", format="multipart").status_code, 200)
+        response = self.track_exercise("false", format="multipart")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data["completed"])
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.completed_count, 0)
+        self.assertEqual(self.burned()[0], 35)
+
+    def test_invalid_completed(self):
+        self.assertEqual(self.track_exercise("maybe").status_code, 400)
+        self.assertEqual(self.track_day("maybe").status_code, 400)
+        self.assertEqual(self.burned(), (0, 0, 0))
+
+    def test_batch_parses_completed(self):
+        response = self.client.post("/api/ml/track-batch/", {"operations": [
+            {"kind": "exercise", "workout_id": self.plan.id, "exercise_index": 0, "completed": "true"},
+            {"kind": "exercise", "workout_id": self.plan.id, "exercise_index": 0, "completed": "false"},
+            {"kind": "marathon_day", "marathon_id": self.marathon.id, "day_index": 0, "completed": "maybe"},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual([result["success"] for result in results], [True, True, False])
+        self.assertFalse(results[1]["completed"])
+        self.assertEqual(results[2]["code"], 400)
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.completed_count, 0)
+
+# ---------------- DAILY WORKOUTS ---------------- #
+class DailyWorkoutTests(TestCase):
+    """generate-daily-workout/ returns the workout pregenerated for today instead of making another"""
+
+    def setUp(self):
+        self.user = create_user("daily")
+        self.client = api_client(self.user)
+        # Overnight run, with the model unavailable so the local builder makes the workout
+        with mock.patch.object(generation, "_generate_json_cached", side_effect=RuntimeError("no model")):
+            self.assertTrue(pregeneration.pregenerate_daily_workout(self.user, date.today()))
+        self.pregenerated = Workout.objects.get(user=self.user, is_daily_plan=True, date=date.today())
+
+    def generate(self, **data):
+        response = self.client.post("/api/ml/generate-daily-workout/", {"engine": "local", **data}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_pregenerated_workout_is_returned(self):
+        data = self.generate()
+        self.assertTrue(data["existing"])
+        self.assertEqual(data["workout"]["id"], self.pregenerated.id)
+        self.assertEqual(len(data["workout"]["exercises"]), self.pregenerated.completion_total)
+        self.assertEqual(Workout.objects.filter(user=self.user, is_daily_plan=True).count(), 1)
+
+    def test_form_false_keeps_pregenerated_workout(self):
+        response = self.client.post("/api/ml/generate-daily-workout/", {"engine": "local", "fresh": "false"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["workout"]["id"], self.pregenerated.id)
+        response = self.client.post("/api/ml/generate-daily-workout/", {"engine": "local", "fresh": "maybe"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_fresh_makes_a_new_workout(self):
+        data = self.generate(fresh=True)
+        self.assertNotIn("existing", data)
+        self.assertNotEqual(data["workout"]["id"], self.pregenerated.id)
+        self.assertEqual(Workout.objects.filter(user=self.user, is_daily_plan=True).count(), 2)
+
+
+# ---------------- LLM GATEWAY ---------------- #
+class CircuitBreakerTests(SimpleTestCase):
+    """CircuitBreaker state transitions, on a fake monotonic clock"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(llm_gateway.time, "monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        recorder_patcher = mock.patch.object(llm_metrics.recorder, "background", False)
+        recorder_patcher.start()
+        self.addCleanup(recorder_patcher.stop)
+        self.breaker = llm_gateway.CircuitBreaker(window=60.0, min_calls=4, error_rate=0.5, cooldown=30.0)
+
+    def open_breaker(self):
+        for _ in range(4):
+            self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_stays_closed_below_min_calls(self):
+        for _ in range(3):
+            self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow())
+
+    def test_stays_closed_below_error_rate(self):
+        for ok in (True, True, False, True, False, True):
+            self.breaker.record(ok)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_opens_at_error_rate(self):
+        for ok in (True, False, True, False):
+            self.breaker.record(ok)
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(self.breaker.times_opened, 1)
+        self.assertFalse(self.breaker.allow())
+
+    def test_old_outcomes_leave_the_window(self):
+        for _ in range(3):
+            self.breaker.record(False)
+        self.now += 61
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertEqual(self.breaker.snapshot()["recent_calls"], 1)
+
+    def test_ignores_outcomes_while_open(self):
+        self.open_breaker()
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_lets_one_probe_through(self):
+        self.open_breaker()
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.now += 1
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertFalse(self.breaker.allow())  # The probe is still running
+
+    def test_successful_probe_closes(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertEqual(self.breaker.snapshot()["recent_calls"], 0)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(self.breaker.times_opened, 2)
+        self.assertFalse(self.breaker.allow())
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+
+
+class LLMGatewayTests(SimpleTestCase):
+    """Retry, deadline, hedge and breaker behaviour of llm_gateway against FakeModelServer (no real API calls)"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fake = FakeModelServer()
+        cls.fake.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fake.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.fake.configure(latency=0.01)
+        self.fake.requests = 0
+        for patcher in (
+            mock.patch.dict(os.environ, {"GEMINI_BASE_URL": self.fake.url, "GEMINI_API_KEY": "test"}),
+            # Keep fake calls out of the LLMCallLog table
+            mock.patch.object(llm_metrics.recorder, "background", False),
+            mock.patch.object(llm_gateway, "BACKOFF_BASE", 0.01),
+            mock.patch.object(llm_gateway, "BACKOFF_MAX", 0.02),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        llm_gateway.reset()
+        self.addCleanup(llm_gateway.reset)
+
+    def test_healthy_call(self):
+        self.assertEqual(llm_gateway.generate_json("test"), {"ok": True})
+        self.assertEqual(self.fake.requests, 1)
+        self.assertEqual(llm_gateway.breaker.snapshot()["recent_calls"], 1)
+
+    def test_retries_then_gives_up(self):
+        self.fake.configure(latency=0.01, failure_rate=1.0)
+        with self.assertRaises(llm_gateway.LLMUnavailable) as raised:
+            llm_gateway.generate_json("test", retries=2)
+        self.assertNotIsInstance(raised.exception, llm_gateway.CircuitOpenError)
+        self.assertEqual(self.fake.requests, 3)
+        self.assertEqual(llm_gateway.breaker.snapshot()["recent_failures"], 3)
+
+    def test_deadline(self):
+        self.fake.configure(latency=2.0)
+        started = time.monotonic()
+        with self.assertRaises(llm_gateway.LLMUnavailable):
+            llm_gateway.generate_json("test", deadline=0.3)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_hedge_answers_before_slow_request(self):
+        self.fake.configure(latency=0.01, latency_sequence=[2.0])
+        started = time.monotonic()
+        self.assertEqual(llm_gateway.generate_json("test", hedge_after=0.1), {"ok": True})
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(self.fake.requests, 2)
+
+    def test_outage_opens_breaker(self):
+        self.fake.configure(latency=0.01, failure_rate=1.0)
+        for _ in range(llm_gateway.BREAKER_MIN_CALLS):
+            with self.assertRaises(llm_gateway.LLMUnavailable):
+                llm_gateway.generate_json("test", retries=0)
+        self.assertEqual(llm_gateway.breaker.state, "open")
+
+        # Open: the call fails without reaching the server
+        self.fake.configure(latency=0.01)
+        sent = self.fake.requests
+        with self.assertRaises(llm_gateway.CircuitOpenError):
+            llm_gateway.generate_json("test")
+        self.assertEqual(self.fake.requests, sent)
+
+        # After the cooldown one probe goes through and closes it again
+        llm_gateway.breaker.opened_at -= llm_gateway.breaker.cooldown
+        self.assertEqual(llm_gateway.generate_json("test"), {"ok": True})
+        self.assertEqual(self.fake.requests, sent + 1)
+        self.assertEqual(llm_gateway.breaker.state, "closed")
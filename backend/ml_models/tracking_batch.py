@@ -0,0 +1,257 @@
+import json
+from collections import defaultdict
+from datetime import date
+
+from django.db import transaction
+from django.db.models import F
+
+from health_data.models import HealthData, Marathon, Workout
+from . import completion, workout_storage
+from .models import MealItem, MealItemTracking, WorkoutPlanExercise
+from .nutrition import apply_rollup_deltas, item_contribution
+
+
+# Batch tracking applies a list of exercise, marathon day and meal item
+# operations (clients replaying what they tracked offline) in one
+# transaction: every plan and meal item involved is locked and read once,
+# completion bitsets are written with one UPDATE per plan model, meal
+# tracking rows with one INSERT, and HealthData / DailyNutritionLog get one
+# increment per affected date.
+
+MAX_OPERATIONS = 200  # Operations accepted in one batch
+MEAL_STATUSES = ("eaten", "skipped")
+
+# Running estimates, as used by track_marathon_day
+MARATHON_KCAL_PER_KM = 60
+MARATHON_MINUTES_PER_KM = 6
+
+
+class OperationError(Exception):
+    """An operation that can't be applied; the rest of the batch still is"""
+
+    def __init__(self, message, code=400):
+        super().__init__(message)
+        self.code = code
+
+
+def _int(operation, field, minimum=None):
+    try:
+        value = int(operation[field])
+    except (KeyError, TypeError, ValueError):
+        raise OperationError(f"{field} must be an integer")
+    if minimum is not None and value < minimum:
+        raise OperationError(f"{field} must not be negative")
+    return value
+
+
+def _completed(operation):
+    try:
+        return completion.parse_completed(operation.get("completed"))
+    except ValueError as e:
+        raise OperationError(str(e))
+
+
+def _parse(operation):
+    """Validated (kind, target id, fields) of one operation"""
+    if not isinstance(operation, dict):
+        raise OperationError("Operation must be an object")
+    kind = operation.get("kind")
+    if kind == "exercise":
+        return kind, _int(operation, "workout_id"), {
+            "index": _int(operation, "exercise_index", minimum=0),
+            "completed": _completed(operation)
+        }
+    if kind == "marathon_day":
+        return kind, _int(operation, "marathon_id"), {
+            "index": _int(operation, "day_index", minimum=0),
+            "completed": _completed(operation)
+        }
+    if kind == "meal_item":
+        status = operation.get("status")
+        if status not in MEAL_STATUSES:
+            raise OperationError(f"status must be one of {', '.join(MEAL_STATUSES)}")
+        try:
+            quantity_ratio = float(operation.get("quantity_ratio", 1.0))
+        except (TypeError, ValueError):
+            raise OperationError("quantity_ratio must be a number")
+        return kind, _int(operation, "meal_item_id"), {"status": status, "quantity_ratio": quantity_ratio}
+    raise OperationError("kind must be exercise, marathon_day or meal_item")
+
+
+def _apply_completion(model, user, ops, total_for, on_completed):
+    """
+    Apply exercise or marathon day operations to the plans' bitsets
+
+    Args:
+        ops (dict): plan id -> [(position, fields), ...] in request order
+        total_for: callable(plan) -> index count, for plans whose bitset is too small
+        on_completed: callable(plan, index), called for each index that becomes completed
+
+    Returns:
+        dict: position -> result
+    """
+    results = {}
+    plans = list(model.objects.select_for_update().filter(id__in=ops.keys(), user=user).order_by('id'))
+    for plan in plans:
+        if any(fields["index"] >= plan.completion_total for _, fields in ops[plan.id]):
+            completion.resize(plan, total_for(plan))
+
+        value = completion.as_int(plan.completion_bits)
+        for position, fields in ops[plan.id]:
+            index = fields["index"]
+            if index >= plan.completion_total:
+                results[position] = OperationError("Index out of range")
+                continue
+            was_set = completion.is_set(value, index)
+            if fields["completed"]:
+                value |= 1 << index
+                if not was_set:
+                    on_completed(plan, index)
+            else:
+                value &= ~(1 << index)
+            results[position] = {
+                "completed": fields["completed"],
+                "all_completed": value.bit_count() == plan.completion_total
+            }
+        plan.completion_bits = completion.to_bits(value, plan.completion_total)
+        plan.completed_count = value.bit_count()
+
+    model.objects.bulk_update(plans, ['completion_bits', 'completed_count'])
+    for plan_id, plan_ops in ops.items():
+        for position, _ in plan_ops:
+            results.setdefault(position, OperationError("Plan not found", code=404))
+    return results
+
+
+def _apply_meal_items(user, ops):
+    """Meal item operations: one tracking INSERT, one rollup delta per date"""
+    results = {}
+    items = {
+        item.id: item
+        for item in MealItem.objects.select_for_update()
+        .filter(id__in=ops.keys(), meal__user=user)
+        .select_related('meal')
+        .with_latest_tracking()
+    }
+    tracking = []
+    deltas = defaultdict(lambda: [0.0, 0.0, 0.0, 0.0])
+    for item_id, item_ops in ops.items():
+        item = items.get(item_id)
+        if item is None:
+            for position, _ in item_ops:
+                results[position] = OperationError("Meal item not found", code=404)
+            continue
+
+        status, ratio = item.tracking_status, item.tracking_ratio
+        for position, fields in item_ops:
+            old_values = item_contribution(item, status, ratio)
+            status, ratio = fields["status"], fields["quantity_ratio"]
+            delta = deltas[item.meal.date]
+            for n, (new, old) in enumerate(zip(item_contribution(item, status, ratio), old_values)):
+                delta[n] += new - old
+            tracking.append(MealItemTracking(meal_item=item, status=status, quantity_ratio=ratio))
+            results[position] = {"status": status, "quantity_ratio": ratio}
+
+    # Rows are inserted in request order, so the last operation on an item is its latest tracking
+    MealItemTracking.objects.bulk_create(tracking)
+    apply_rollup_deltas(user.id, deltas)
+    return results
+
+
+def apply_tracking_batch(user, operations):
+    """
+    Apply exercise, marathon day and meal item tracking operations in one transaction
+
+    Operations on the same exercise, day or item are applied in request
+    order. Calories and distance are added to today's HealthData once per
+    batch, and only for exercises and days that become completed, so a
+    replayed operation doesn't count twice.
+
+    Args:
+        user: User whose plans and meal items the operations target
+        operations (list): {"kind": "exercise", "workout_id", "exercise_index", "completed"},
+            {"kind": "marathon_day", "marathon_id", "day_index", "completed"} or
+            {"kind": "meal_item", "meal_item_id", "status", "quantity_ratio"}
+
+    Returns:
+        list: One result per operation, in request order: {"index", "kind",
+        "success", ...} with the new state, or "error" and "code" (the HTTP
+        status the single-operation endpoint would answer) for operations
+        that were not applied
+    """
+    parsed = {}
+    grouped = {"exercise": defaultdict(list), "marathon_day": defaultdict(list), "meal_item": defaultdict(list)}
+    for position, operation in enumerate(operations):
+        try:
+            kind, target, fields = _parse(operation)
+        except OperationError as e:
+            parsed[position] = (operation.get("kind") if isinstance(operation, dict) else None, e)
+            continue
+        parsed[position] = (kind, None)
+        grouped[kind][target].append((position, fields))
+
+    burned = {"calories": 0.0, "distance": 0.0, "minutes": 0.0}
+    outcomes = {}
+
+    with transaction.atomic():
+        if grouped["exercise"]:
+            lookups = [
+                (workout_id, fields["index"])
+                for workout_id, ops in grouped["exercise"].items() for _, fields in ops if fields["completed"]
+            ]
+            calories = {
+                (workout_id, index): value
+                for workout_id, index, value in WorkoutPlanExercise.objects.filter(
+                    workout_id__in={workout_id for workout_id, _ in lookups},
+                    exercise_index__in={index for _, index in lookups}
+                ).values_list('workout_id', 'exercise_index', 'calories')
+            } if lookups else {}
+
+            def exercise_done(workout, index):
+                burned["calories"] += calories.get((workout.id, index), 0)
+
+            outcomes.update(_apply_completion(
+                Workout, user, grouped["exercise"], workout_storage.exercise_count, exercise_done
+            ))
+
+        if grouped["marathon_day"]:
+            schedules = {}
+
+            def day_done(marathon, index):
+                if marathon.id not in schedules:
+                    schedules[marathon.id] = json.loads(marathon.notes) if marathon.notes else []
+                schedule = schedules[marathon.id]
+                distance_km = schedule[index].get('distance_km', 0) if index < len(schedule) else 0
+                burned["calories"] += int(distance_km * MARATHON_KCAL_PER_KM)
+                burned["distance"] += distance_km
+                burned["minutes"] += int(distance_km * MARATHON_MINUTES_PER_KM)
+
+            outcomes.update(_apply_completion(
+                Marathon, user, grouped["marathon_day"], completion.schedule_length, day_done
+            ))
+
+        if grouped["meal_item"]:
+            outcomes.update(_apply_meal_items(user, grouped["meal_item"]))
+
+        # One increment of today's activity for the whole batch
+        if any(burned.values()):
+            today = date.today()
+            HealthData.objects.bulk_create(
+                [HealthData(user=user, date=today, steps=0, calories_burned=0, distance=0, active_minutes=0)],
+                ignore_conflicts=True
+            )
+            HealthData.objects.filter(user=user, date=today).update(
+                calories_burned=F('calories_burned') + burned["calories"],
+                distance=F('distance') + burned["distance"],
+                active_minutes=F('active_minutes') + burned["minutes"]
+            )
+
+    results = []
+    for position in range(len(operations)):
+        kind, error = parsed[position]
+        outcome = error or outcomes[position]
+        if isinstance(outcome, OperationError):
+            results.append({"index": position, "kind": kind, "success": False, "error": str(outcome), "code": outcome.code})
+        else:
+            results.append({"index": position, "kind": kind, "success": True, **outcome})
+    return results
@@ -1,11 +1,16 @@
-from django.urls import path
+from django.urls import path, re_path
 from .views import (
     generate_ai_meal_plan, 
+    stream_ai_meal_plan,
     track_meal_item, 
+    track_batch,
     daily_nutrition, 
+    get_nutrition_summary,
     get_meal_plan, 
+    get_meal_plan_range,
     check_active_plan, 
     generate_meal_image_endpoint,
+    serve_meal_image,
     recalculate_meal_plan,
     generate_ai_workout_plan,
     generate_ai_marathon_plan,
@@ -27,16 +32,28 @@ from .views import (
     complete_daily_workout,
     get_todays_workout,
     check_active_workout_plan,
-    check_active_marathon_plan
+    check_active_marathon_plan,
+    # Background generation jobs
+    get_generation_job,
+    get_generation_job_result,
+    generation_cache_stats,
+    image_warming_stats,
+    llm_usage,
+    llm_usage_by_user
 )
 
 urlpatterns = [
     path("generate-ai-meal-plan/", generate_ai_meal_plan),
+    path("generate-ai-meal-plan/stream/", stream_ai_meal_plan),
     path("meal-plan/", get_meal_plan),
+    path("meal-plan/range/", get_meal_plan_range),
     path("track-meal-item/", track_meal_item),
+    path("track-batch/", track_batch),
     path("daily_nutrition/", daily_nutrition),
+    path("nutrition-summary/", get_nutrition_summary),
     path("check-active-plan/", check_active_plan),
     path("generate-meal-image/", generate_meal_image_endpoint),
+    re_path(r"^meal-images/(?P<digest>[0-9a-f]{64})\.(?P<ext>png|jpg)$", serve_meal_image, name="meal_image"),
     path("recalculate-meal-plan/", recalculate_meal_plan),
     path("delete-meal-plan/", delete_current_meal_plan),
     path("workout-plan/", generate_ai_workout_plan),
@@ -59,4 +76,11 @@ urlpatterns = [
     path("todays-workout/", get_todays_workout),
     path("check-active-workout-plan/", check_active_workout_plan),
     path("check-active-marathon-plan/", check_active_marathon_plan),
+    # Background generation jobs
+    path("jobs/<int:job_id>/", get_generation_job),
+    path("jobs/<int:job_id>/result/", get_generation_job_result),
+    path("generation-cache/stats/", generation_cache_stats),
+    path("image-warming/stats/", image_warming_stats),
+    path("llm-usage/", llm_usage),
+    path("llm-usage/users/", llm_usage_by_user),
 ]
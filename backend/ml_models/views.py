@@ -1,13 +1,32 @@
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from datetime import date, timedelta
 from django.utils.timezone import now
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse, FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
 import json
+import logging
+import os
 
-from .models import MealPlan, MealItem, MealItemTracking
-from .ai_meal_planner import generate_meal_plan, generate_meal_image
+from .models import FoodCatalog, MealPlan, MealItem, MealItemTracking, GenerationJob
+from .ai_meal_planner import generate_meal_image, iter_meal_plan_days
+from .image_store import CONTENT_TYPES, image_path, store_image
+from . import image_warmer
+from .plan_storage import save_meal_plan, delete_meals_from, delete_meals_on
+from . import completion, plan_cycles, pregeneration, tracking_batch, workout_storage
+from .meal_optimizer import optimize_meal_plan
+from .generation import generate_daily_workout_payload, save_daily_workout_payload, save_meal_plan_payload
+from . import generation_cache, llm_gateway, llm_metrics
+from .jobs import enqueue_job
+from .nutrition import get_feedback, item_contribution, apply_rollup_delta, rollup_totals, nutrition_summary
+
+
+logger = logging.getLogger(__name__)
 
 
 # ---------------- CALORIE CALCULATION ---------------- #
@@ -27,43 +46,35 @@ def recommended_calories(age, gender, height, weight, activity):
     return int(bmr * activity_map.get(activity.lower(), 1.2))
 
 
-# ---------------- NUTRITION FEEDBACK FOR AI ---------------- #
-def get_feedback(user):
-    last_week = now().date() - timedelta(days=7)
-    meals = MealPlan.objects.filter(user=user, date__gte=last_week)
+# ---------------- REQUEST FLAGS ---------------- #
+def request_flag(request, field):
+    """
+    A boolean request field such as `fresh` (missing means False)
 
-    protein = carbs = fat = calories = 0
+    Raises:
+        ValueError: The value isn't a boolean (see completion.parse_bool)
+    """
+    return completion.parse_bool(request.data.get(field), field, False)
 
-    for meal in meals:
-        for item in meal.items.all():
-            tracking = MealItemTracking.objects.filter(meal_item=item).order_by('-timestamp').first()
-            if tracking and tracking.status == "eaten":
-                ratio = tracking.quantity_ratio
-                calories += item.calories * ratio
-                protein += item.protein * ratio
-                carbs += item.carbs * ratio
-                fat += item.fat * ratio
 
-    return {
-        "calories": round(calories, 1),
-        "protein": round(protein, 1),
-        "carbs": round(carbs, 1),
-        "fat": round(fat, 1),
-    }
+# ---------------- MEAL PLAN GENERATION PARAMETERS ---------------- #
+MEAL_PLAN_MAX_DAYS = 365  # Longest plan the generators are built for
 
 
-# ---------------- GENERATE AI MEAL PLAN ---------------- #
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def generate_ai_meal_plan(request):
+def meal_plan_request_params(request):
+    """
+    Validate a meal plan generation request
+    
+    Returns:
+        tuple: (params, None) for the meal plan generator, or (None, error Response)
+    """
     user = request.user
 
     # Get user data from User model
     if not user.height or not user.weight or not user.date_of_birth or not user.gender:
-        return Response({"error": "Please complete your profile with height, weight, date of birth, and gender"}, status=400)
+        return None, Response({"error": "Please complete your profile with height, weight, date of birth, and gender"}, status=400)
 
     # Calculate age from date of birth
-    from datetime import date
     today = date.today()
     age = today.year - user.date_of_birth.year - ((today.month, today.day) < (user.date_of_birth.month, user.date_of_birth.day))
 
@@ -75,8 +86,6 @@ def generate_ai_meal_plan(request):
         request.data.get("activity", "moderate")
     )
 
-    feedback = get_feedback(user)
-
     # Use user's fitness goal from profile if not provided in request
     goal = request.data.get("goal")
     if not goal and user.fitness_goal:
@@ -84,60 +93,177 @@ def generate_ai_meal_plan(request):
     elif not goal:
         goal = "maintain"  # Default fallback
 
-    days = request.data.get("days", 7)
+    try:
+        days = int(request.data.get("days", 7))
+    except (TypeError, ValueError):
+        return None, Response({"error": "days must be an integer"}, status=400)
+    if not 1 <= days <= MEAL_PLAN_MAX_DAYS:
+        return None, Response({"error": f"days must be between 1 and {MEAL_PLAN_MAX_DAYS}"}, status=400)
+    
+    try:
+        force_new = request_flag(request, "force_new")
+        fresh = request_flag(request, "fresh")
+    except ValueError as e:
+        return None, Response({"error": str(e)}, status=400)
     
     # Check if user has an active meal plan
-    future_meals = MealPlan.objects.filter(user=user, date__gte=today).count()
+    active = plan_cycles.active_plan(user, today)
+    future_meals = active["meals"] if active else 0
     
     if future_meals > 0:
         # User has an active plan
-        force_new = request.data.get("force_new", False)
-        
         if not force_new:
             # Return info about existing plan
-            return Response({
+            return None, Response({
                 "error": "active_plan_exists",
                 "message": f"You have an active meal plan with {future_meals} upcoming meals. Set 'force_new' to true to replace it.",
                 "active_meals_count": future_meals
             }, status=400)
-        else:
-            # User wants to replace the current plan - delete all future meals
-            MealPlan.objects.filter(user=user, date__gte=today).delete()
-
-    # Use real AI meal planner with Gemini
-    plan = generate_meal_plan(
-        calories,
-        request.data.get("diet_type", "none"),
-        request.data.get("allergies", ""),
-        goal,
-        days,
-        feedback=feedback
+
+    return {
+        "calories": calories,
+        "diet_type": request.data.get("diet_type", "none"),
+        "allergies": request.data.get("allergies", ""),
+        "goal": goal,
+        "days": days,
+        "start_date": str(today),
+        "fresh": fresh  # Skip the generation cache
+    }, None
+
+
+# ---------------- GENERATE AI MEAL PLAN ---------------- #
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def generate_ai_meal_plan(request):
+    params, error_response = meal_plan_request_params(request)
+    if error_response:
+        return error_response
+
+    if request.data.get("engine") == "local":
+        # Instant plan from the local optimizer: no model call, no job to poll
+        try:
+            plan = optimize_meal_plan(
+                params["calories"], params["diet_type"], params["allergies"],
+                plan_cycles.generated_days(params["days"]), goal=params["goal"]
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(save_meal_plan_payload(request.user, params, plan))
+
+    # Generate the plan with Gemini in the background; the client polls the job
+    job = enqueue_job(request.user, 'meal_plan', params)
+
+    return job_accepted_response(job)
+
+
+# ---------------- STREAM AI MEAL PLAN (NDJSON) ---------------- #
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def stream_ai_meal_plan(request):
+    """
+    Generate a meal plan and stream it as NDJSON, one line per stored day
+    
+    Lines: {"type": "start"}, then {"type": "day"} per day in order (same meal
+    shape as meal-plan/, with item ids), then {"type": "done"} or {"type": "error"}.
+
+    Each streamed day replaces only its own date, so a stream that fails (or
+    a client that disconnects) partway leaves the new plan's streamed days
+    followed by the previous plan's remaining days, never a gap. The error
+    line reports how many days were stored.
+
+    Long plans are stored as for generate-ai-meal-plan/ (see plan_cycles.py):
+    only the base days are generated and streamed, and the dates after them
+    are covered by a cycle of those days, materialized when first read. The
+    done line gives the number of streamed days.
+    """
+    params, error_response = meal_plan_request_params(request)
+    if error_response:
+        return error_response
+
+    response = StreamingHttpResponse(
+        (json.dumps(line) + "\n" for line in stream_meal_plan_lines(request.user, params)),
+        content_type="application/x-ndjson"
     )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Let reverse proxies flush each line
+    return response
+
+
+def stream_meal_plan_lines(user, params):
+    """Generate, persist and describe each day of a new meal plan as it becomes available"""
+    start_date = date.fromisoformat(params["start_date"])
+    days = params["days"]
+    end_date = start_date + timedelta(days=days-1)
+    base_days = plan_cycles.generated_days(days)
+    streamed = {}
+    stored_days = 0
+
+    yield {
+        "type": "start",
+        "days": days,
+        "start_date": str(start_date),
+        "end_date": str(end_date)
+    }
 
-    # Generate meal plan starting from today
-    for d in range(days):
-        day_date = today + timedelta(days=d)
-        for meal_type, items in plan[str(d+1)].items():
-            meal = MealPlan.objects.create(user=user, date=day_date, meal_type=meal_type)
-
-            for food in items:
-                MealItem.objects.create(
-                    meal=meal,
-                    food_name=food["name"],
-                    calories=food["calories"],
-                    protein=food["protein"],
-                    carbs=food["carbs"],
-                    fat=food["fat"]
-                )
+    try:
+        day_iter = iter_meal_plan_days(
+            params["calories"],
+            params["diet_type"],
+            params["allergies"],
+            params["goal"],
+            base_days,
+            feedback=get_feedback(user),
+            use_cache=not params.get("fresh")
+        )
+        with llm_metrics.attribute('meal_plan_stream', user.id):
+            for day_number, day in day_iter:
+                day_date = start_date + timedelta(days=day_number - 1)
+                # The previous plan's meals of this date are replaced in the same transaction
+                with transaction.atomic():
+                    delete_meals_on(user, [day_date])
+                    meals, items = save_meal_plan(user, {"1": day}, day_date, 1)
+                stored_days = day_number
+                streamed[str(day_number)] = day
+
+                items_by_meal = {}
+                for item in items:
+                    items_by_meal.setdefault(item.meal_id, []).append(item)
+
+                yield {
+                    "type": "day",
+                    "day": day_number,
+                    "date": str(day_date),
+                    "meals": {meal.meal_type: serialize_meal_items(items_by_meal.get(meal.id, [])) for meal in meals}
+                }
+        if base_days < days:
+            # The rest of a long plan repeats the streamed days, replacing the previous plan's in one go
+            cycle_start = start_date + timedelta(days=base_days)
+            with transaction.atomic():
+                delete_meals_from(user, cycle_start)
+                plan_cycles.create_cycle(user, streamed, start_date, cycle_start, end_date)
+        else:
+            # The previous plan's days past the new plan's end
+            delete_meals_from(user, end_date + timedelta(days=1))
+    except Exception as e:
+        logger.exception("Error streaming meal plan after %s stored days", stored_days)
+        yield {
+            "type": "error",
+            "error": f"Failed to generate meal plan: {str(e)}",
+            # Days 1..stored_days are the new plan, later dates keep the previous plan's meals
+            "stored_days": stored_days
+        }
+        return
 
-    return Response({
+    image_warmer.schedule_image_warming(user, start_date)
+
+    yield {
+        "type": "done",
         "success": True,
         "message": "Meal plan generated successfully",
         "days": days,
-        "start_date": str(today),
-        "end_date": str(today + timedelta(days=days-1))
-    })
-    
+        "streamed_days": stored_days
+    }
+
 
 # ---------------- TRACK MEAL ITEM ---------------- #
 @api_view(["POST"])
@@ -145,21 +271,152 @@ def generate_ai_meal_plan(request):
 def track_meal_item(request):
     meal_item_id = request.data.get("meal_item_id")
     status_val = request.data.get("status")
-    quantity_ratio = request.data.get("quantity_ratio")
-
+    if status_val not in tracking_batch.MEAL_STATUSES:
+        return Response({"error": f"status must be one of {', '.join(tracking_batch.MEAL_STATUSES)}"}, status=400)
     try:
-        meal_item = MealItem.objects.get(id=meal_item_id)
-    except MealItem.DoesNotExist:
-        return Response({"error": "Meal item not found"}, status=404)
+        quantity_ratio = float(request.data.get("quantity_ratio", 1.0))
+    except (TypeError, ValueError):
+        return Response({"error": "quantity_ratio must be a number"}, status=400)
 
-    MealItemTracking.objects.create(
-        meal_item=meal_item,
-        status=status_val,
-        quantity_ratio=quantity_ratio
-    )
+    with transaction.atomic():
+        try:
+            # Lock the item so concurrent updates see each other's tracking rows
+            meal_item = MealItem.objects.select_for_update().select_related('meal', 'food').get(
+                id=meal_item_id, meal__user=request.user
+            )
+        except (MealItem.DoesNotExist, ValueError):
+            return Response({"error": "Meal item not found"}, status=404)
+
+        previous = MealItemTracking.objects.filter(meal_item=meal_item).order_by('-timestamp', '-id').first()
+
+        tracking = MealItemTracking.objects.create(
+            meal_item=meal_item,
+            status=status_val,
+            quantity_ratio=quantity_ratio
+        )
+
+        # Update the day's nutrition rollup by the change in this item's contribution
+        old_values = item_contribution(meal_item, previous.status, previous.quantity_ratio) if previous else (0, 0, 0, 0)
+        new_values = item_contribution(meal_item, tracking.status, tracking.quantity_ratio)
+        apply_rollup_delta(
+            meal_item.meal.user_id,
+            meal_item.meal.date,
+            tuple(new - old for new, old in zip(new_values, old_values))
+        )
 
     return Response({"message": "Meal tracking saved"})
+
+
+# ---------------- BATCH TRACKING ---------------- #
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def track_batch(request):
+    """
+    Apply many exercise, marathon day and meal item tracking operations at once
+    
+    For clients replaying tracking done offline; see tracking_batch for the
+    operation shapes. Invalid operations are reported per operation and do
+    not stop the others.
+    """
+    operations = request.data.get("operations")
+    if not isinstance(operations, list) or not operations:
+        return Response({"error": "operations must be a non-empty list"}, status=400)
+    if len(operations) > tracking_batch.MAX_OPERATIONS:
+        return Response({"error": f"At most {tracking_batch.MAX_OPERATIONS} operations per batch"}, status=400)
+    
+    try:
+        results = tracking_batch.apply_tracking_batch(request.user, operations)
+    except Exception as e:
+        logger.exception("Error applying tracking batch")
+        return Response({"error": f"Failed to apply tracking batch: {str(e)}"}, status=500)
+    
+    applied = sum(1 for result in results if result["success"])
+    return Response({
+        "success": True,
+        "applied": applied,
+        "failed": len(results) - applied,
+        "results": results
+    })
+    
+
+# ---------------- MEAL RESPONSE SHAPE ---------------- #
+def serialize_meal_items(items):
+    """
+    Response body of one meal: its items with tracking state and the meal's calories
+    
+    Items annotated by MealItem.with_latest_tracking report their latest status;
+    items without the annotation are reported as untracked.
+    """
+    serialized = []
+    total_calories = 0
     
+    for item in items:
+        tracking_status = getattr(item, 'tracking_status', None)
+        tracked = tracking_status is not None
+        
+        serialized.append({
+            'id': item.id,
+            'name': item.food_name,
+            'calories': item.calories,
+            'protein': item.protein,
+            'carbs': item.carbs,
+            'fat': item.fat,
+            'image_url': item.image_url,
+            'tracked': tracked,
+            'status': tracking_status,
+            'quantity_ratio': item.tracking_ratio if tracked else 1.0
+        })
+        
+        total_calories += item.calories
+    
+    return {
+        'items': serialized,
+        'total_calories': round(total_calories, 1)
+    }
+
+
+# ---------------- WORKOUT / MARATHON RESPONSE SHAPE ---------------- #
+def tracking_map(tracking_rows, index_field):
+    """A plan's tracking rows keyed by exercise or day index (one query for the whole plan)"""
+    return {getattr(tracking, index_field): tracking for tracking in tracking_rows}
+
+
+def serialize_tracked(index, fields, completed, tracking, with_difficulty=True):
+    """One plan exercise or marathon day with its completion and tracking details"""
+    entry = {
+        'index': index,
+        **fields,
+        'completed': completed
+    }
+    if with_difficulty:
+        entry['difficulty'] = tracking.difficulty if tracking else None
+    return entry
+
+
+def serialize_exercises(exercises, completed_bits, tracking, with_difficulty=True):
+    """
+    WorkoutPlanExercise rows with their completion and tracking details
+
+    Args:
+        completed_bits (int): The workout's completion bitset (completion.as_int)
+        tracking (dict): Detail rows from tracking_map
+    """
+    return [
+        serialize_tracked(
+            exercise.exercise_index,
+            {
+                'name': exercise.name,
+                'workout_type': exercise.workout_type,
+                'reps_or_duration': exercise.reps_or_duration,
+                'calories': exercise.calories
+            },
+            completion.is_set(completed_bits, exercise.exercise_index),
+            tracking.get(exercise.exercise_index),
+            with_difficulty
+        )
+        for exercise in exercises
+    ]
+
 
 # ---------------- GET MEAL PLAN FOR DATE ---------------- #
 @api_view(["GET"])
@@ -174,9 +431,15 @@ def get_meal_plan(request):
     except ValueError:
         plan_date = date.today()
     
-    meals = MealPlan.objects.filter(user=user, date=plan_date)
+    # Days of a long plan get their rows on first read
+    plan_cycles.materialize(user, plan_date, plan_date)
+    meals = list(
+        MealPlan.objects.filter(user=user, date=plan_date)
+        .order_by('id')
+        .prefetch_related(Prefetch('items', queryset=MealItem.objects.with_latest_tracking().order_by('id')))
+    )
     
-    if not meals.exists():
+    if not meals:
         return Response({
             'success': False,
             'message': 'No meal plan found for this date'
@@ -184,31 +447,7 @@ def get_meal_plan(request):
     
     result = {}
     for meal in meals:
-        items = []
-        total_calories = 0
-        
-        for item in meal.items.all():
-            tracking = MealItemTracking.objects.filter(meal_item=item).order_by('-timestamp').first()
-            
-            items.append({
-                'id': item.id,
-                'name': item.food_name,
-                'calories': item.calories,
-                'protein': item.protein,
-                'carbs': item.carbs,
-                'fat': item.fat,
-                'image_url': item.image_url,
-                'tracked': tracking is not None,
-                'status': tracking.status if tracking else None,
-                'quantity_ratio': tracking.quantity_ratio if tracking else 1.0
-            })
-            
-            total_calories += item.calories
-        
-        result[meal.meal_type] = {
-            'items': items,
-            'total_calories': round(total_calories, 1)
-        }
+        result[meal.meal_type] = serialize_meal_items(meal.items.all())
     
     return Response({
         'success': True,
@@ -217,6 +456,64 @@ def get_meal_plan(request):
     })
 
 
+# ---------------- GET MEAL PLAN FOR DATE RANGE ---------------- #
+# Longer ranges are returned one page of this many days at a time
+MEAL_PLAN_RANGE_PAGE_DAYS = 31
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_meal_plan_range(request):
+    """
+    Get user's meal plans for every day from `start` to `end` (inclusive)
+
+    Each day has the same `meals` shape as get_meal_plan, days without a plan
+    have empty meals. The whole page is loaded with two queries. Ranges longer
+    than MEAL_PLAN_RANGE_PAGE_DAYS are paginated by day: the response covers
+    the first page and `next_start` is the `start` of the next request.
+    """
+    user = request.user
+    
+    try:
+        start_date = date.fromisoformat(request.GET['start'])
+        end_date = date.fromisoformat(request.GET['end'])
+    except (KeyError, ValueError):
+        return Response({"error": "start and end must be dates (YYYY-MM-DD)"}, status=400)
+    
+    if end_date < start_date:
+        return Response({"error": "end must not be before start"}, status=400)
+    
+    page_end = min(end_date, start_date + timedelta(days=MEAL_PLAN_RANGE_PAGE_DAYS - 1))
+    
+    plan_cycles.materialize(user, start_date, page_end)
+    meals = (
+        MealPlan.objects.filter(user=user, date__gte=start_date, date__lte=page_end)
+        .order_by('date', 'id')
+        .prefetch_related(Prefetch('items', queryset=MealItem.objects.with_latest_tracking().order_by('id')))
+    )
+    
+    meals_by_date = {}
+    for meal in meals:
+        meals_by_date.setdefault(meal.date, {})[meal.meal_type] = serialize_meal_items(meal.items.all())
+    
+    days = []
+    day = start_date
+    while day <= page_end:
+        days.append({
+            'date': str(day),
+            'meals': meals_by_date.get(day, {})
+        })
+        day += timedelta(days=1)
+    
+    return Response({
+        'success': True,
+        'start': str(start_date),
+        'end': str(page_end),
+        'days': days,
+        'next_start': str(page_end + timedelta(days=1)) if page_end < end_date else None
+    })
+
+
 # ---------------- DAILY NUTRITION SUMMARY ---------------- #
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
@@ -224,26 +521,51 @@ def daily_nutrition(request):
     user = request.user
     today = date.today()
 
-    meals = MealPlan.objects.filter(user=user, date=today)
+    totals = rollup_totals(user, today, today)
 
-    total_calories = total_protein = total_carbs = total_fat = 0
+    return Response({
+        "calories": round(totals["calories"], 1),
+        "protein": round(totals["protein"], 1),
+        "carbs": round(totals["carbs"], 1),
+        "fat": round(totals["fat"], 1)
+    })
 
-    for meal in meals:
-        for item in meal.items.all():
-            tracking = MealItemTracking.objects.filter(meal_item=item).order_by('-timestamp').first()
 
-            if tracking and tracking.status == "eaten":
-                ratio = tracking.quantity_ratio
-                total_calories += item.calories * ratio
-                total_protein += item.protein * ratio
-                total_carbs += item.carbs * ratio
-                total_fat += item.fat * ratio
+# ---------------- NUTRITION SUMMARY FOR DATE RANGE ---------------- #
+# Longest window one summary request may cover
+NUTRITION_SUMMARY_MAX_DAYS = 366
 
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_nutrition_summary(request):
+    """
+    What the user ate from `start` to `end` (inclusive): overall, per day and per meal type
+
+    Computed from meal items and their latest tracking in one aggregate
+    query (see nutrition.nutrition_summary). `start` defaults to 6 days
+    before `end`, `end` to today.
+    """
+    try:
+        end_date = date.fromisoformat(request.GET['end']) if request.GET.get('end') else date.today()
+        start_date = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end_date - timedelta(days=6)
+    except ValueError:
+        return Response({"error": "start and end must be dates (YYYY-MM-DD)"}, status=400)
+    
+    if end_date < start_date:
+        return Response({"error": "end must not be before start"}, status=400)
+    if (end_date - start_date).days >= NUTRITION_SUMMARY_MAX_DAYS:
+        return Response({"error": f"The window may cover at most {NUTRITION_SUMMARY_MAX_DAYS} days"}, status=400)
+    
+    summary = nutrition_summary(request.user, start_date, end_date)
+    
     return Response({
-        "calories": round(total_calories, 1),
-        "protein": round(total_protein, 1),
-        "carbs": round(total_carbs, 1),
-        "fat": round(total_fat, 1)
+        "success": True,
+        "start": str(start_date),
+        "end": str(end_date),
+        "overall": summary["overall"],
+        "days": [{"date": str(day), **totals} for day, totals in summary["days"].items()],
+        "meal_types": summary["meal_types"]
     })
 
 
@@ -255,24 +577,20 @@ def check_active_plan(request):
     user = request.user
     today = date.today()
     
-    # Count future meals (including today)
-    future_meals = MealPlan.objects.filter(user=user, date__gte=today)
+    # Future meals (including today), stored or still in a plan cycle
+    active = plan_cycles.active_plan(user, today)
     
-    if future_meals.exists():
-        # Get date range
-        first_meal = future_meals.order_by('date').first()
-        last_meal = future_meals.order_by('-date').first()
-        
-        total_days = (last_meal.date - first_meal.date).days + 1
-        remaining_days = (last_meal.date - today).days + 1
+    if active:
+        total_days = (active["end_date"] - active["start_date"]).days + 1
+        remaining_days = (active["end_date"] - today).days + 1
         
         return Response({
             "has_active_plan": True,
-            "start_date": str(first_meal.date),
-            "end_date": str(last_meal.date),
+            "start_date": str(active["start_date"]),
+            "end_date": str(active["end_date"]),
             "total_days": total_days,
             "remaining_days": remaining_days,
-            "total_meals": future_meals.count()
+            "total_meals": active["meals"]
         })
     else:
         return Response({
@@ -289,11 +607,11 @@ def generate_meal_image_endpoint(request):
     meal_item_id = request.data.get("meal_item_id")
     
     try:
-        meal_item = MealItem.objects.get(id=meal_item_id)
+        meal_item = MealItem.objects.select_related('meal', 'food').get(id=meal_item_id)
     except MealItem.DoesNotExist:
         return Response({"error": "Meal item not found"}, status=404)
     
-    # Check if image already exists
+    # Check if image already exists (shared by every item of the same dish)
     if meal_item.image_url:
         return Response({
             "success": True,
@@ -303,14 +621,16 @@ def generate_meal_image_endpoint(request):
     
     # Generate new image
     meal_type = meal_item.meal.meal_type
-    image_data = generate_meal_image(meal_item.food_name, meal_type)
+    with llm_metrics.attribute('meal_image', request.user.id):
+        image_data = generate_meal_image(meal_item.food_name, meal_type)
     
     if image_data:
-        # Store as base64
-        import base64
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-        meal_item.image_url = f"data:image/png;base64,{image_base64}"
-        meal_item.save()
+        # Store the file once in the image store; the catalog rows of the dish keep its short URL
+        meal_item.food.image_url = store_image(image_data)
+        meal_item.food.save(update_fields=['image_url'])
+        FoodCatalog.objects.filter(name_hash=meal_item.food.name_hash, image_url__isnull=True).update(
+            image_url=meal_item.food.image_url
+        )
         
         return Response({
             "success": True,
@@ -324,6 +644,32 @@ def generate_meal_image_endpoint(request):
         }, status=500)
 
 
+# ---------------- SERVE MEAL IMAGE ---------------- #
+@require_safe
+def serve_meal_image(request, digest, ext):
+    """
+    Serve a generated meal image from the content-addressed store
+
+    The URL contains the hash of the file, so its content never changes:
+    the digest doubles as a strong ETag and clients may cache it for a year.
+    Public like other media files, since <img> tags don't send the JWT.
+    """
+    etag = f'"{digest}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        patch_cache_control(not_modified, public=True, max_age=31536000, immutable=True)
+        return not_modified
+
+    path = image_path(digest, ext)
+    if not os.path.exists(path):
+        raise Http404("Image not found")
+
+    response = FileResponse(open(path, 'rb'), content_type=CONTENT_TYPES[ext])
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=31536000, immutable=True)
+    return response
+
+
 # ---------------- RECALCULATE MEAL PLAN BASED ON ACTUAL INTAKE ---------------- #
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -331,31 +677,27 @@ def recalculate_meal_plan(request):
     """
     Recalculate remaining meal plan based on what user actually ate
     This provides smart AI adjustments based on user's eating patterns
+
+    By default tracked meals and days already within tolerance of the
+    adjusted target are kept and only the other days are rewritten in place;
+    mode="replace" regenerates every remaining day.
     """
-    from .ai_meal_planner import recalculate_meal_plan as ai_recalculate
+    from .ai_meal_planner import recalculate_meal_plan as ai_recalculate, recalculation_adjustment
+    from .recalculation import recalculate_plan_in_place
     
     user = request.user
     today = date.today()
     
     # Get user's eating data from the last 7 days
     last_week = today - timedelta(days=7)
-    meals = MealPlan.objects.filter(user=user, date__gte=last_week, date__lt=today)
-    
-    total_calories = total_protein = total_carbs = total_fat = 0
-    days_with_data = set()
-    
-    for meal in meals:
-        days_with_data.add(meal.date)
-        for item in meal.items.all():
-            tracking = MealItemTracking.objects.filter(meal_item=item).order_by('-timestamp').first()
-            if tracking and tracking.status == "eaten":
-                ratio = tracking.quantity_ratio
-                total_calories += item.calories * ratio
-                total_protein += item.protein * ratio
-                total_carbs += item.carbs * ratio
-                total_fat += item.fat * ratio
-    
-    days_tracked = len(days_with_data)
+    yesterday = today - timedelta(days=1)
+    summary = nutrition_summary(user, last_week, yesterday)
+    totals = summary["overall"]
+    total_calories = totals["calories"]
+    total_protein = totals["protein"]
+    total_carbs = totals["carbs"]
+    total_fat = totals["fat"]
+    days_tracked = len(summary["days"])
     
     if days_tracked == 0:
         return Response({
@@ -389,67 +731,81 @@ def recalculate_meal_plan(request):
     }
     
     # Get remaining days in current plan
-    future_meals = MealPlan.objects.filter(user=user, date__gte=today)
-    if not future_meals.exists():
+    active = plan_cycles.active_plan(user, today)
+    if not active:
         return Response({
             "error": "No active meal plan found. Please generate a new meal plan first."
         }, status=400)
     
     # Count unique future dates
-    future_dates = future_meals.values_list('date', flat=True).distinct()
-    remaining_days = len(future_dates)
-    
-    # Delete future meals (we'll replace them with recalculated ones)
-    MealPlan.objects.filter(user=user, date__gte=today).delete()
-    
-    # Get recalculated plan from AI
-    result = ai_recalculate(
-        user_intake_data=user_intake_data,
-        target_calories=target_calories,
-        diet_type=request.data.get("diet_type", "none"),
-        allergies=request.data.get("allergies", ""),
-        goal=user.fitness_goal or "maintain",
-        remaining_days=remaining_days
-    )
+    remaining_days = active["days"]
+    
+    # "diff" (default) keeps tracked and on-target days and updates the rest in
+    # place; "replace" regenerates every remaining day
+    mode = request.data.get("mode", "diff")
+    if mode not in ("diff", "replace"):
+        return Response({"error": "mode must be 'diff' or 'replace'"}, status=400)
+    
+    with llm_metrics.attribute('recalculate_meal_plan', user.id):
+        if mode == "diff":
+            adjustment = recalculation_adjustment(user_intake_data, target_calories)
+            result = recalculate_plan_in_place(
+                user,
+                today,
+                adjustment['adjusted_calories'],
+                diet_type=request.data.get("diet_type", "none"),
+                allergies=request.data.get("allergies", ""),
+                goal=user.fitness_goal or "maintain",
+                feedback=adjustment['feedback']
+            )
+            # Days of a plan cycle that have no rows yet follow the rescaled cycle
+            stored_days = sum(result['days'].values())
+            result['days']['cycle'] = (
+                remaining_days - stored_days
+                if plan_cycles.rescale_cycles(user, today, adjustment['adjusted_calories']) else 0
+            )
+            result.update(adjustment, original_target=target_calories)
+            days_recalculated = remaining_days - result['days']['kept']
+        else:
+            existing_items = MealItem.objects.for_user_dates(user, today).count()
+            result = ai_recalculate(
+                user_intake_data=user_intake_data,
+                target_calories=target_calories,
+                diet_type=request.data.get("diet_type", "none"),
+                allergies=request.data.get("allergies", ""),
+                goal=user.fitness_goal or "maintain",
+                remaining_days=plan_cycles.generated_days(remaining_days)
+            )
+            # Replace future meals with the recalculated plan in one transaction
+            plan_cycles.save_plan(user, result['meal_plan'], today, remaining_days, replace_from=today)
+            new_items = MealItem.objects.for_user_dates(user, today).count()
+            result['rows'] = {"kept": 0, "updated": 0, "replaced": existing_items + new_items}
+            days_recalculated = remaining_days
     
-    # Save the new recalculated plan
-    plan = result['meal_plan']
-    for d in range(remaining_days):
-        day_date = today + timedelta(days=d)
-        for meal_type, items in plan[str(d+1)].items():
-            meal = MealPlan.objects.create(user=user, date=day_date, meal_type=meal_type)
-            
-            for food in items:
-                MealItem.objects.create(
-                    meal=meal,
-                    food_name=food["name"],
-                    calories=food["calories"],
-                    protein=food["protein"],
-                    carbs=food["carbs"],
-                    fat=food["fat"]
-                )
+    image_warmer.schedule_image_warming(user, today)
     
-    return Response({
+    response = {
         "success": True,
         "message": "Meal plan recalculated based on your eating patterns",
+        "mode": mode,
         "adjustment_note": result['adjustment_note'],
         "adjusted_calories": result['adjusted_calories'],
         "original_target": result['original_target'],
-        "days_recalculated": remaining_days,
+        "days_recalculated": days_recalculated,
+        "rows": result['rows'],
         "your_avg_daily_intake": round(total_calories / days_tracked, 1),
         "days_analyzed": days_tracked
-    })
+    }
+    if mode == "diff":
+        response["days"] = result['days']
+    return Response(response)
 
 
 # ---------------- AI WORKOUT PLANNER ---------------- #
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def generate_ai_workout_plan(request):
-    """Generate personalized AI workout plan and store in database"""
-    from google import genai
-    import os
-    import json
-    from health_data.models import Workout
+    """Queue a personalized AI workout plan (stored in database by the worker)"""
     from datetime import date as dt
     
     user = request.user
@@ -460,18 +816,15 @@ def generate_ai_workout_plan(request):
             "error": "Please complete your profile with height, weight, date of birth, and gender"
         }, status=400)
     
-    # Calculate age and BMI
+    try:
+        fresh = request_flag(request, "fresh")  # Skip the generation cache
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    
+    # Calculate age
     today = dt.today()
     age = request.data.get("age") or (today.year - user.date_of_birth.year - ((today.month, today.day) < (user.date_of_birth.month, user.date_of_birth.day)))
-    weight = request.data.get("weight", user.weight)
-    height = request.data.get("height", user.height)
     
-    height_m = height / 100
-    bmi = weight / (height_m * height_m)
-    
-    # Get fitness level and goal
-    fitness_level = request.data.get("fitness_level", "intermediate")
-    goal = request.data.get("goal") or user.fitness_goal or "general_fitness"
     duration = request.data.get("duration", "7_days")  # 7_days, 1_month, 3_months
     
     # Map duration to days
@@ -480,115 +833,30 @@ def generate_ai_workout_plan(request):
         "1_month": 30,
         "3_months": 90
     }
-    num_days = duration_map.get(duration, 7)
-    
-    # Get health data from request (from Health Connect or defaults)
-    avg_steps = request.data.get("avg_steps", 5000)
-    sleep_hours = request.data.get("sleep_hours", 7)
-    spo2 = request.data.get("spo2", 98)
-    
-    # Configure Gemini with new API
-    client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
-    
-    # Create enhanced prompt with health data
-    prompt = f"""Generate a {num_days}-day personalized workout plan in JSON format for:
-    
-User Profile:
-- Age: {age}
-- Gender: {user.gender}
-- Weight: {weight} kg
-- Height: {height} cm
-- BMI: {bmi:.1f}
-- Fitness Level: {fitness_level}
-- Goal: {goal}
-
-Health Data:
-- Average Daily Steps: {avg_steps}
-- Average Sleep: {sleep_hours} hours
-- SpO2 Level: {spo2}%
-
-Requirements:
-1. Create a {num_days}-day workout program with variety
-2. Each day should have 6-8 exercises with specific workout types
-3. Include workout type for each exercise (cardio, strength, flexibility, hiit, yoga, core)
-4. Consider their activity level (steps) when designing intensity
-5. Include rest days appropriately (1-2 per week)
-6. Mix different workout types throughout the week
-7. Provide specific reps/duration for each exercise
-8. Calculate total workout duration and estimated calories burned for each day
-9. Progress difficulty gradually over the {num_days} days
-
-Return ONLY valid JSON in this exact format (NO markdown, NO backticks):
-{{
-    "plan_title": "Personalized {num_days}-Day Workout Plan",
-    "total_days": {num_days},
-    "days": [
-        {{
-            "day_number": 1,
-            "day_name": "Day 1 - Full Body",
-            "is_rest_day": false,
-            "total_duration_minutes": 45,
-            "total_calories": 350,
-            "exercises": [
-                {{
-                    "name": "Exercise name",
-                    "workout_type": "cardio",
-                    "reps_or_duration": "3 sets of 12 reps" or "5 minutes",
-                    "calories": 50
-                }}
-            ]
-        }}
-    ]
-}}"""
     
-    try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=prompt
-        )
-        response_text = response.text.strip()
-        
-        # Extract JSON from response
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        workout_plan = json.loads(response_text)
-        
-        # Store in database - store the entire multi-day plan
-        workout = Workout.objects.create(
-            user=user,
-            workout_name=workout_plan.get('plan_title', f'{num_days}-Day Workout Plan'),
-            workout_type='AI Generated',
-            duration=num_days,  # Store number of days
-            calories_burned=sum([day.get('total_calories', 0) for day in workout_plan.get('days', [])]),
-            intensity='moderate',
-            date=today,
-            description=json.dumps(workout_plan.get('days', []))  # Store all days
-        )
-        
-        return Response({
-            "success": True,
-            "workout_plan": workout_plan,
-            "workout_id": workout.id
-        })
-        
-    except Exception as e:
-        return Response({
-            "error": f"Failed to generate workout plan: {str(e)}"
-        }, status=500)
+    job = enqueue_job(user, 'workout_plan', {
+        "age": age,
+        "weight": request.data.get("weight", user.weight),
+        "height": request.data.get("height", user.height),
+        "fitness_level": request.data.get("fitness_level", "intermediate"),
+        "goal": request.data.get("goal") or user.fitness_goal or "general_fitness",
+        "num_days": duration_map.get(duration, 7),
+        # Health data from request (from Health Connect or defaults)
+        "avg_steps": request.data.get("avg_steps", 5000),
+        "sleep_hours": request.data.get("sleep_hours", 7),
+        "spo2": request.data.get("spo2", 98),
+        "start_date": str(today),
+        "fresh": fresh
+    })
+    
+    return job_accepted_response(job)
 
 
 # ---------------- AI MARATHON TRAINING PLANNER ---------------- #
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def generate_ai_marathon_plan(request):
-    """Generate personalized AI marathon training plan and store in database"""
-    from google import genai
-    import os
-    import json
-    from health_data.models import Marathon
+    """Queue a personalized AI marathon training plan (stored in database by the worker)"""
     from datetime import date as dt, timedelta, datetime
     
     user = request.user
@@ -599,24 +867,15 @@ def generate_ai_marathon_plan(request):
             "error": "Please complete your profile with height, weight, date of birth, and gender"
         }, status=400)
     
-    # Calculate age and BMI
+    try:
+        fresh = request_flag(request, "fresh")  # Skip the generation cache
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    
+    # Calculate age
     today = dt.today()
     age = request.data.get("age") or (today.year - user.date_of_birth.year - ((today.month, today.day) < (user.date_of_birth.month, user.date_of_birth.day)))
     
-    height_m = user.height / 100
-    bmi = user.weight / (height_m * height_m)
-    
-    # Get training parameters
-    experience_level = request.data.get("experience_level", "beginner")
-    target_distance = request.data.get("target_distance", "half_marathon")  # half_marathon, full_marathon, 10k
-    
-    # Get health data from request (from Health Connect or defaults)
-    avg_steps = request.data.get("avg_steps", 5000)
-    spo2 = request.data.get("spo2", 98)
-    resting_heart_rate = request.data.get("resting_heart_rate", 70)
-    sleep_hours = request.data.get("sleep_hours", 7)
-    goal_time_hours = request.data.get("goal_time_hours", 4)
-    
     # Get marathon date
     marathon_date_str = request.data.get("marathon_date")
     if marathon_date_str:
@@ -627,100 +886,22 @@ def generate_ai_marathon_plan(request):
     else:
         target_date = today + timedelta(days=90)
     
-    weeks_until_marathon = max(1, (target_date - today).days // 7)
-    
-    # Configure Gemini with new API
-    client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
-    
-    # Create enhanced prompt with health data
-    prompt = f"""Generate a personalized weekly marathon training plan in JSON format for:
-    
-User Profile:
-- Age: {age}
-- Gender: {user.gender}
-- Weight: {user.weight} kg
-- Height: {user.height} cm
-- BMI: {bmi:.1f}
-- Experience Level: {experience_level}
-- Target: {target_distance}
-
-Health Data:
-- Average Daily Steps: {avg_steps}
-- SpO2 Level: {spo2}%
-- Resting Heart Rate: {resting_heart_rate} BPM
-- Average Sleep: {sleep_hours} hours
-
-Training Goals:
-- Goal Time: {goal_time_hours} hours
-- Marathon Date: {target_date}
-- Weeks Until Marathon: {weeks_until_marathon}
-
-Requirements:
-1. Create a 7-day weekly training schedule appropriate for Week 1
-2. Consider their current fitness level (steps, heart rate) when designing intensity
-3. Include different run types (easy run, tempo run, long run, rest day, cross-training)
-4. Provide specific distances for each run based on their experience level
-5. Calculate weekly mileage and estimated calories burned
-6. Balance training with recovery considering their sleep patterns
-7. Design the plan to help them achieve their goal time
-
-Return ONLY valid JSON in this exact format (NO markdown, NO backticks):
-{{
-    "plan_title": "Marathon Training Plan - Week 1",
-    "weekly_mileage_km": 35,
-    "workouts_per_week": 5,
-    "estimated_weekly_calories": 2500,
-    "weekly_schedule": [
-        {{
-            "day": "Monday",
-            "run_type": "Easy Run",
-            "distance_km": 5,
-            "notes": "Comfortable pace"
-        }},
-        {{
-            "day": "Tuesday",
-            "run_type": "Rest Day",
-            "distance_km": 0,
-            "notes": "Recovery and stretching"
-        }}
-    ]
-}}"""
+    job = enqueue_job(user, 'marathon_plan', {
+        "age": age,
+        "experience_level": request.data.get("experience_level", "beginner"),
+        "target_distance": request.data.get("target_distance", "half_marathon"),  # half_marathon, full_marathon, 10k
+        # Health data from request (from Health Connect or defaults)
+        "avg_steps": request.data.get("avg_steps", 5000),
+        "spo2": request.data.get("spo2", 98),
+        "resting_heart_rate": request.data.get("resting_heart_rate", 70),
+        "sleep_hours": request.data.get("sleep_hours", 7),
+        "goal_time_hours": request.data.get("goal_time_hours", 4),
+        "target_date": str(target_date),
+        "start_date": str(today),
+        "fresh": fresh
+    })
     
-    try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=prompt
-        )
-        response_text = response.text.strip()
-        
-        # Extract JSON from response
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        marathon_plan = json.loads(response_text)
-        
-        # Store in database
-        marathon = Marathon.objects.create(
-            user=user,
-            marathon_name=marathon_plan.get('plan_title', 'AI Marathon Plan'),
-            distance=marathon_plan.get('weekly_mileage_km', 0),
-            target_date=target_date,
-            status='training',
-            notes=json.dumps(marathon_plan.get('weekly_schedule', []))
-        )
-        
-        return Response({
-            "success": True,
-            "marathon_plan": marathon_plan,
-            "marathon_id": marathon.id
-        })
-        
-    except Exception as e:
-        return Response({
-            "error": f"Failed to generate marathon plan: {str(e)}"
-        }, status=500)
+    return job_accepted_response(job)
 
 
 # ---------------- GET USER'S WORKOUT PLANS ---------------- #
@@ -731,14 +912,12 @@ def get_user_workout_plans(request):
     from health_data.models import Workout
     
     user = request.user
-    workouts = Workout.objects.filter(user=user).order_by('-created_at')[:10]
+    workouts = list(Workout.objects.filter(user=user).order_by('-created_at')[:10])
+    days_by_workout = workout_storage.plan_days(workouts)
     
     plans = []
     for workout in workouts:
-        try:
-            exercises = json.loads(workout.description) if workout.description else []
-        except:
-            exercises = []
+        exercises = workout_storage.plan_entries(days_by_workout[workout.id])
         
         plans.append({
             'id': workout.id,
@@ -791,101 +970,14 @@ def get_user_marathon_plans(request):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def regenerate_workout_plan(request):
-    """Regenerate workout plan based on user's workout history and behavior"""
-    from health_data.models import Workout
-    from datetime import timedelta, date as dt
-    from google import genai
-    import os
-    import json
-    
-    user = request.user
-    today = dt.today()
-    last_30_days = today - timedelta(days=30)
-    
-    # Get user's workout history from Workout table (completed AI workouts)
-    completed_workouts = Workout.objects.filter(
-        user=user,
-        workout_type='AI Generated',
-        date__gte=last_30_days
-    )
+    """Queue a workout plan adapted to the user's workout history and behavior"""
+    from datetime import date as dt
     
-    # Analyze user behavior from completed workouts
-    total_workouts = completed_workouts.count()
-    total_calories = sum([w.calories_burned for w in completed_workouts])
-    avg_duration = sum([w.duration for w in completed_workouts]) / total_workouts if total_workouts > 0 else 0
-    
-    # Calculate age and BMI
-    age = today.year - user.date_of_birth.year
-    height_m = user.height / 100
-    bmi = user.weight / (height_m * height_m)
-    
-    # Configure Gemini with new API
-    client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
-    
-    # Create adaptive prompt
-    prompt = f"""Generate an ADAPTIVE workout plan based on user's actual behavior:
-
-User Profile:
-- Age: {age}, Gender: {user.gender}
-- Weight: {user.weight} kg, Height: {user.height} cm, BMI: {bmi:.1f}
-- Goal: {user.fitness_goal or 'general_fitness'}
-
-User's Last 30 Days Activity:
-- Total Workouts Completed: {total_workouts}
-- Total Calories Burned: {total_calories}
-- Average Workout Duration: {avg_duration:.0f} minutes
-
-ADAPT the plan to:
-1. Match their actual workout frequency
-2. Progress gradually from their current level
-3. Challenge them appropriately based on their consistency
-
-Return ONLY valid JSON (NO markdown):
-{{
-    "plan_title": "Adaptive Workout Plan",
-    "total_duration_minutes": 45,
-    "total_calories": 350,
-    "exercise_count": 8,
-    "adaptation_note": "Brief note on how this plan adapts to their behavior",
-    "exercises": [
-        {{"name": "Exercise", "workout_type": "cardio", "reps_or_duration": "3x12", "calories": 50}}
-    ]
-}}"""
+    job = enqueue_job(request.user, 'adaptive_workout', {
+        "start_date": str(dt.today())
+    })
     
-    try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=prompt
-        )
-        response_text = response.text.strip().replace("```json", "").replace("```", "").strip()
-        workout_plan = json.loads(response_text)
-        
-        # Store in database
-        workout = Workout.objects.create(
-            user=user,
-            workout_name=workout_plan.get('plan_title', 'Adaptive Workout Plan'),
-            workout_type='AI Adaptive',
-            duration=workout_plan.get('total_duration_minutes', 0),
-            calories_burned=workout_plan.get('total_calories', 0),
-            intensity='moderate',
-            date=today,
-            description=json.dumps(workout_plan.get('exercises', []))
-        )
-        
-        return Response({
-            "success": True,
-            "workout_plan": workout_plan,
-            "workout_id": workout.id,
-            "user_stats": {
-                "total_workouts_last_30_days": total_workouts,
-                "avg_duration": round(avg_duration, 1)
-            }
-        })
-        
-    except Exception as e:
-        return Response({
-            "error": f"Failed to regenerate workout plan: {str(e)}"
-        }, status=500)
+    return job_accepted_response(job)
 
 
 # ---------------- DELETE CURRENT MEAL PLAN ---------------- #
@@ -896,30 +988,25 @@ def delete_current_meal_plan(request):
     user = request.user
     today = date.today()
     
-    # Get count of meals to be deleted
-    future_meals = MealPlan.objects.filter(user=user, date__gte=today)
-    meal_count = future_meals.count()
+    # Get count and date range of meals to be deleted
+    active = plan_cycles.active_plan(user, today)
     
-    if meal_count == 0:
+    if not active:
         return Response({
             "success": False,
             "message": "No active meal plan found"
         }, status=404)
     
-    # Get date range for info
-    first_meal = future_meals.order_by('date').first()
-    last_meal = future_meals.order_by('-date').first()
-    
-    # Delete all future meals
-    future_meals.delete()
+    # Delete all future meals, including days of a plan cycle not stored yet
+    delete_meals_from(user, today)
     
     return Response({
         "success": True,
         "message": f"Meal plan deleted successfully",
-        "deleted_meals": meal_count,
+        "deleted_meals": active["meals"],
         "date_range": {
-            "start": str(first_meal.date),
-            "end": str(last_meal.date)
+            "start": str(active["start_date"]),
+            "end": str(active["end_date"])
         }
     })
 
@@ -943,50 +1030,32 @@ def get_active_workout_plan(request):
             'message': 'No workout plan found'
         })
     
-    # Parse days from description (new multi-day format)
+    # Plan days and exercises from their indexed rows, difficulty rows in one query;
+    # completion and progress come with the workout row
     try:
-        days = json.loads(workout.description) if workout.description else []
+        days = workout_storage.plan_days([workout])[workout.id]
+        tracking = tracking_map(WorkoutExerciseTracking.objects.filter(workout=workout), 'exercise_index')
+        completed_bits = completion.as_int(workout.completion_bits)
         
         # Check if it's the new multi-day format
-        if days and isinstance(days, list) and len(days) > 0 and 'day_number' in days[0]:
+        if days and days[0].day_number != 0:
             # Multi-day format
             days_with_tracking = []
-            total_exercises = 0
-            completed_exercises = 0
             
             for day in days:
-                day_exercises = []
-                for idx, exercise in enumerate(day.get('exercises', [])):
-                    exercise_global_index = total_exercises + idx
-                    tracking = WorkoutExerciseTracking.objects.filter(
-                        workout=workout, 
-                        exercise_index=exercise_global_index
-                    ).first()
-                    
-                    day_exercises.append({
-                        'index': exercise_global_index,
-                        'name': exercise.get('name', ''),
-                        'workout_type': exercise.get('workout_type', 'general'),
-                        'reps_or_duration': exercise.get('reps_or_duration', ''),
-                        'calories': exercise.get('calories', 0),
-                        'completed': tracking.completed if tracking else False,
-                        'difficulty': tracking.difficulty if tracking else None
-                    })
-                    
-                    if tracking and tracking.completed:
-                        completed_exercises += 1
-                
-                total_exercises += len(day.get('exercises', []))
+                day_exercises = serialize_exercises(day.exercise_rows, completed_bits, tracking)
                 
                 days_with_tracking.append({
-                    'day_number': day.get('day_number', 0),
-                    'day_name': day.get('day_name', ''),
-                    'is_rest_day': day.get('is_rest_day', False),
-                    'total_duration_minutes': day.get('total_duration_minutes', 0),
-                    'total_calories': day.get('total_calories', 0),
+                    'day_number': day.day_number,
+                    'day_name': day.day_name,
+                    'is_rest_day': day.is_rest_day,
+                    'total_duration_minutes': day.total_duration_minutes,
+                    'total_calories': day.total_calories,
                     'exercises': day_exercises
                 })
             
+            completed_exercises = workout.completed_count
+            total_exercises = workout.completion_total
             all_completed = completed_exercises == total_exercises
             
             return Response({
@@ -1005,21 +1074,10 @@ def get_active_workout_plan(request):
             })
         else:
             # Old single-day format (backward compatibility)
-            exercises = days  # In old format, it's just exercises array
-            exercises_with_tracking = []
-            for idx, exercise in enumerate(exercises):
-                tracking = WorkoutExerciseTracking.objects.filter(workout=workout, exercise_index=idx).first()
-                exercises_with_tracking.append({
-                    'index': idx,
-                    'name': exercise.get('name', ''),
-                    'workout_type': exercise.get('workout_type', 'general'),
-                    'reps_or_duration': exercise.get('reps_or_duration', ''),
-                    'calories': exercise.get('calories', 0),
-                    'completed': tracking.completed if tracking else False,
-                    'difficulty': tracking.difficulty if tracking else None
-                })
+            exercises = days[0].exercise_rows if days else []  # Stored as a single day 0
+            exercises_with_tracking = serialize_exercises(exercises, completed_bits, tracking)
             
-            all_completed = all(e['completed'] for e in exercises_with_tracking)
+            all_completed = workout.completed_count == workout.completion_total
             
             return Response({
                 'has_active_plan': True,
@@ -1045,47 +1103,45 @@ def get_active_workout_plan(request):
 def track_workout_exercise(request):
     """Mark a workout exercise as completed and log calories"""
     from health_data.models import Workout, HealthData
-    from .models import WorkoutExerciseTracking
-    from django.utils import timezone
+    from .models import WorkoutPlanExercise
     from datetime import date as dt
     
     workout_id = request.data.get('workout_id')
     exercise_index = request.data.get('exercise_index')
-    completed = request.data.get('completed', True)
     
     try:
-        workout = Workout.objects.get(id=workout_id, user=request.user)
-    except Workout.DoesNotExist:
-        return Response({'error': 'Workout not found'}, status=404)
-    
-    # Create or update tracking
-    tracking, created = WorkoutExerciseTracking.objects.get_or_create(
-        workout=workout,
-        exercise_index=exercise_index,
-        defaults={'completed': completed, 'completed_at': timezone.now() if completed else None}
-    )
-    
-    if not created:
-        tracking.completed = completed
-        tracking.completed_at = timezone.now() if completed else None
-        tracking.save()
-    
-    # Log calories to daily progress if completed
-    if completed:
+        workout_id, exercise_index = int(workout_id), int(exercise_index)
+    except (TypeError, ValueError):
+        return Response({'error': 'workout_id and exercise_index must be integers'}, status=400)
+    try:
+        completed = completion.parse_completed(request.data.get('completed'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    if exercise_index < 0:
+        return Response({'error': 'exercise_index must not be negative'}, status=400)
+    
+    # Set the exercise's bit in the workout's completion bitset under a row lock
+    result = completion.set_completed(Workout, workout_id, request.user, exercise_index, completed)
+    if result is None:
+        # Unknown workout, or a bitset not sized for the index yet: size it and retry once
+        workout = Workout.objects.filter(id=workout_id, user=request.user).first()
+        if not workout:
+            return Response({'error': 'Workout not found'}, status=404)
+        completion.resize(workout, workout_storage.exercise_count(workout))
+        result = completion.set_completed(Workout, workout_id, request.user, exercise_index, completed)
+        if result is None:
+            return Response({'error': 'Exercise index out of range'}, status=400)
+    completed_count, total_exercises, changed = result
+    
+    # Log calories to daily progress only when this request completed the exercise
+    if completed and changed:
         try:
-            days = json.loads(workout.description) if workout.description else []
+            # One indexed lookup by global exercise index (multi-day and single-day plans)
+            exercise_calories = WorkoutPlanExercise.objects.filter(
+                workout_id=workout_id,
+                exercise_index=exercise_index
+            ).values_list('calories', flat=True).first() or 0
             
-            # Find the exercise and its calories
-            exercise_calories = 0
-            if days and isinstance(days, list) and len(days) > 0 and 'day_number' in days[0]:
-                # Multi-day format
-                for day in days:
-                    for ex in day.get('exercises', []):
-                        # Match by global index (we need to calculate it)
-                        pass  # Will calculate below
-            
-            # For now, get calories from the exercise data
-            # We'll need to parse the workout structure to find the exact exercise
             today = dt.today()
             health_data, _ = HealthData.objects.get_or_create(
                 user=request.user,
@@ -1093,47 +1149,16 @@ def track_workout_exercise(request):
                 defaults={'steps': 0, 'calories_burned': 0, 'distance': 0, 'active_minutes': 0}
             )
             
-            # Parse workout to find exercise calories
-            if days and isinstance(days, list):
-                if len(days) > 0 and 'day_number' in days[0]:
-                    # Multi-day format - find exercise by index
-                    current_index = 0
-                    for day in days:
-                        for ex in day.get('exercises', []):
-                            if current_index == exercise_index:
-                                exercise_calories = ex.get('calories', 0)
-                                break
-                            current_index += 1
-                        if exercise_calories > 0:
-                            break
-                else:
-                    # Single day format
-                    if exercise_index < len(days):
-                        exercise_calories = days[exercise_index].get('calories', 0)
-            
             if exercise_calories > 0:
                 health_data.calories_burned += exercise_calories
                 health_data.save()
         except Exception as e:
             pass  # Don't fail the tracking if calorie logging fails
     
-    # Check if all exercises are completed
-    try:
-        exercises = json.loads(workout.description) if workout.description else []
-        if exercises and isinstance(exercises, list) and len(exercises) > 0 and 'day_number' in exercises[0]:
-            # Multi-day format
-            total_exercises = sum(len(day.get('exercises', [])) for day in exercises)
-        else:
-            total_exercises = len(exercises)
-        completed_count = WorkoutExerciseTracking.objects.filter(workout=workout, completed=True).count()
-        all_completed = completed_count == total_exercises
-    except:
-        all_completed = False
-    
     return Response({
         'success': True,
-        'completed': tracking.completed,
-        'all_completed': all_completed
+        'completed': completed,
+        'all_completed': completed_count == total_exercises
     })
 
 
@@ -1154,8 +1179,18 @@ def complete_workout_plan(request):
     except Workout.DoesNotExist:
         return Response({'error': 'Workout not found'}, status=404)
     
-    # Update all tracking with difficulty feedback
+    # Record the difficulty on the existing detail rows and on every completed exercise
     WorkoutExerciseTracking.objects.filter(workout=workout).update(difficulty=overall_difficulty)
+    if overall_difficulty:
+        WorkoutExerciseTracking.objects.bulk_create(
+            [
+                WorkoutExerciseTracking(workout=workout, exercise_index=index, difficulty=overall_difficulty)
+                for index in completion.indices(workout.completion_bits)
+            ],
+            update_conflicts=True,
+            unique_fields=['workout', 'exercise_index'],
+            update_fields=['difficulty']
+        )
     
     return Response({
         'success': True,
@@ -1193,22 +1228,26 @@ def get_active_marathon_plan(request):
     except:
         schedule = []
     
-    # Get tracking status for each day
-    days_with_tracking = []
-    for idx, day in enumerate(schedule):
-        tracking = MarathonDayTracking.objects.filter(marathon=marathon, day_index=idx).first()
-        days_with_tracking.append({
-            'index': idx,
-            'day': day.get('day', ''),
-            'run_type': day.get('run_type', ''),
-            'distance_km': day.get('distance_km', 0),
-            'notes': day.get('notes', ''),
-            'completed': tracking.completed if tracking else False,
-            'difficulty': tracking.difficulty if tracking else None
-        })
+    # Completion from the marathon's bitset, difficulty rows in one query
+    tracking = tracking_map(MarathonDayTracking.objects.filter(marathon=marathon), 'day_index')
+    completed_bits = completion.as_int(marathon.completion_bits)
+    days_with_tracking = [
+        serialize_tracked(
+            idx,
+            {
+                'day': day.get('day', ''),
+                'run_type': day.get('run_type', ''),
+                'distance_km': day.get('distance_km', 0),
+                'notes': day.get('notes', '')
+            },
+            completion.is_set(completed_bits, idx),
+            tracking.get(idx)
+        )
+        for idx, day in enumerate(schedule)
+    ]
     
     # Check if all days are completed
-    all_completed = all(d['completed'] for d in days_with_tracking)
+    all_completed = marathon.completed_count == marathon.completion_total
     
     return Response({
         'has_active_plan': True,
@@ -1228,45 +1267,50 @@ def get_active_marathon_plan(request):
 def track_marathon_day(request):
     """Mark a marathon training day as completed and log calories/distance"""
     from health_data.models import Marathon, HealthData
-    from .models import MarathonDayTracking
-    from django.utils import timezone
     from datetime import date as dt
     
     marathon_id = request.data.get('marathon_id')
     day_index = request.data.get('day_index')
-    completed = request.data.get('completed', True)
     
     try:
-        marathon = Marathon.objects.get(id=marathon_id, user=request.user)
-    except Marathon.DoesNotExist:
-        return Response({'error': 'Marathon plan not found'}, status=404)
-    
-    # Create or update tracking
-    tracking, created = MarathonDayTracking.objects.get_or_create(
-        marathon=marathon,
-        day_index=day_index,
-        defaults={'completed': completed, 'completed_at': timezone.now() if completed else None}
-    )
-    
-    if not created:
-        tracking.completed = completed
-        tracking.completed_at = timezone.now() if completed else None
-        tracking.save()
-    
-    # Log calories and distance to daily progress if completed
-    if completed:
+        marathon_id, day_index = int(marathon_id), int(day_index)
+    except (TypeError, ValueError):
+        return Response({'error': 'marathon_id and day_index must be integers'}, status=400)
+    try:
+        completed = completion.parse_completed(request.data.get('completed'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    if day_index < 0:
+        return Response({'error': 'day_index must not be negative'}, status=400)
+    
+    # Set the day's bit in the marathon's completion bitset under a row lock
+    result = completion.set_completed(Marathon, marathon_id, request.user, day_index, completed)
+    if result is None:
+        # Unknown plan, or a bitset not sized for the day yet: size it and retry once
+        marathon = Marathon.objects.filter(id=marathon_id, user=request.user).first()
+        if not marathon:
+            return Response({'error': 'Marathon plan not found'}, status=404)
+        completion.resize(marathon, completion.schedule_length(marathon))
+        result = completion.set_completed(Marathon, marathon_id, request.user, day_index, completed)
+        if result is None:
+            return Response({'error': 'Day index out of range'}, status=400)
+    completed_count, total_days, changed = result
+    
+    # Log calories and distance to daily progress only when this request completed the day
+    if completed and changed:
         try:
-            schedule = json.loads(marathon.notes) if marathon.notes else []
+            notes = Marathon.objects.filter(id=marathon_id).values_list('notes', flat=True).first()
+            schedule = json.loads(notes) if notes else []
             
             if day_index < len(schedule):
                 day_data = schedule[day_index]
                 distance_km = day_data.get('distance_km', 0)
                 
                 # Estimate calories burned from running (rough estimate: 60 cal per km)
-                estimated_calories = int(distance_km * 60)
+                estimated_calories = int(distance_km * tracking_batch.MARATHON_KCAL_PER_KM)
                 
                 # Estimate duration (rough estimate: 6 min per km for average pace)
-                estimated_duration = int(distance_km * 6)
+                estimated_duration = int(distance_km * tracking_batch.MARATHON_MINUTES_PER_KM)
                 
                 today = dt.today()
                 health_data, _ = HealthData.objects.get_or_create(
@@ -1282,19 +1326,10 @@ def track_marathon_day(request):
         except Exception as e:
             pass  # Don't fail the tracking if calorie logging fails
     
-    # Check if all days are completed
-    try:
-        schedule = json.loads(marathon.notes) if marathon.notes else []
-        total_days = len(schedule)
-        completed_count = MarathonDayTracking.objects.filter(marathon=marathon, completed=True).count()
-        all_completed = completed_count == total_days
-    except:
-        all_completed = False
-    
     return Response({
         'success': True,
-        'completed': tracking.completed,
-        'all_completed': all_completed
+        'completed': completed,
+        'all_completed': completed_count == total_days
     })
 
 
@@ -1315,8 +1350,18 @@ def complete_marathon_week(request):
     except Marathon.DoesNotExist:
         return Response({'error': 'Marathon plan not found'}, status=404)
     
-    # Update all tracking with difficulty feedback
+    # Record the difficulty on the existing detail rows and on every completed day
     MarathonDayTracking.objects.filter(marathon=marathon).update(difficulty=overall_difficulty)
+    if overall_difficulty:
+        MarathonDayTracking.objects.bulk_create(
+            [
+                MarathonDayTracking(marathon=marathon, day_index=index, difficulty=overall_difficulty)
+                for index in completion.indices(marathon.completion_bits)
+            ],
+            update_conflicts=True,
+            unique_fields=['marathon', 'day_index'],
+            update_fields=['difficulty']
+        )
     
     return Response({
         'success': True,
@@ -1451,15 +1496,26 @@ def get_daily_workout_summary(request):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def generate_daily_workout(request):
-    """Generate workout for TODAY only with progressive difficulty based on feedback"""
-    from google import genai
-    import os
-    import json
+    """
+    Queue a workout for TODAY only with progressive difficulty based on feedback (built at once with engine=local)
+    
+    A workout already stored for today (usually pregenerated overnight, see
+    pregeneration.py) is returned as is unless `fresh` is set.
+    """
     from health_data.models import Workout
-    from datetime import date as dt, timedelta
+    from datetime import date as dt
     
     user = request.user
     today = dt.today()
+    try:
+        fresh = request_flag(request, "fresh")  # Skip the stored workout and the generation cache
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    
+    if not fresh:
+        existing = Workout.objects.filter(user=user, is_daily_plan=True, date=today).order_by('-created_at').first()
+        if existing:
+            return Response({"success": True, "existing": True, "workout": serialize_daily_workout(existing)})
     
     # Validate user profile
     if not user.height or not user.weight or not user.date_of_birth or not user.gender:
@@ -1467,154 +1523,35 @@ def generate_daily_workout(request):
             "error": "Please complete your profile with height, weight, date of birth, and gender"
         }, status=400)
     
-    # Calculate age and BMI
+    # Calculate age
     age = request.data.get("age") or (today.year - user.date_of_birth.year - ((today.month, today.day) < (user.date_of_birth.month, user.date_of_birth.day)))
-    weight = request.data.get("weight", user.weight)
-    height = request.data.get("height", user.height)
-    
-    height_m = height / 100
-    bmi = weight / (height_m * height_m)
-    
-    # Get fitness level and goal
-    fitness_level = request.data.get("fitness_level", "intermediate")
-    goal = request.data.get("goal") or user.fitness_goal or "general_fitness"
-    
-    # Get health data from request
-    avg_steps = request.data.get("avg_steps", 5000)
-    sleep_hours = request.data.get("sleep_hours", 7)
-    spo2 = request.data.get("spo2", 98)
-    
-    # Get yesterday's workout and feedback for progression
-    yesterday = today - timedelta(days=1)
-    prev_workout = Workout.objects.filter(
-        user=user,
-        is_daily_plan=True,
-        date=yesterday
-    ).order_by('-created_at').first()
-    
-    prev_feedback = prev_workout.user_feedback if prev_workout else None
-    prev_day_number = prev_workout.plan_day_number if prev_workout else 0
-    current_day_number = prev_day_number + 1
-    
-    # Determine difficulty adjustment based on feedback
-    difficulty_adjustment = ""
-    if prev_feedback == 'easy':
-        difficulty_adjustment = "INCREASE difficulty by 15%. Add more reps, sets, or weight. User found previous workout too easy."
-    elif prev_feedback == 'difficult':
-        difficulty_adjustment = "DECREASE difficulty by 15%. Reduce reps, sets, or weight. User found previous workout too hard."
-    elif prev_feedback == 'just_right':
-        difficulty_adjustment = "MAINTAIN similar difficulty level. User found previous workout perfect."
-    else:
-        difficulty_adjustment = "This is the first workout. Start with moderate difficulty appropriate for their fitness level."
     
-    # Get previous workout details for context
-    prev_workout_summary = ""
-    if prev_workout:
+    params = {
+        "age": age,
+        "weight": request.data.get("weight", user.weight),
+        "height": request.data.get("height", user.height),
+        "fitness_level": request.data.get("fitness_level", "intermediate"),
+        "goal": request.data.get("goal") or user.fitness_goal or "general_fitness",
+        # Health data from request
+        "avg_steps": request.data.get("avg_steps", 5000),
+        "sleep_hours": request.data.get("sleep_hours", 7),
+        "spo2": request.data.get("spo2", 98),
+        "start_date": str(today),
+        "fresh": fresh
+    }
+
+    if request.data.get("engine") == "local":
+        # Instant workout from the local builder: no model call, no job to poll
+        params["engine"] = "local"
         try:
-            prev_exercises = json.loads(prev_workout.description) if prev_workout.description else []
-            prev_workout_summary = f"\nPrevious Workout (Day {prev_day_number}):\n"
-            prev_workout_summary += f"- Total Duration: {prev_workout.duration} minutes\n"
-            prev_workout_summary += f"- Total Calories: {prev_workout.calories_burned}\n"
-            prev_workout_summary += f"- Exercises: {len(prev_exercises)}\n"
-            prev_workout_summary += f"- User Feedback: {prev_feedback or 'No feedback'}\n"
-        except:
-            prev_workout_summary = ""
-    
-    # Configure Gemini
-    client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
-    
-    # Create prompt for daily workout
-    prompt = f"""Generate a personalized workout for TODAY ONLY (Day {current_day_number}) in JSON format:
-
-User Profile:
-- Age: {age}
-- Gender: {user.gender}
-- Weight: {weight} kg
-- Height: {height} cm
-- BMI: {bmi:.1f}
-- Fitness Level: {fitness_level}
-- Goal: {goal}
-
-Health Data:
-- Average Daily Steps: {avg_steps}
-- Average Sleep: {sleep_hours} hours
-- SpO2 Level: {spo2}%
-
-{prev_workout_summary}
-
-DIFFICULTY ADJUSTMENT:
-{difficulty_adjustment}
-
-Requirements:
-1. Generate 6-8 exercises for TODAY only
-2. Include specific workout types (cardio, strength, flexibility, hiit, yoga, core)
-3. Provide specific reps/duration for each exercise
-4. Calculate estimated calories for each exercise
-5. Total workout should be 30-60 minutes
-6. {difficulty_adjustment}
-7. Ensure variety - don't repeat same exercises as yesterday
-
-Return ONLY valid JSON (NO markdown, NO backticks):
-{{
-    "workout_name": "Day {current_day_number} - [Focus Area]",
-    "total_duration_minutes": 45,
-    "total_calories": 350,
-    "exercises": [
-        {{
-            "name": "Exercise name",
-            "workout_type": "cardio",
-            "reps_or_duration": "3 sets of 12 reps",
-            "calories": 50
-        }}
-    ]
-}}"""
+            payload = generate_daily_workout_payload(user, params)
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(save_daily_workout_payload(user, params, payload))
+
+    job = enqueue_job(user, 'daily_workout', params)
     
-    try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=prompt
-        )
-        response_text = response.text.strip()
-        
-        # Extract JSON
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        workout_data = json.loads(response_text)
-        
-        # Store in database as daily plan
-        workout = Workout.objects.create(
-            user=user,
-            workout_name=workout_data.get('workout_name', f'Day {current_day_number} Workout'),
-            workout_type='Daily Progressive',
-            duration=workout_data.get('total_duration_minutes', 0),
-            calories_burned=workout_data.get('total_calories', 0),
-            intensity='moderate',
-            date=today,
-            description=json.dumps(workout_data.get('exercises', [])),
-            is_daily_plan=True,
-            plan_day_number=current_day_number
-        )
-        
-        return Response({
-            "success": True,
-            "workout": {
-                "id": workout.id,
-                "workout_name": workout.workout_name,
-                "day_number": current_day_number,
-                "total_duration": workout.duration,
-                "total_calories": workout.calories_burned,
-                "exercises": workout_data.get('exercises', []),
-                "previous_feedback": prev_feedback
-            }
-        })
-        
-    except Exception as e:
-        return Response({
-            "error": f"Failed to generate daily workout: {str(e)}"
-        }, status=500)
+    return job_accepted_response(job)
 
 
 # ---------------- COMPLETE DAILY WORKOUT WITH FEEDBACK ---------------- #
@@ -1646,6 +1583,9 @@ def complete_daily_workout(request):
         workout.feedback_notes = notes
         workout.save()
         
+        # A workout pregenerated for the next day didn't know this feedback yet
+        pregeneration.refresh_after_feedback(workout)
+        
         return Response({
             "success": True,
             "message": "Workout completed! Feedback saved.",
@@ -1665,7 +1605,6 @@ def complete_daily_workout(request):
 def get_todays_workout(request):
     """Get today's workout if it exists"""
     from health_data.models import Workout
-    from .models import WorkoutExerciseTracking
     from datetime import date as dt
     
     user = request.user
@@ -1684,49 +1623,37 @@ def get_todays_workout(request):
             'message': 'No workout for today. Generate one!'
         })
     
-    # Parse exercises
-    try:
-        exercises = json.loads(workout.description) if workout.description else []
-    except:
-        exercises = []
-    
-    # Get tracking status for each exercise
-    exercises_with_tracking = []
-    for idx, exercise in enumerate(exercises):
-        tracking = WorkoutExerciseTracking.objects.filter(
-            workout=workout,
-            exercise_index=idx
-        ).first()
-        
-        exercises_with_tracking.append({
-            'index': idx,
-            'name': exercise.get('name', ''),
-            'workout_type': exercise.get('workout_type', 'general'),
-            'reps_or_duration': exercise.get('reps_or_duration', ''),
-            'calories': exercise.get('calories', 0),
-            'completed': tracking.completed if tracking else False
-        })
-    
-    # Check if all exercises are completed
-    all_completed = all(e['completed'] for e in exercises_with_tracking)
-    
     return Response({
         'has_workout': True,
-        'workout': {
-            'id': workout.id,
-            'workout_name': workout.workout_name,
-            'day_number': workout.plan_day_number,
-            'total_duration': workout.duration,
-            'total_calories': workout.calories_burned,
-            'exercises': exercises_with_tracking,
-            'all_completed': all_completed,
-            'has_feedback': workout.user_feedback is not None,
-            'feedback': workout.user_feedback,
-            'created_at': workout.created_at
-        }
+        'workout': serialize_daily_workout(workout)
     })
 
 
+def serialize_daily_workout(workout):
+    """A daily plan workout with its exercises and their completion"""
+    # Exercises from the indexed plan rows (a daily workout is a single day 0)
+    days = workout_storage.plan_days([workout])[workout.id]
+    exercises = [exercise for day in days for exercise in day.exercise_rows]
+    
+    # Completion from the workout's bitset; no difficulty here, so no tracking query
+    exercises_with_tracking = serialize_exercises(
+        exercises, completion.as_int(workout.completion_bits), {}, with_difficulty=False
+    )
+    
+    return {
+        'id': workout.id,
+        'workout_name': workout.workout_name,
+        'day_number': workout.plan_day_number,
+        'total_duration': workout.duration,
+        'total_calories': workout.calories_burned,
+        'exercises': exercises_with_tracking,
+        'all_completed': workout.completed_count == workout.completion_total,
+        'has_feedback': workout.user_feedback is not None,
+        'feedback': workout.user_feedback,
+        'created_at': workout.created_at
+    }
+
+
 # ---------------- CHECK ACTIVE WORKOUT PLAN ---------------- #
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
@@ -1804,3 +1731,117 @@ def check_active_marathon_plan(request):
         'has_active_plan': False,
         'message': 'No active marathon plan'
     })
+
+
+
+# ---------------- GENERATION JOBS ---------------- #
+def job_accepted_response(job):
+    """202 response pointing the client at the job's status and result endpoints"""
+    return Response({
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/ml/jobs/{job.id}/",
+        "result_url": f"/api/ml/jobs/{job.id}/result/"
+    }, status=202)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_generation_job(request, job_id):
+    """Poll the status of a generation job"""
+    try:
+        job = GenerationJob.objects.get(id=job_id, user=request.user)
+    except GenerationJob.DoesNotExist:
+        return Response({"error": "Job not found"}, status=404)
+    
+    return Response({
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error or None,
+        "progress": job.progress or None,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    })
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_generation_job_result(request, job_id):
+    """Fetch the result of a generation job (202 while it is still queued or running)"""
+    try:
+        job = GenerationJob.objects.get(id=job_id, user=request.user)
+    except GenerationJob.DoesNotExist:
+        return Response({"error": "Job not found"}, status=404)
+    
+    if job.status == GenerationJob.STATUS_SUCCEEDED:
+        return Response(job.result)
+    
+    if job.status == GenerationJob.STATUS_FAILED:
+        return Response({"error": job.error}, status=500)
+    
+    return Response({
+        "job_id": job.id,
+        "status": job.status
+    }, status=202)
+
+
+
+# ---------------- GENERATION CACHE STATS ---------------- #
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def generation_cache_stats(request):
+    """Hit/miss counters and stored entries of the Gemini generation cache"""
+    return Response(generation_cache.stats())
+
+
+# ---------------- MEAL IMAGE WARMING STATS ---------------- #
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def image_warming_stats(request):
+    """Progress and hit-rate counters of recent meal image warming jobs"""
+    return Response(image_warmer.stats())
+
+
+# ---------------- LLM METRICS ---------------- #
+@require_safe
+def prometheus_metrics(request):
+    """
+    LLM call metrics of this worker process in the Prometheus text format
+
+    Not behind JWT so Prometheus can scrape it; when METRICS_TOKEN is set the
+    scraper has to send it as a bearer token.
+    """
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=401)
+
+    body = llm_metrics.recorder.render(breaker_state=llm_gateway.stats()["state"])
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def llm_usage(request):
+    """The user's model calls, tokens and estimated cost by endpoint (?days=, default 30)"""
+    try:
+        days = int(request.query_params.get("days", 30))
+    except ValueError:
+        return Response({"error": "days must be a number"}, status=400)
+    return Response(llm_metrics.usage_report(days=max(1, days), user=request.user))
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def llm_usage_by_user(request):
+    """Model calls, tokens and estimated cost per user, most expensive first (?days=, default 30)"""
+    try:
+        days = int(request.query_params.get("days", 30))
+    except ValueError:
+        return Response({"error": "days must be a number"}, status=400)
+    report = llm_metrics.usage_report(days=max(1, days))
+    report["circuit_breaker"] = llm_gateway.stats()
+    return Response(report)
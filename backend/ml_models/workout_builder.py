@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import random
+from functools import lru_cache
+
+
+EXERCISES_PATH = os.path.join(os.path.dirname(__file__), "data", "exercises.json")
+
+FITNESS_LEVELS = ("beginner", "intermediate", "advanced")  # Index = variant used at difficulty 1
+LEVEL_EXERCISES = {"beginner": 6, "intermediate": 7, "advanced": 8}  # The prompt asks for 6-8
+LEVEL_MINUTES = {"beginner": 30, "intermediate": 40, "advanced": 50}  # Session length at difficulty 1
+LEVEL_SETS = {"beginner": 2, "intermediate": 3, "advanced": 4}
+MIN_MINUTES, MAX_MINUTES = 30, 60  # The prompt's 30-60 minute range
+WARMUP_MINUTES = 5
+COOLDOWN_MINUTES = 5
+
+# Previous workout feedback -> difficulty multiplier (the +-15% rule of the daily workout prompt)
+FEEDBACK_ADJUSTMENT = {"easy": 1.15, "just_right": 1.0, "difficult": 0.85}
+MIN_DIFFICULTY, MAX_DIFFICULTY = 0.5, 2.0
+VARIANT_STEP = 0.3      # Difficulty this far above / below 1 moves to the next harder / easier variant
+REFERENCE_MET = 4.5     # Average MET of a session at difficulty 1, the calorie baseline
+HIGH_IMPACT_BMI = 30    # From this BMI on, jumping and running exercises are left out
+MAX_PER_GROUP = 2       # Main exercises working the same muscle group
+
+# Share of the main block per workout type, by goal
+GOAL_TYPE_WEIGHTS = {
+    "lose_weight": {"cardio": 3, "hiit": 3, "strength": 2, "core": 1},
+    "gain_muscle": {"strength": 6, "core": 1, "hiit": 1},
+    "improve_endurance": {"cardio": 4, "hiit": 2, "strength": 1, "core": 1},
+    "flexibility": {"yoga": 3, "flexibility": 3, "core": 1, "strength": 1},
+    "general_fitness": {"cardio": 2, "strength": 2, "core": 1, "hiit": 1, "yoga": 1},
+}
+
+# Words in free-text goals -> GOAL_TYPE_WEIGHTS key; anything else is general fitness
+GOAL_KEYWORDS = (
+    ("lose_weight", ("lose", "loss", "fat", "slim", "cut")),
+    ("gain_muscle", ("muscle", "gain", "strength", "bulk", "tone")),
+    ("improve_endurance", ("endurance", "stamina", "marathon", "run", "cardio")),
+    ("flexibility", ("flex", "yoga", "mobility", "stretch")),
+)
+
+GOAL_FOCUS = {
+    "lose_weight": "Fat Burn",
+    "gain_muscle": "Strength",
+    "improve_endurance": "Endurance",
+    "flexibility": "Mobility",
+    "general_fitness": "Full Body",
+}
+
+
+@lru_cache(maxsize=1)
+def load_exercises():
+    with open(EXERCISES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _goal_key(goal):
+    text = str(goal or "").lower()
+    for key, words in GOAL_KEYWORDS:
+        if any(word in text for word in words):
+            return key
+    return "general_fitness"
+
+
+def _level(fitness_level):
+    level = str(fitness_level or "").lower().strip()
+    return level if level in FITNESS_LEVELS else "intermediate"
+
+
+def _kcal_per_minute(met, weight):
+    return met * 3.5 * weight / 200
+
+
+def baseline_calories(fitness_level, weight):
+    """Calories of a difficulty 1 workout for this level and body weight"""
+    return _kcal_per_minute(REFERENCE_MET, weight) * LEVEL_MINUTES[_level(fitness_level)]
+
+
+def workout_difficulty(fitness_level, weight, previous_feedback=None, previous_calories=None):
+    """
+    Difficulty multiplier of the next daily workout
+
+    The previous workout's difficulty is read from its calories relative to
+    baseline_calories (so it works for model-generated workouts too) and
+    adjusted by FEEDBACK_ADJUSTMENT. Without feedback the workout starts
+    over at difficulty 1, as the prompt does.
+    """
+    if previous_feedback not in FEEDBACK_ADJUSTMENT:
+        return 1.0
+    previous = 1.0
+    if previous_calories:
+        previous = previous_calories / baseline_calories(fitness_level, weight)
+    difficulty = previous * FEEDBACK_ADJUSTMENT[previous_feedback]
+    return min(MAX_DIFFICULTY, max(MIN_DIFFICULTY, difficulty))
+
+
+def _variant(exercise, level, difficulty):
+    index = FITNESS_LEVELS.index(level)
+    if difficulty >= 1 + VARIANT_STEP:
+        index += 1
+    elif difficulty <= 1 - VARIANT_STEP:
+        index -= 1
+    variants = exercise["variants"]
+    return variants[min(len(variants) - 1, max(0, index))]
+
+
+def _prescription(exercise, level, difficulty, minutes):
+    """reps_or_duration text; rep and hold counts scale with the difficulty"""
+    if exercise["unit"] == "minutes":
+        return f"{minutes} minutes"
+    amount = max(1, round(exercise["base"] * difficulty))
+    if exercise["unit"] == "seconds":
+        amount = max(10, 5 * round(amount / 5))
+    unit = "reps" if exercise["unit"] == "reps" else "seconds"
+    return f"{LEVEL_SETS[level]} sets of {amount} {unit}"
+
+
+def _pick(rng, candidates, weights, count):
+    """Weighted sample without replacement, at most MAX_PER_GROUP per muscle group while possible"""
+    chosen, groups = [], {}
+    pool = list(candidates)
+    while pool and len(chosen) < count:
+        allowed = [e for e in pool if groups.get(e["muscle_group"], 0) < MAX_PER_GROUP] or pool
+        exercise = rng.choices(allowed, weights=[weights.get(e["workout_type"], 0.2) for e in allowed])[0]
+        pool.remove(exercise)
+        chosen.append(exercise)
+        groups[exercise["muscle_group"]] = groups.get(exercise["muscle_group"], 0) + 1
+    return chosen
+
+
+def build_daily_workout(fitness_level, goal, bmi, weight, day_number=1, previous_feedback=None,
+                        previous_calories=None, avoid_exercises=None):
+    """
+    Build a daily workout locally from the bundled exercise library (no API call)
+
+    A warm-up, LEVEL_EXERCISES - 2 main exercises weighted towards the goal's
+    workout types, and a cool-down. The fitness level picks each exercise's
+    progression variant, sets and session length; the difficulty from
+    workout_difficulty scales reps, holds and minutes (within 30-60), and
+    moves to a harder or easier variant past VARIANT_STEP. Calories are
+    MET-based and total baseline_calories x difficulty, so the next day's
+    feedback compounds from there. The result only depends on the
+    arguments, so the same request always gets the same workout.
+
+    Args:
+        fitness_level (str): beginner, intermediate or advanced
+        goal (str): Fitness goal (lose_weight, gain_muscle, improve_endurance, ...)
+        bmi (float): Body mass index; HIGH_IMPACT_BMI and above gets low-impact exercises only
+        weight (float): Body weight in kg, for the calorie estimates
+        day_number (int): Day of the progression, in the workout name and the seed
+        previous_feedback (str): easy, just_right or difficult for the previous workout
+        previous_calories (float): Total calories of the previous workout
+        avoid_exercises (list): Exercise names of the previous workout, left out while the library allows
+
+    Returns:
+        dict: {"workout_name", "total_duration_minutes", "total_calories", "exercises"},
+        as the daily workout prompt asks the model for
+    """
+    level = _level(fitness_level)
+    goal_key = _goal_key(goal)
+    weight = float(weight)
+    difficulty = workout_difficulty(level, weight, previous_feedback, previous_calories)
+
+    seed_text = f"{level}|{goal_key}|{round(float(bmi))}|{day_number}|{previous_feedback}"
+    rng = random.Random(int(hashlib.sha256(seed_text.encode("utf-8")).hexdigest()[:16], 16))
+
+    library = load_exercises()
+    if float(bmi) >= HIGH_IMPACT_BMI:
+        library = [exercise for exercise in library if exercise["impact"] == "low"]
+    avoid = {str(name).lower() for name in avoid_exercises or []}
+
+    def candidates(role):
+        exercises = [exercise for exercise in library if exercise["role"] == role]
+        fresh = [
+            exercise for exercise in exercises
+            if not any(variant["name"].lower() in avoid for variant in exercise["variants"])
+        ]
+        return fresh if len(fresh) >= LEVEL_EXERCISES[level] - 2 or role != "main" else exercises
+
+    weights = GOAL_TYPE_WEIGHTS[goal_key]
+    main = _pick(rng, candidates("main"), weights, LEVEL_EXERCISES[level] - 2)
+    main.sort(key=lambda exercise: (exercise["workout_type"] not in ("cardio", "hiit"), exercise["workout_type"]))
+    warmup = rng.choice(candidates("warmup") or candidates("main"))
+    cooldown = rng.choice(candidates("cooldown"))
+
+    total = round(min(MAX_MINUTES, max(MIN_MINUTES, LEVEL_MINUTES[level] * difficulty)))
+    main_minutes = total - WARMUP_MINUTES - COOLDOWN_MINUTES
+    minutes = [WARMUP_MINUTES] + [
+        main_minutes // len(main) + (1 if i < main_minutes % len(main) else 0) for i in range(len(main))
+    ] + [COOLDOWN_MINUTES]
+
+    exercises = []
+    raw_calories = []
+    for exercise, exercise_minutes in zip([warmup] + main + [cooldown], minutes):
+        variant = _variant(exercise, level, difficulty)
+        exercises.append({
+            "name": variant["name"],
+            "workout_type": exercise["workout_type"],
+            "reps_or_duration": _prescription(exercise, level, difficulty, exercise_minutes),
+            "calories": 0
+        })
+        raw_calories.append(_kcal_per_minute(variant["met"], weight) * exercise_minutes)
+
+    # Scale the MET estimates to the difficulty's calorie target
+    total_calories = round(baseline_calories(level, weight) * difficulty)
+    scale = total_calories / sum(raw_calories)
+    for exercise, calories in zip(exercises, raw_calories):
+        exercise["calories"] = round(calories * scale)
+    total_calories = sum(exercise["calories"] for exercise in exercises)
+
+    return {
+        "workout_name": f"Day {day_number} - {GOAL_FOCUS[goal_key]}",
+        "total_duration_minutes": sum(minutes),
+        "total_calories": total_calories,
+        "exercises": exercises
+    }
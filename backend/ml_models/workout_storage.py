@@ -0,0 +1,182 @@
+import json
+
+from django.db import transaction
+
+from . import completion
+from .models import WorkoutPlanDay, WorkoutPlanExercise
+
+
+# Workout plans are stored twice: Workout.description keeps the generated
+# JSON (the health_data workout API exposes it) and WorkoutPlanDay /
+# WorkoutPlanExercise rows index it, so views look up one exercise, count
+# exercises or read a plan's days with indexed queries instead of parsing
+# the whole blob. A plain exercise list is stored as a single day 0.
+
+DAY_FIELDS = ("day_number", "day_name", "is_rest_day", "total_duration_minutes", "total_calories")
+EXERCISE_FIELDS = ("name", "workout_type", "reps_or_duration", "calories")
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_description(description):
+    """Days (multi-day plans) or exercises (single-day workouts) stored in Workout.description"""
+    try:
+        entries = json.loads(description) if description else []
+    except ValueError:
+        return []
+    return entries if isinstance(entries, list) else []
+
+
+def is_multi_day(entries):
+    return bool(entries) and isinstance(entries[0], dict) and 'day_number' in entries[0]
+
+
+def build_rows(entries):
+    """
+    Row fields for a plan's days and exercises, without touching the database
+
+    Args:
+        entries (list): Plan days ({"day_number", ..., "exercises": [...]}) or a plain exercise list
+
+    Returns:
+        list: (day fields, [exercise fields, ...]) per day; exercise_index runs across all days
+    """
+    if not is_multi_day(entries):
+        entries = [{"day_number": 0, "exercises": entries}]
+
+    rows = []
+    exercise_index = 0
+    for day in entries:
+        if not isinstance(day, dict):
+            continue
+        day_fields = {
+            "day_number": int(_number(day.get("day_number"))),
+            "day_name": str(day.get("day_name") or "")[:100],
+            "is_rest_day": bool(day.get("is_rest_day", False)),
+            "total_duration_minutes": _number(day.get("total_duration_minutes")),
+            "total_calories": _number(day.get("total_calories")),
+            "extra": {key: value for key, value in day.items() if key not in DAY_FIELDS and key != "exercises"}
+        }
+        exercises = []
+        for position, exercise in enumerate(day.get("exercises") or []):
+            if not isinstance(exercise, dict):
+                exercise = {"name": str(exercise)}
+            exercises.append({
+                "exercise_index": exercise_index,
+                "position": position,
+                "name": str(exercise.get("name") or "")[:255],
+                "workout_type": str(exercise.get("workout_type") or "general")[:50],
+                "reps_or_duration": str(exercise.get("reps_or_duration") or "")[:255],
+                "calories": _number(exercise.get("calories")),
+                "extra": {key: value for key, value in exercise.items() if key not in EXERCISE_FIELDS}
+            })
+            exercise_index += 1
+        rows.append((day_fields, exercises))
+    return rows
+
+
+def index_workout(workout, entries=None):
+    """
+    (Re)write the plan rows of a workout and fit its completion bitset to them
+
+    Args:
+        workout: health_data Workout
+        entries (list): Plan days or exercise list; parsed from workout.description if None
+    """
+    if entries is None:
+        entries = parse_description(workout.description)
+    rows = build_rows(entries)
+
+    with transaction.atomic():
+        WorkoutPlanDay.objects.filter(workout=workout).delete()
+        days = WorkoutPlanDay.objects.bulk_create(
+            [WorkoutPlanDay(workout=workout, **day_fields) for day_fields, _ in rows]
+        )
+        WorkoutPlanExercise.objects.bulk_create(
+            [
+                WorkoutPlanExercise(workout=workout, day=day, **exercise_fields)
+                for day, (_, exercises) in zip(days, rows)
+                for exercise_fields in exercises
+            ],
+            batch_size=500
+        )
+        completion.resize(workout, sum(len(exercises) for _, exercises in rows))
+
+
+def ensure_indexed(workouts):
+    """Index workouts saved before plan rows existed (or created through the health_data API)"""
+    workouts = list(workouts)
+    indexed = set(
+        WorkoutPlanDay.objects.filter(workout__in=workouts).values_list('workout_id', flat=True).distinct()
+    )
+    for workout in workouts:
+        if workout.id not in indexed:
+            index_workout(workout)
+
+
+def plan_days(workouts):
+    """
+    Days with their exercises for several workouts, two queries in total
+
+    Returns:
+        dict: workout_id -> [WorkoutPlanDay with .exercise_rows, ...] ordered by day
+    """
+    workouts = list(workouts)
+    ensure_indexed(workouts)
+
+    days_by_workout = {workout.id: [] for workout in workouts}
+    days = {}
+    for day in WorkoutPlanDay.objects.filter(workout__in=workouts).order_by('workout_id', 'day_number', 'id'):
+        day.exercise_rows = []
+        days[day.id] = day
+        days_by_workout[day.workout_id].append(day)
+    for exercise in WorkoutPlanExercise.objects.filter(workout__in=workouts).order_by('exercise_index'):
+        days[exercise.day_id].exercise_rows.append(exercise)
+    return days_by_workout
+
+
+def exercise_at(workout, exercise_index):
+    """The exercise with a global index, one indexed lookup (None if out of range)"""
+    ensure_indexed([workout])
+    return WorkoutPlanExercise.objects.filter(workout=workout, exercise_index=exercise_index).first()
+
+
+def exercise_count(workout):
+    ensure_indexed([workout])
+    return WorkoutPlanExercise.objects.filter(workout=workout).count()
+
+
+def exercise_dict(exercise):
+    """A stored exercise in the generated JSON shape"""
+    return {
+        **exercise.extra,
+        "name": exercise.name,
+        "workout_type": exercise.workout_type,
+        "reps_or_duration": exercise.reps_or_duration,
+        "calories": exercise.calories
+    }
+
+
+def day_dict(day):
+    """A stored plan day in the generated JSON shape"""
+    return {
+        **day.extra,
+        "day_number": day.day_number,
+        "day_name": day.day_name,
+        "is_rest_day": day.is_rest_day,
+        "total_duration_minutes": day.total_duration_minutes,
+        "total_calories": day.total_calories,
+        "exercises": [exercise_dict(exercise) for exercise in day.exercise_rows]
+    }
+
+
+def plan_entries(days):
+    """Stored days back in the Workout.description shape: plan days, or the exercise list of a day 0"""
+    if len(days) == 1 and days[0].day_number == 0:
+        return [exercise_dict(exercise) for exercise in days[0].exercise_rows]
+    return [day_dict(day) for day in days]
@@ -92,6 +92,29 @@ apiClient.interceptors.response.use(
 export default apiClient;
 
 
+// AI generation endpoints queue a background job and answer 202 with its id.
+// Poll the job until it finishes and resolve with the generated result.
+const JOB_POLL_INTERVAL_MS = 2000;
+const JOB_POLL_TIMEOUT_MS = 5 * 60 * 1000;
+
+export const waitForJob = async (response) => {
+  if (response.status !== 202 || !response.data?.job_id) {
+    return response.data;
+  }
+
+  const startedAt = Date.now();
+  while (Date.now() - startedAt < JOB_POLL_TIMEOUT_MS) {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    // A failed job answers 500 with { error }, which rejects like the old synchronous call
+    const result = await apiClient.get(`/ml/jobs/${response.data.job_id}/result/`);
+    if (result.status !== 202) {
+      return result.data;
+    }
+  }
+  throw new Error('Generation is taking longer than expected. Please check back shortly.');
+};
+
+
 // AI Model API Functions
 export const generateDietPlan = async (data) => {
   try {
@@ -104,7 +127,7 @@ export const generateDietPlan = async (data) => {
       days: data.duration || 7,
       force_new: data.force_new || false
     });
-    return response.data;
+    return waitForJob(response);
   } catch (error) {
     console.error('Diet plan generation error:', error.response?.data || error.message);
     throw error;
@@ -132,6 +155,23 @@ export const getMealPlan = async (date = null) => {
   }
 };
 
+// Every day from start to end (YYYY-MM-DD); follows next_start for ranges over a month
+export const getMealPlanRange = async (start, end) => {
+  try {
+    const days = [];
+    let pageStart = start;
+    while (pageStart) {
+      const response = await apiClient.get(`/ml/meal-plan/range/?start=${pageStart}&end=${end}`);
+      days.push(...response.data.days);
+      pageStart = response.data.next_start;
+    }
+    return { success: true, start, end, days };
+  } catch (error) {
+    console.error('Get meal plan range error:', error.response?.data || error.message);
+    throw error;
+  }
+};
+
 export const trackMealItem = async (mealItemId, status, quantityRatio = 1.0) => {
   try {
     const response = await apiClient.post('/ml/track-meal-item/', {
@@ -146,6 +186,20 @@ export const trackMealItem = async (mealItemId, status, quantityRatio = 1.0) =>
   }
 };
 
+// Replay many tracking operations in one request, e.g. after reconnecting:
+// { kind: 'exercise', workout_id, exercise_index, completed },
+// { kind: 'marathon_day', marathon_id, day_index, completed } or
+// { kind: 'meal_item', meal_item_id, status, quantity_ratio }
+export const trackBatch = async (operations) => {
+  try {
+    const response = await apiClient.post('/ml/track-batch/', { operations });
+    return response.data;
+  } catch (error) {
+    console.error('Track batch error:', error.response?.data || error.message);
+    throw error;
+  }
+};
+
 export const recalculateMealPlan = async (data = {}) => {
   try {
     const response = await apiClient.post('/ml/recalculate-meal-plan/', {
@@ -173,7 +227,7 @@ export const deleteMealPlan = async () => {
 export const generateWorkoutPlan = async (data) => {
   try {
     const response = await apiClient.post('/ml/workout-plan/', data);
-    return response.data;
+    return waitForJob(response);
   } catch (error) {
     console.error('Workout plan generation error:', error.response?.data || error.message);
     throw error;
@@ -183,7 +237,7 @@ export const generateWorkoutPlan = async (data) => {
 export const generateMarathonPlan = async (data) => {
   try {
     const response = await apiClient.post('/ml/marathon-plan/', data);
-    return response.data;
+    return waitForJob(response);
   } catch (error) {
     console.error('Marathon plan generation error:', error.response?.data || error.message);
     throw error;
@@ -361,7 +415,7 @@ export const getDailyWorkoutSummary = async () => {
 export const generateDailyWorkout = async (data) => {
   try {
     const response = await apiClient.post('/ml/generate-daily-workout/', data);
-    return response.data;
+    return waitForJob(response);
   } catch (error) {
     console.error('Generate daily workout error:', error.response?.data || error.message);
     throw error;